@@ -0,0 +1,254 @@
+"""
+Local catalog of finished analyses.
+
+Each analysis (one render's labels and landmark track, for one speaker) gets
+a row in a SQLite catalog with its metadata and pointers to its outputs, one
+row per label with the report statistics (labeled seconds and episodes per
+minute, share of the video, mean movement energy), and its own folder with
+the landmark track and the per-second label matrix as Parquet files. The
+rendered video and report files are copied into that folder too: job
+folders are pruned after a day, the catalog's copies stay.
+
+The per-label rows repeat the speaker and date of their analysis, so the
+history queries ("the sessions of speaker X with the most Punching per
+minute", "Punching per minute over time") are answered from one index range
+without reading any CSV, video or Parquet file.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from landmark_store import PYARROW_AVAILABLE, write_landmarks
+from motion_report import energy_tables, label_matrix, label_statistics
+
+ANALYSIS_CATALOG_DIR = Path(os.environ.get("ANALYSIS_CATALOG_DIR", "analysis_catalog"))
+
+# Per-label metric name -> column; only these are ever put into a query
+METRICS = {
+    "episodes_per_minute": "episodes_per_minute",
+    "seconds_per_minute": "seconds_per_minute",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    speaker TEXT NOT NULL COLLATE NOCASE,
+    video_name TEXT NOT NULL,
+    created REAL NOT NULL,
+    duration REAL NOT NULL,
+    fps REAL NOT NULL,
+    aspect REAL NOT NULL,
+    frames INTEGER NOT NULL,
+    person INTEGER,
+    label_source TEXT NOT NULL,
+    landmarks_path TEXT,
+    labels_path TEXT,
+    video_path TEXT,
+    report_path TEXT,
+    pdf_path TEXT
+);
+CREATE INDEX IF NOT EXISTS analyses_speaker ON analyses(speaker, created);
+CREATE INDEX IF NOT EXISTS analyses_created ON analyses(created);
+CREATE TABLE IF NOT EXISTS label_stats (
+    analysis_id TEXT NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,
+    motion TEXT NOT NULL,
+    speaker TEXT NOT NULL COLLATE NOCASE,
+    created REAL NOT NULL,
+    labeled_seconds REAL NOT NULL,
+    episodes INTEGER NOT NULL,
+    seconds_per_minute REAL NOT NULL,
+    episodes_per_minute REAL NOT NULL,
+    share_of_video REAL NOT NULL,
+    mean_energy REAL,
+    PRIMARY KEY (analysis_id, motion)
+);
+CREATE INDEX IF NOT EXISTS label_stats_episodes ON label_stats(motion, episodes_per_minute);
+CREATE INDEX IF NOT EXISTS label_stats_seconds ON label_stats(motion, seconds_per_minute);
+CREATE INDEX IF NOT EXISTS label_stats_speaker_episodes ON label_stats(motion, speaker, episodes_per_minute);
+CREATE INDEX IF NOT EXISTS label_stats_speaker_seconds ON label_stats(motion, speaker, seconds_per_minute);
+CREATE INDEX IF NOT EXISTS label_stats_trend ON label_stats(motion, created);
+CREATE INDEX IF NOT EXISTS label_stats_speaker_trend ON label_stats(motion, speaker, created);
+CREATE TABLE IF NOT EXISTS motions (
+    motion TEXT PRIMARY KEY
+);
+"""
+
+
+def _keep_copy(path: str | None, stem: Path) -> str | None:
+    """Copy `path` to `stem` plus its suffix; None if there is no such file."""
+    if not path or not os.path.isfile(path):
+        return None
+    target = stem.with_suffix(Path(path).suffix)
+    shutil.copyfile(path, target)
+    return str(target)
+
+
+class AnalysisCatalog:
+    def __init__(self, root: str | Path = ANALYSIS_CATALOG_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "catalog.sqlite"
+        with closing(self._connect()) as db, db:
+            columns = [row["name"] for row in db.execute("PRAGMA table_info(analyses)")]
+            if columns and "aspect" not in columns:
+                # Catalogs from before similarity search did not keep the frame aspect
+                db.execute("ALTER TABLE analyses ADD COLUMN aspect REAL NOT NULL DEFAULT 1.0")
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: Streamlit runs each session on its own thread
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        return db
+
+    def analysis_dir(self, analysis_id: str) -> Path:
+        return self.root / analysis_id
+
+    def has(self, analysis_id: str) -> bool:
+        with closing(self._connect()) as db:
+            return db.execute("SELECT 1 FROM analyses WHERE id = ?", (analysis_id,)).fetchone() is not None
+
+    def record(self, analysis_id: str, speaker: str, video_name: str, motion_df: pd.DataFrame,
+               motion_cols: list[str], landmarks: np.ndarray, fps: float, aspect: float,
+               duration_seconds: float, label_source: str, person: int | None = None,
+               outputs: dict[str, str | None] | None = None) -> None:
+        """
+        Add an analysis (`analysis_id` is e.g. the report digest, scoped to
+        whoever recorded it). Recording the same analysis again only updates
+        its speaker, so this is cheap to call on every rerun of the page.
+        `outputs` may point to its "video", "report" and "pdf" files, which
+        are copied into the analysis folder. Concurrent calls for the same
+        id are safe: one of them adds the analysis, the others change
+        nothing.
+        """
+        if self.has(analysis_id):
+            with closing(self._connect()) as db, db:
+                db.execute("UPDATE analyses SET speaker = ? WHERE id = ?", (speaker, analysis_id))
+                db.execute("UPDATE label_stats SET speaker = ? WHERE analysis_id = ?", (speaker, analysis_id))
+            return
+
+        matrix = label_matrix(motion_df, motion_cols, duration_seconds)
+        stats = label_statistics(matrix)
+        _, energy = energy_tables(landmarks, fps, aspect, matrix)
+        stats = stats.merge(energy, on='motion', how='left')
+        minutes = max(len(matrix) / 60.0, 1 / 60.0)
+
+        # Files are written to a private folder that only the call whose row is inserted
+        # moves into place, so racing calls never write the same files
+        folder = self.analysis_dir(analysis_id)
+        staging = Path(tempfile.mkdtemp(prefix=f".{analysis_id}.", dir=self.root))
+        landmarks_path = labels_path = None
+        if PYARROW_AVAILABLE:
+            write_landmarks(staging / "landmarks.parquet", landmarks, fps)
+            matrix.reset_index().to_parquet(staging / "labels.parquet", index=False)
+            landmarks_path, labels_path = str(folder / "landmarks.parquet"), str(folder / "labels.parquet")
+        outputs = {kind: _keep_copy(path, staging / kind) for kind, path in (outputs or {}).items()}
+        outputs = {kind: path and str(folder / Path(path).name) for kind, path in outputs.items()}
+        created = time.time()
+        rows = [
+            (analysis_id, row.motion, speaker, created, float(row.total_seconds), int(row.episodes),
+             float(row.total_seconds) / minutes, float(row.episodes_per_minute), float(row.share_of_video),
+             None if pd.isna(row.mean_energy) else float(row.mean_energy))
+            for row in stats.itertuples()
+        ]
+        try:
+            with closing(self._connect()) as db, db:
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO analyses (id, speaker, video_name, created, duration, fps, aspect, "
+                    "frames, person, label_source, landmarks_path, labels_path, video_path, report_path, pdf_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (analysis_id, speaker, video_name, created, duration_seconds, fps, aspect, len(landmarks),
+                     person, label_source, landmarks_path, labels_path, outputs.get("video"),
+                     outputs.get("report"), outputs.get("pdf")),
+                ).rowcount == 1
+                if not inserted:
+                    # Another session recorded it since the check above
+                    return
+                db.executemany("INSERT INTO label_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                db.executemany("INSERT OR IGNORE INTO motions VALUES (?)", [(m,) for m in stats['motion']])
+                # Inside the transaction: if the files cannot be moved, the rows are not kept
+                shutil.rmtree(folder, ignore_errors=True)
+                os.replace(staging, folder)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def delete(self, analysis_id: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+        shutil.rmtree(self.analysis_dir(analysis_id), ignore_errors=True)
+
+    def count(self) -> int:
+        with closing(self._connect()) as db:
+            return db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def analyses(self) -> pd.DataFrame:
+        """Every analysis with its landmark file, oldest first."""
+        with closing(self._connect()) as db:
+            return pd.read_sql_query(
+                "SELECT id, speaker, video_name, created, fps, aspect, landmarks_path, video_path "
+                "FROM analyses ORDER BY created", db)
+
+    def speakers(self) -> list[str]:
+        with closing(self._connect()) as db:
+            return [row[0] for row in db.execute("SELECT DISTINCT speaker FROM analyses ORDER BY speaker")]
+
+    def speakers_of(self, analysis_ids: list[str]) -> dict[str, str]:
+        """The current speaker of each of `analysis_ids` that is still in the catalog."""
+        if not analysis_ids:
+            return {}
+        with closing(self._connect()) as db:
+            return dict(db.execute(
+                f"SELECT id, speaker FROM analyses WHERE id IN ({', '.join('?' * len(analysis_ids))})",
+                analysis_ids))
+
+    def motions(self) -> list[str]:
+        with closing(self._connect()) as db:
+            return [row[0] for row in db.execute("SELECT motion FROM motions ORDER BY motion")]
+
+    def top_sessions(self, motion: str, speaker: str | None = None, metric: str = "episodes_per_minute",
+                     limit: int = 20) -> pd.DataFrame:
+        """The analyses with the highest `metric` for `motion`, optionally of one speaker."""
+        column = METRICS[metric]
+        where = "s.motion = ?" + (" AND s.speaker = ?" if speaker else "")
+        params = (motion, speaker) if speaker else (motion,)
+        query = f"""
+            SELECT a.id, a.speaker, a.video_name, a.created, a.duration, s.{column} AS value,
+                   s.labeled_seconds, s.episodes, a.video_path, a.report_path, a.pdf_path
+            FROM label_stats s JOIN analyses a ON a.id = s.analysis_id
+            WHERE {where}
+            ORDER BY s.{column} DESC
+            LIMIT ?
+        """
+        with closing(self._connect()) as db:
+            return pd.read_sql_query(query, db, params=(*params, limit))
+
+    def trend(self, motion: str, speaker: str | None = None, metric: str = "episodes_per_minute",
+              since: float | None = None) -> pd.DataFrame:
+        """Daily mean of `metric` for `motion` (and the number of sessions), optionally of one speaker."""
+        column = METRICS[metric]
+        where = "motion = ?" + (" AND speaker = ?" if speaker else "") + " AND created >= ?"
+        params = (motion, speaker) if speaker else (motion,)
+        # Rows come off the index in date order, so grouping by day needs no sort
+        query = f"""
+            SELECT CAST(created / 86400 AS INTEGER) AS day, AVG({column}) AS value, COUNT(*) AS sessions
+            FROM label_stats
+            WHERE {where}
+            GROUP BY day
+            ORDER BY day
+        """
+        with closing(self._connect()) as db:
+            trend = pd.read_sql_query(query, db, params=(*params, since or 0.0))
+        trend['day'] = pd.to_datetime(trend['day'] * 86400, unit='s')
+        return trend
@@ -4,8 +4,14 @@ import mimetypes
 from pathlib import Path
 import shutil
 
+import cv2
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+from motion_report import timestamp_seconds
+from pdf_report import cached_pdf_reports
+
 
 APP_DIR = Path(__file__).resolve().parent
 TRADEMARK_FILENAME = "Trademark.png"
@@ -60,6 +66,38 @@ def _placeholder_process_video(input_path: Path, output_path: Path) -> Path:
     return output_path
 
 
+def _job_reports(csv_upload, video_path: Path, video_name: str) -> tuple[Path, Path]:
+    """
+    Thai and English reports built from an uploaded motion timestamp CSV
+    (same format as `motion_time_stamp.csv`). This page does not track poses,
+    so the movement energy section stays empty.
+    """
+    motion_df = pd.read_csv(csv_upload)
+    motion_df.columns = [c.strip() for c in motion_df.columns]
+    timestamp_col = next((c for c in motion_df.columns if c.lower() in ("timestamp", "time")), None)
+    if timestamp_col is None:
+        raise ValueError(
+            "The CSV needs a 'timestamp' column. (ไฟล์ CSV ต้องมีคอลัมน์ 'timestamp')"
+        )
+    motion_df = motion_df.rename(columns={timestamp_col: "timestamp"})
+    motion_df["time_sec"] = timestamp_seconds(motion_df["timestamp"])
+    motion_cols = [c for c in motion_df.columns if c not in ("timestamp", "time_sec")]
+
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    # Some headers report a height of 0
+    aspect = (cap.get(cv2.CAP_PROP_FRAME_WIDTH) / max(cap.get(cv2.CAP_PROP_FRAME_HEIGHT), 1)) if cap.isOpened() else 1.0
+    cap.release()
+
+    _ensure_dirs()
+    reports = cached_pdf_reports(
+        motion_df, motion_cols, np.empty((0, 33, 4), dtype=np.float32), fps, aspect,
+        frames / fps if frames > 0 else 0.0, video_name, OUTPUTS_DIR,
+    )
+    return reports["th"], reports["en"]
+
+
 def _read_bytes(path: Path) -> bytes:
     return path.read_bytes()
 
@@ -164,6 +202,7 @@ div[data-testid="stDownloadButton"] button {
 )
 
 video_upload = None
+csv_upload = None
 if st.session_state[STATE_STATUS] == "idle":
     video_upload = st.file_uploader(
         "Video (MP4) (วิดีโอ MP4)",
@@ -172,6 +211,13 @@ if st.session_state[STATE_STATUS] == "idle":
         key="input_video",
         label_visibility="visible",
     )
+    csv_upload = st.file_uploader(
+        "Motion timestamps CSV (optional) (ไฟล์ CSV เวลาการเคลื่อนไหว ไม่บังคับ)",
+        type=["csv"],
+        accept_multiple_files=False,
+        key="input_csv",
+        label_visibility="visible",
+    )
 
     st.divider()
 
@@ -196,6 +242,7 @@ if reset_clicked:
     st.session_state[STATE_PAYLOADS] = {}
     # Clear uploaded file widget state (forces a clean UI)
     st.session_state.pop("input_video", None)
+    st.session_state.pop("input_csv", None)
 
 if analysis_clicked:
     st.session_state[STATE_STATUS] = "processing"
@@ -210,12 +257,15 @@ if analysis_clicked:
                 "(กรุณาอัปโหลดวิดีโอก่อนกด Analysis)"
             )
 
-        # Save the uploaded file (not used for outputs; outputs come from bundled repo files).
-        _pick_input(video_upload, DEFAULT_DOTS_VIDEO, "input.mp4")
+        # Save the uploaded file (videos come from bundled repo files; reports may use it).
+        input_path = _pick_input(video_upload, DEFAULT_DOTS_VIDEO, "input.mp4")
 
-        # Reports are bundled defaults (user doesn't need to upload)
-        thai_rep = DEFAULT_THAI_REPORT
-        en_rep = DEFAULT_EN_REPORT
+        # Reports are generated for this job from the motion CSV, or the bundled defaults
+        if csv_upload is not None:
+            thai_rep, en_rep = _job_reports(csv_upload, input_path, video_upload.name)
+        else:
+            thai_rep = DEFAULT_THAI_REPORT
+            en_rep = DEFAULT_EN_REPORT
 
         # Output sources are the bundled files in this repo
         dots_source = DEFAULT_DOTS_VIDEO
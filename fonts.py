@@ -0,0 +1,56 @@
+"""
+TrueType font lookup for text rendered with Pillow (reports, overlay labels).
+
+Thai needs a font with Thai glyphs; the Docker image installs the TLWG fonts.
+`REPORT_FONT` / `REPORT_FONT_BOLD` override the search.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+from pathlib import Path
+
+from PIL import ImageFont
+
+APP_DIR = Path(__file__).resolve().parent
+
+# Fonts that cover Thai come first; DejaVu is Latin-only but always present on Debian
+FONT_CANDIDATES = [
+    APP_DIR / "fonts" / "NotoSansThai-Regular.ttf",
+    Path("/usr/share/fonts/truetype/noto/NotoSansThai-Regular.ttf"),
+    Path("/usr/share/fonts/truetype/tlwg/Loma.ttf"),
+    Path("/usr/share/fonts/truetype/tlwg/Garuda.ttf"),
+    Path("/usr/share/fonts/opentype/tlwg/Loma.otf"),
+    Path("/usr/share/fonts/opentype/tlwg/Garuda.otf"),
+    Path("/System/Library/Fonts/Supplemental/Thonburi.ttc"),
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+]
+BOLD_FONT_CANDIDATES = [
+    APP_DIR / "fonts" / "NotoSansThai-Bold.ttf",
+    Path("/usr/share/fonts/truetype/noto/NotoSansThai-Bold.ttf"),
+    Path("/usr/share/fonts/truetype/tlwg/Loma-Bold.ttf"),
+    Path("/usr/share/fonts/truetype/tlwg/Garuda-Bold.ttf"),
+    Path("/usr/share/fonts/opentype/tlwg/Loma-Bold.otf"),
+    Path("/usr/share/fonts/opentype/tlwg/Garuda-Bold.otf"),
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def find_font_path(bold: bool = False) -> Path | None:
+    override = os.environ.get("REPORT_FONT_BOLD" if bold else "REPORT_FONT")
+    if override and Path(override).exists():
+        return Path(override)
+    for path in (BOLD_FONT_CANDIDATES if bold else FONT_CANDIDATES):
+        if path.exists():
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(size: int, bold: bool = False) -> ImageFont.ImageFont:
+    path = find_font_path(bold) or (find_font_path(False) if bold else None)
+    if path is None:
+        return ImageFont.load_default(size=size)
+    return ImageFont.truetype(str(path), size)
@@ -0,0 +1,87 @@
+"""
+Preallocated frame buffers for the render loop.
+
+OpenCV writes into a caller-supplied array when it has the right shape and
+dtype (`cap.read(image=...)`, `dst=`), so the loop can decode, resize and
+convert without allocating a fresh frame every iteration. `AllocationCounter`
+verifies that: it counts outputs that did not land in the supplied buffer and,
+optionally, the bytes Python/NumPy allocated per frame (via tracemalloc).
+"""
+
+from __future__ import annotations
+
+import os
+import tracemalloc
+
+import numpy as np
+
+# Set RENDER_TRACE_ALLOCATIONS=1 to measure bytes allocated per frame (slow)
+TRACE_ALLOCATIONS = os.environ.get("RENDER_TRACE_ALLOCATIONS") == "1"
+
+
+class FrameRing:
+    """A fixed ring of same-shaped arrays, handed out round-robin."""
+
+    def __init__(self, shape: tuple[int, ...], depth: int = 2, dtype=np.uint8):
+        self._buffers = [np.empty(shape, dtype=dtype) for _ in range(depth)]
+        self._index = 0
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._buffers[0].shape
+
+    def next(self) -> np.ndarray:
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return buffer
+
+
+def reuse_buffer(buffer: np.ndarray | None, shape: tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+    """Return `buffer` if it already has `shape`/`dtype`, else a new array."""
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        return np.empty(shape, dtype=dtype)
+    return buffer
+
+
+class AllocationCounter:
+    def __init__(self, trace: bool = TRACE_ALLOCATIONS):
+        self.trace = trace
+        self.frames = 0
+        self.misses = 0
+        self.traced_bytes = 0
+        self._frame_start = 0
+
+    def __enter__(self) -> "AllocationCounter":
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def begin_frame(self) -> None:
+        if self.trace:
+            tracemalloc.reset_peak()
+            self._frame_start = tracemalloc.get_traced_memory()[0]
+
+    def check(self, result: np.ndarray, buffer: np.ndarray) -> np.ndarray:
+        """Count `result` as an allocation unless OpenCV wrote into `buffer`."""
+        if result is not buffer:
+            self.misses += 1
+        return result
+
+    def end_frame(self) -> None:
+        self.frames += 1
+        if self.trace:
+            self.traced_bytes += tracemalloc.get_traced_memory()[1] - self._frame_start
+
+    @property
+    def misses_per_frame(self) -> float:
+        return self.misses / self.frames if self.frames else 0.0
+
+    @property
+    def bytes_per_frame(self) -> float | None:
+        if not self.trace:
+            return None
+        return self.traced_bytes / self.frames if self.frames else 0.0
@@ -0,0 +1,492 @@
+"""
+Checkpointed render jobs in a local SQLite store.
+
+A job records its input video (copied into the job's folder), the render
+parameters and its state. The frames to render are split into segments of
+about `CHECKPOINT_SECONDS` of video, aligned to keyframes so each one starts
+with a cheap seek. Every finished segment's video and landmarks are written
+to disk and recorded, so after a restart `run_job` carries on from the first
+missing segment and only the segment in flight is rendered again. A job
+saved with a memory budget is checked against it before anything is decoded.
+
+Every job has an owner (the page passes a token kept in the visitor's URL),
+and only its owner is offered it again. A running job refreshes a heartbeat;
+a job whose heartbeat is older than `HEARTBEAT_TIMEOUT` was interrupted (the
+server died mid-render) and can be claimed by its owner. A render ended by
+the page itself (Stop, or a rerun) is marked failed, not left running.
+Point `JOB_STORE_DIR` at a persistent disk for jobs to survive redeploys.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import closing
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Mapping, NamedTuple
+
+import cv2
+import numpy as np
+
+from landmark_store import PYARROW_AVAILABLE, LandmarkWriter
+from memory_budget import check_budget, estimate_job_memory
+from motion_layers import MotionLayers
+from pose_backends import NUM_LANDMARKS
+from render_engine import OverlayStyle, RenderPlan, probe_video, render_overlay_video
+from video_encoder import EncoderSettings, Rendition, concat_videos
+
+JOB_STORE_DIR = Path(os.environ.get("JOB_STORE_DIR", Path(tempfile.gettempdir()) / "render_jobs"))
+CHECKPOINT_SECONDS = float(os.environ.get("CHECKPOINT_SECONDS", "30"))
+HEARTBEAT_TIMEOUT = 60.0
+# Jobs are deleted once their heartbeat is this old
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_HOURS", "24")) * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    input_name TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    output_path TEXT,
+    error TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs(owner, state);
+CREATE TABLE IF NOT EXISTS segments (
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    start_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    video_path TEXT,
+    landmarks_path TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    input_name: str
+    input_path: str
+    params: dict
+    state: str
+    created: float
+    heartbeat: float
+    output_path: str | None = None
+    error: str | None = None
+    owner: str | None = None
+
+    @property
+    def segments(self) -> list[tuple[int, int | None]]:
+        return [tuple(s) for s in self.params["segments"]]
+
+
+class JobResult(NamedTuple):
+    # None when only landmarks were computed
+    output_path: str | None
+    codec: str
+    # (frames, 33, 4) on the source timeline, NaN outside the rendered segments
+    landmarks: np.ndarray
+    landmarks_path: str | None
+    frames: int
+    # Frames taken from checkpoints instead of being rendered again
+    resumed_frames: int
+    elapsed: float
+    # Over the segments rendered by this call, as in `RenderResult`
+    allocations_per_frame: float
+    bytes_per_frame: float | None
+    # Rendition name -> file, e.g. {"mobile": ".../mobile.mp4", "preview": ".../preview.gif"}
+    renditions: dict[str, str]
+    # Person ID -> (frames, 33, 4) track when several people are tracked, as in `RenderResult`
+    people: dict[int, np.ndarray]
+
+
+def checkpoint_segments(ranges: list[tuple[int, int | None]], fps: float, keyframes=(),
+                        seconds: float = CHECKPOINT_SECONDS, frame_count: int = 0) -> list[tuple[int, int | None]]:
+    """
+    Split `[start, end)` frame ranges into pieces of about `seconds`, cut on
+    keyframes when known. A range ending at None runs to the end of the
+    video: it is cut up to the expected `frame_count` (0 if unknown) and its
+    last piece stays open-ended, so a wrong count never truncates the render.
+    """
+    keyframes = np.asarray(keyframes, dtype=np.int64)
+    step = max(int(seconds * fps), 1)
+    segments = []
+    for start, end in ranges:
+        cut = start
+        for target in range(start + step, end if end is not None else frame_count, step):
+            if len(keyframes):
+                i = int(np.searchsorted(keyframes, target, side="right")) - 1
+                target = int(keyframes[i]) if i >= 0 else target
+            if target > cut:
+                segments.append((cut, target))
+                cut = target
+        segments.append((cut, end))
+    return segments
+
+
+class JobStore:
+    def __init__(self, root: str | Path = JOB_STORE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "jobs.sqlite"
+        with closing(self._connect()) as db, db:
+            columns = [row["name"] for row in db.execute("PRAGMA table_info(jobs)")]
+            if columns and "owner" not in columns:
+                # Stores from before jobs had owners: their jobs are offered to nobody and pruned
+                db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: Streamlit runs each session on its own thread
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        return db
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def create_job(self, video_path: str | Path, input_name: str, params: dict, owner: str | None = None) -> Job:
+        """
+        Copy the input into the store and record a job held by the caller;
+        `params` come from `job_params`. Only `owner` is offered the job after
+        an interruption.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        input_path = job_dir / ("input" + Path(input_name).suffix)
+        shutil.copyfile(video_path, input_path)
+        now = time.time()
+        job = Job(job_id, input_name, str(input_path), params, "running", now, now, owner=owner)
+        with closing(self._connect()) as db, db:
+            db.execute("INSERT INTO jobs (id, input_name, input_path, params, state, created, heartbeat, owner) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (job.id, job.input_name, job.input_path, json.dumps(params), job.state, now, now, owner))
+        return job
+
+    def job(self, job_id: str) -> Job | None:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Job:
+        return Job(row["id"], row["input_name"], row["input_path"], json.loads(row["params"]), row["state"],
+                   row["created"], row["heartbeat"], row["output_path"], row["error"], row["owner"])
+
+    def interrupted_jobs(self, owner: str) -> list[Job]:
+        """`owner`'s unfinished jobs nobody is working on (heartbeat timed out), newest first."""
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT * FROM jobs WHERE owner = ? AND state IN ('pending', 'running') "
+                              "AND heartbeat < ? ORDER BY created DESC",
+                              (owner, time.time() - HEARTBEAT_TIMEOUT)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Take over one of `owner`'s interrupted jobs; False if another tab of theirs got it first."""
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            cursor = db.execute("UPDATE jobs SET state = 'running', heartbeat = ? "
+                                "WHERE id = ? AND owner = ? AND state IN ('pending', 'running') AND heartbeat < ?",
+                                (now, job_id, owner, now - HEARTBEAT_TIMEOUT))
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def completed_segments(self, job_id: str) -> dict[int, sqlite3.Row]:
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT * FROM segments WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["idx"]: row for row in rows}
+
+    def complete_segment(self, job_id: str, index: int, segment: tuple[int, int],
+                         video_path: str | None, landmarks_path: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?)",
+                       (job_id, index, segment[0], segment[1], video_path, landmarks_path))
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id: str, output_path: str | None) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE jobs SET state = 'done', output_path = ?, heartbeat = ? WHERE id = ?",
+                       (output_path, time.time(), job_id))
+
+    def fail(self, job_id: str, error: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE jobs SET state = 'failed', error = ?, heartbeat = ? WHERE id = ?",
+                       (error, time.time(), job_id))
+
+    def delete(self, job_id: str, owner: str | None = None) -> None:
+        """Delete a job and its folder; with `owner`, only if the job is theirs."""
+        with closing(self._connect()) as db, db:
+            if owner is None:
+                cursor = db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            else:
+                cursor = db.execute("DELETE FROM jobs WHERE id = ? AND owner = ?", (job_id, owner))
+        if cursor.rowcount:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def prune(self, max_age: float = JOB_RETENTION_SECONDS) -> None:
+        """Delete finished, failed and abandoned jobs; running jobs keep their heartbeat fresh."""
+        with closing(self._connect()) as db:
+            old = [row["id"] for row in db.execute(
+                "SELECT id FROM jobs WHERE heartbeat < ?", (time.time() - max_age,))]
+        for job_id in old:
+            self.delete(job_id)
+
+
+def job_params(style: OverlayStyle, plan: RenderPlan, encoder: EncoderSettings | None,
+               motion_lookup: dict[int, str], segments: list[tuple[int, int | None]], fps: float,
+               frame_count: int, draw: bool = True, memory_budget_mb: float = 0,
+               renditions: list[Rendition] = ()) -> dict:
+    """JSON-serializable description of a render, the inverse of what `run_job` reads."""
+    return {
+        "style": asdict(style),
+        "plan": asdict(plan),
+        "encoder": asdict(encoder or EncoderSettings()),
+        "motion_lookup": {str(sec): text for sec, text in motion_lookup.items()},
+        "segments": [list(s) for s in segments],
+        "fps": fps,
+        "frame_count": frame_count,
+        "draw": draw,
+        "memory_budget_mb": memory_budget_mb,
+        "renditions": [asdict(r) for r in renditions],
+    }
+
+
+def layer_history(done: dict[int, Mapping[str, Any]], index: int, fps: float) -> np.ndarray | None:
+    """
+    Landmarks of the output before segment `index` (as far back as the
+    layers need), oldest first, from the completed segments `done`.
+    """
+    if index == 0:
+        return None
+    frames = MotionLayers.prime_frames(fps)
+    parts, count = [], 0
+    for previous in range(index - 1, -1, -1):
+        parts.append(np.load(done[previous]["landmarks_path"]))
+        count += len(parts[-1])
+        if frames is not None and count >= frames:
+            break
+    history = np.concatenate(parts[::-1])
+    return history[-frames:] if frames is not None else history
+
+
+def people_path(landmarks_path: str | Path) -> Path:
+    """
+    A segment's per-person tracks (one array per person ID) and the job's
+    next person ID ("next_id") after it, saved next to its landmarks.
+    """
+    return Path(landmarks_path).with_suffix(".people.npz")
+
+
+def saved_people(saved) -> dict[int, np.ndarray]:
+    """The per-person tracks of a loaded `people_path` file."""
+    return {int(key): saved[key] for key in saved.files if key.isdigit()}
+
+
+def people_seed(done: dict[int, Mapping[str, Any]], index: int, fps: float) -> tuple[dict[int, np.ndarray] | None, int]:
+    """
+    Last landmarks of everyone seen in the final second of segment
+    `index - 1` (from the completed segments `done`), by person ID, and the
+    first ID a newcomer may get.
+    """
+    if index == 0:
+        return None, 0
+    with np.load(people_path(done[index - 1]["landmarks_path"])) as saved:
+        seed = {}
+        for person_id, person_track in saved_people(saved).items():
+            tail = person_track[-max(int(fps), 1):]
+            seen = np.flatnonzero(np.isfinite(tail[:, 0, 0]))
+            if len(seen):
+                seed[person_id] = tail[seen[-1]]
+        # Checkpoints from before the next ID was saved only know who they saw
+        next_id = int(saved["next_id"]) if "next_id" in saved.files else 0
+    return seed, next_id
+
+
+def tracker_path(landmarks_path: str | Path) -> Path:
+    """A segment's final fallback box (center_x, center_y, width, height), saved next to its landmarks."""
+    return Path(landmarks_path).with_suffix(".tracker.npy")
+
+
+def tracker_seed(done: dict[int, Mapping[str, Any]], index: int) -> tuple[int, int, int, int] | None:
+    """The fallback box segment `index - 1` ended on, from the completed segments `done`."""
+    if index == 0:
+        return None
+    path = tracker_path(done[index - 1]["landmarks_path"])
+    # No file: the person was never tracked (or the checkpoint predates the box)
+    return tuple(int(v) for v in np.load(path)) if path.exists() else None
+
+
+def run_job(store: JobStore, job: Job, progress: Callable[[int, int], None] | None = None,
+            on_segment: Callable[[int, str | None], None] | None = None) -> JobResult:
+    """
+    Render the job's missing segments, then join them. `progress` gets frames
+    done over all segments; `on_segment(index, video_path)` is called as each
+    segment starts (e.g. to preview a fragmented segment while it renders).
+    """
+    params = job.params
+    style = OverlayStyle(**{k: tuple(v) if isinstance(v, list) else v for k, v in params["style"].items()})
+    plan = RenderPlan(**params["plan"])
+    encoder = EncoderSettings(**params["encoder"])
+    motion_lookup = {int(sec): text for sec, text in params["motion_lookup"].items()}
+    fps, draw = params["fps"], params["draw"]
+    renditions = [Rendition(**r) for r in params.get("renditions", [])] if draw else []
+    segments = job.segments
+    # Open-ended segments are counted to the expected frame count for progress
+    total = sum((end if end is not None else max(params["frame_count"], start)) - start for start, end in segments)
+    job_dir = store.job_dir(job.id)
+
+    start_time = time.perf_counter()
+    # Queried once; segments rendered here are added as they complete
+    done_segments = store.completed_segments(job.id)
+    resumed = sum(row["end_frame"] - row["start_frame"] for row in done_segments.values())
+    done = resumed
+    codec = "none"
+    allocations = 0.0
+    allocated_bytes = 0.0
+    traced = True
+    # The Parquet export is streamed as frames are rendered: checkpointed segments are replayed
+    # into it in order, the others write through the render loop. It gets its final name at the end
+    landmarks_path = str(job_dir / "landmarks.parquet") if PYARROW_AVAILABLE else None
+    landmarks_partial = str(job_dir / "landmarks.partial.parquet") if PYARROW_AVAILABLE else None
+    writer = None
+    try:
+        if landmarks_partial is not None:
+            writer = LandmarkWriter(landmarks_partial, fps).open()
+        # Refuse a job whose settings no longer fit the budget before decoding anything
+        if params.get("memory_budget_mb"):
+            cap = cv2.VideoCapture(job.input_path)
+            info = probe_video(cap)
+            cap.release()
+            check_budget(estimate_job_memory(info, plan, encoder, draw, total, os.path.getsize(job.input_path),
+                                             renditions, style.trails or style.heatmap), params["memory_budget_mb"])
+        for index, segment in enumerate(segments):
+            if index in done_segments:
+                if writer is not None:
+                    row = done_segments[index]
+                    for frame_idx, landmarks in enumerate(np.load(row["landmarks_path"]), row["start_frame"]):
+                        writer.append(frame_idx, landmarks)
+                continue
+            video_path = str(job_dir / f"segment_{index:05d}.mp4") if draw else None
+            partial_path = str(job_dir / f"segment_{index:05d}.partial.mp4") if draw else None
+            # Renditions are checkpointed per segment like the main video, except a
+            # preview, which only covers the start of the output: the first segment writes it
+            rendition_paths = [(r, job_dir / (f"{r.name}.{r.format}" if r.max_seconds
+                                              else f"segment_{index:05d}.{r.name}.{r.format}"))
+                               for r in renditions if not r.max_seconds or index == 0]
+            rendition_partials = [(r, path.with_suffix(".partial" + path.suffix)) for r, path in rendition_paths]
+            if on_segment is not None:
+                on_segment(index, partial_path)
+            last_beat = [time.monotonic()]
+
+            def segment_progress(processed, _total, base=done):
+                if progress is not None:
+                    progress(base + processed, total)
+                if time.monotonic() - last_beat[0] > HEARTBEAT_TIMEOUT / 4:
+                    store.heartbeat(job.id)
+                    last_beat[0] = time.monotonic()
+
+            # Trails and heatmap carry on from the segments before this one
+            history = layer_history(done_segments, index, fps) if draw and (style.trails or style.heatmap) else None
+            # People keep their IDs from the segment before this one, and IDs are never reused
+            seed, next_person_id = people_seed(done_segments, index, fps) if plan.max_people > 1 else (None, 0)
+            # The fallback box carries on from where the segment before ended
+            box = tracker_seed(done_segments, index) if draw else None
+            result = render_overlay_video(job.input_path, partial_path, motion_lookup, style, plan,
+                                          segment_progress, encoder, landmark_writer=writer, frame_ranges=[segment],
+                                          renditions=rendition_partials, layer_history=history,
+                                          people_seed=seed, next_person_id=next_person_id, tracker_seed=box)
+            codec = result.codec
+            allocations += result.allocations_per_frame * result.frames
+            if result.bytes_per_frame is None:
+                traced = False
+            else:
+                allocated_bytes += result.bytes_per_frame * result.frames
+            # The frames actually rendered: an open-ended segment stops at the end of the video
+            segment = (segment[0], segment[0] + result.frames)
+            segment_landmarks = str(job_dir / f"segment_{index:05d}.npy")
+            np.save(segment_landmarks, result.landmarks[segment[0]:segment[1]])
+            if plan.max_people > 1:
+                np.savez(people_path(segment_landmarks), next_id=np.int64(result.next_person_id),
+                         **{str(person_id): person_track[segment[0]:segment[1]]
+                            for person_id, person_track in result.people.items()})
+            if result.tracker_box is not None:
+                np.save(tracker_path(segment_landmarks), np.array(result.tracker_box, dtype=np.int64))
+            if draw:
+                # Only a complete segment ever has its final name
+                os.replace(partial_path, video_path)
+                for (_, partial), (_, final) in zip(rendition_partials, rendition_paths):
+                    os.replace(partial, final)
+            store.complete_segment(job.id, index, segment, video_path, segment_landmarks)
+            done_segments[index] = {"start_frame": segment[0], "end_frame": segment[1],
+                                    "video_path": video_path, "landmarks_path": segment_landmarks}
+            done += result.frames
+
+        done_segments = [done_segments[index] for index in range(len(segments))]
+        # On the source timeline: to the probed end, or to where the video really ended
+        probed = params["frame_count"] if segments[-1][1] is not None else 0
+        track_frames = max([probed, 1, *(row["end_frame"] for row in done_segments if row["end_frame"] > row["start_frame"])])
+        frames = sum(row["end_frame"] - row["start_frame"] for row in done_segments)
+        track = np.full((track_frames, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        for row in done_segments:
+            landmarks = np.load(row["landmarks_path"])
+            track[row["start_frame"]:row["start_frame"] + len(landmarks)] = landmarks
+        people = {}
+        if plan.max_people > 1:
+            for row in done_segments:
+                start = row["start_frame"]
+                with np.load(people_path(row["landmarks_path"])) as saved:
+                    for person_id, person_track in saved_people(saved).items():
+                        full = people.setdefault(person_id, np.full_like(track, np.nan))
+                        full[start:start + len(person_track)] = person_track
+        if writer is not None:
+            writer.close()
+            os.replace(landmarks_partial, landmarks_path)
+        output_path = None
+        if draw:
+            output_path = str(job_dir / "output.mp4")
+            # A segment past the end of the video (the frame count was an overestimate) has no frames
+            joined = concat_videos([row["video_path"] for row in done_segments if row["end_frame"] > row["start_frame"]],
+                                   output_path, encoder)
+            if joined != "stream copy" or codec == "none":
+                codec = joined
+        rendition_outputs = {}
+        for rendition in renditions:
+            path = str(job_dir / f"{rendition.name}.{rendition.format}")
+            if not rendition.max_seconds:
+                concat_videos([job_dir / f"segment_{i:05d}.{rendition.name}.{rendition.format}"
+                               for i, row in enumerate(done_segments) if row["end_frame"] > row["start_frame"]],
+                              path, replace(encoder, crf=rendition.crf))
+            rendition_outputs[rendition.name] = path
+    except Exception as e:
+        # Streamlit's stop and rerun are not Exceptions: a stopped render (a
+        # server restart stops every session) stays 'running' until its
+        # heartbeat lapses, and is then offered for resuming
+        store.fail(job.id, str(e))
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+    store.finish(job.id, output_path)
+    # The joined video and landmarks replace the checkpoints
+    for path in job_dir.glob("segment_*"):
+        path.unlink()
+    rendered = max(done - resumed, 1)
+    return JobResult(output_path, codec, track, landmarks_path, frames, resumed, time.perf_counter() - start_time,
+                     allocations / rendered, allocated_bytes / rendered if traced else None, rendition_outputs, people)
@@ -0,0 +1,198 @@
+"""
+Automatic Laban effort labels from pose landmark time series.
+
+Produces the same table the overlay apps read from a hand-made CSV
+(`timestamp` plus one 0/1 column per motion, see `motion_time_stamp.csv`).
+Kinematics are computed over the whole (frames, 33, 4) landmark array at once
+and aggregated into one-second windows with NumPy reductions, so a 20-minute
+video is analyzed in well under a second once landmarks exist.
+
+Effort actions follow Laban's Weight / Time / Space factors:
+
+    Punching  strong  sudden     direct      Dabbing   light  sudden     direct
+    Slashing  strong  sudden     indirect    Flicking  light  sudden     indirect
+    Pressing  strong  sustained  direct      Gliding   light  sustained  direct
+
+Directing/Indirecting report the Space factor alone, Spreading/Enclosing the
+change in arm span, and Advancing/Retreating the change in apparent body size
+(moving towards or away from the camera).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+MOTION_LABELS = [
+    "Pressing", "Flicking", "Dabbing", "Punching", "Slashing", "Gliding",
+    "Enclosing", "Spreading", "Directing", "Indirecting", "Advancing", "Retreating",
+]
+
+# Thai names for reports and overlay text
+MOTION_LABELS_TH = {
+    "Pressing": "กด",
+    "Flicking": "สะบัด",
+    "Dabbing": "แตะ",
+    "Punching": "ชก",
+    "Slashing": "ฟัน",
+    "Gliding": "ลื่นไหล",
+    "Enclosing": "โอบเข้า",
+    "Spreading": "กางออก",
+    "Directing": "มุ่งตรง",
+    "Indirecting": "ไม่มุ่งตรง",
+    "Advancing": "เคลื่อนเข้า",
+    "Retreating": "ถอยออก",
+}
+
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+WRISTS = [LEFT_WRIST, RIGHT_WRIST]
+
+
+@dataclass
+class EffortThresholds:
+    """Thresholds in torso lengths (shoulder-to-hip midpoint distance) per second."""
+
+    active_speed: float = 0.6       # peak wrist speed for a second to count as movement
+    strong_acceleration: float = 12.0
+    sudden_jerk: float = 250.0
+    direct_straightness: float = 0.8
+    indirect_straightness: float = 0.5
+    span_change: float = 0.25       # change in wrist-to-wrist distance over the window
+    scale_change: float = 0.06      # log change in shoulder width over the window
+    smoothing_frames: int = 5
+
+
+def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average along axis 0 (edges use the available frames)."""
+    if window <= 1:
+        return values
+    padded = np.concatenate([np.zeros_like(values[:1]), values]).cumsum(axis=0)
+    n = len(values)
+    half = window // 2
+    idx = np.arange(n)
+    lo = np.clip(idx - half, 0, n)
+    hi = np.clip(idx + half + 1, 0, n)
+    counts = (hi - lo).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (padded[hi] - padded[lo]) / counts
+
+
+def _interpolate_gaps(landmarks: np.ndarray) -> np.ndarray:
+    """Fill frames without a pose (NaN) by linear interpolation over time."""
+    frames = len(landmarks)
+    flat = pd.DataFrame(landmarks.reshape(frames, -1))
+    flat = flat.interpolate(axis=0, limit_direction="both")
+    return flat.to_numpy(dtype=np.float32).reshape(landmarks.shape)
+
+
+def compute_motion_features(landmarks: np.ndarray, fps: float, aspect: float = 1.0,
+                            thresholds: EffortThresholds | None = None) -> pd.DataFrame:
+    """
+    Per-second kinematic features from a (frames, 33, 4) normalized landmark
+    array (NaN where no pose was found). `aspect` is width / height, so x and y
+    are measured in the same units.
+    """
+    thresholds = thresholds or EffortThresholds()
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    if not detected.any():
+        return pd.DataFrame()
+
+    xy = _interpolate_gaps(landmarks)[:, :, :2] * np.array([aspect, 1.0], dtype=np.float32)
+    xy = _moving_average(xy, thresholds.smoothing_frames)
+
+    shoulders = (xy[:, LEFT_SHOULDER] + xy[:, RIGHT_SHOULDER]) / 2
+    hips = (xy[:, LEFT_HIP] + xy[:, RIGHT_HIP]) / 2
+    torso = float(np.median(np.linalg.norm(shoulders - hips, axis=1)))
+    torso = torso if torso > 1e-6 else 1.0
+    body = xy / torso
+
+    # Kinematics of the wrists, in torso lengths per second (^2, ^3)
+    wrists = body[:, WRISTS]
+    velocity = np.gradient(wrists, axis=0) * fps
+    acceleration = np.gradient(velocity, axis=0) * fps
+    jerk = np.gradient(acceleration, axis=0) * fps
+    speed = np.linalg.norm(velocity, axis=2)
+    accel = np.linalg.norm(acceleration, axis=2)
+    jerk_mag = np.linalg.norm(jerk, axis=2)
+    steps = np.linalg.norm(np.diff(wrists, axis=0, prepend=wrists[:1]), axis=2)
+
+    span = np.linalg.norm(body[:, LEFT_WRIST] - body[:, RIGHT_WRIST], axis=1)
+    shoulder_width = np.linalg.norm(xy[:, LEFT_SHOULDER] - xy[:, RIGHT_SHOULDER], axis=1)
+    log_scale = np.log(np.maximum(shoulder_width, 1e-6))
+
+    # One-second windows: bins are contiguous, so reduceat over the bin starts
+    seconds = (np.arange(len(xy)) / fps).astype(int)
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    ends = np.r_[starts[1:], len(xy)] - 1
+
+    peak_speed = np.maximum.reduceat(speed, starts, axis=0)           # (bins, 2)
+    peak_accel = np.maximum.reduceat(accel, starts, axis=0)
+    peak_jerk = np.maximum.reduceat(jerk_mag, starts, axis=0)
+    path_length = np.add.reduceat(steps, starts, axis=0)
+    displacement = np.linalg.norm(wrists[ends] - wrists[starts], axis=2)
+    straightness = np.where(path_length > 0, displacement / np.maximum(path_length, 1e-9), 0.0)
+    coverage = np.add.reduceat(detected.astype(np.float32), starts) / (ends - starts + 1)
+
+    # Features of the more active wrist in each window
+    lead = np.argmax(peak_speed, axis=1)
+    rows = np.arange(len(starts))
+    return pd.DataFrame({
+        "second": seconds[starts],
+        "pose_coverage": coverage,
+        "peak_speed": peak_speed[rows, lead],
+        "peak_acceleration": peak_accel[rows, lead],
+        "peak_jerk": peak_jerk[rows, lead],
+        "straightness": straightness[rows, lead],
+        "span_change": span[ends] - span[starts],
+        "scale_change": log_scale[ends] - log_scale[starts],
+        "movement_energy": np.add.reduceat((speed ** 2).sum(axis=1), starts) / fps,
+    })
+
+
+def classify_efforts(features: pd.DataFrame, thresholds: EffortThresholds | None = None) -> pd.DataFrame:
+    """0/1 motion label columns for each row of `compute_motion_features`."""
+    thresholds = thresholds or EffortThresholds()
+    if features.empty:
+        return pd.DataFrame(columns=["second"] + MOTION_LABELS)
+
+    active = (features["peak_speed"] >= thresholds.active_speed) & (features["pose_coverage"] > 0)
+    strong = features["peak_acceleration"] >= thresholds.strong_acceleration
+    sudden = features["peak_jerk"] >= thresholds.sudden_jerk
+    direct = features["straightness"] >= thresholds.direct_straightness
+    indirect = features["straightness"] < thresholds.indirect_straightness
+
+    labels = pd.DataFrame({
+        "second": features["second"],
+        "Pressing": active & strong & ~sudden & direct,
+        "Flicking": active & ~strong & sudden & indirect,
+        "Dabbing": active & ~strong & sudden & direct,
+        "Punching": active & strong & sudden & direct,
+        "Slashing": active & strong & sudden & indirect,
+        "Gliding": active & ~strong & ~sudden & direct,
+        "Enclosing": active & (features["span_change"] <= -thresholds.span_change),
+        "Spreading": active & (features["span_change"] >= thresholds.span_change),
+        "Directing": active & direct,
+        "Indirecting": active & indirect,
+        "Advancing": features["scale_change"] >= thresholds.scale_change,
+        "Retreating": features["scale_change"] <= -thresholds.scale_change,
+    })
+    labels[MOTION_LABELS] = labels[MOTION_LABELS].astype(int)
+    return labels
+
+
+def format_timestamp(seconds: int) -> str:
+    """H:MM:SS, as in `motion_time_stamp_web_format.csv`."""
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def detect_motion_labels(landmarks: np.ndarray, fps: float, aspect: float = 1.0,
+                         thresholds: EffortThresholds | None = None) -> pd.DataFrame:
+    """The timestamp CSV table: one row per second with at least one label."""
+    labels = classify_efforts(compute_motion_features(landmarks, fps, aspect, thresholds), thresholds)
+    labels = labels[labels[MOTION_LABELS].any(axis=1)]
+    table = labels[MOTION_LABELS].copy()
+    table.insert(0, "timestamp", [format_timestamp(int(s)) for s in labels["second"]])
+    return table.reset_index(drop=True)
@@ -0,0 +1,104 @@
+"""
+Motion label text rendered with a TrueType font, for any script (Thai included).
+
+`cv2.putText` only has the Hershey fonts, which are ASCII-only. Here every
+distinct label of a job is rendered once with Pillow into a BGR patch plus
+its alpha weights (straight alpha: the colors are not premultiplied), and
+its position is fixed for the job's frame size. Drawing a label on a frame
+is then one `cv2.blendLinear` over a small region of interest into a
+preallocated buffer; Pillow never runs in the frame loop.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+from fonts import load_font
+
+# Font pixel size per unit of the Hershey-style "Text size" slider, so existing
+# settings keep roughly the same on-screen text height
+FONT_PX_PER_SCALE = 30
+MARGIN = 20
+
+
+class _Patch(NamedTuple):
+    rows: slice
+    cols: slice
+    # Clipped to the frame: BGR, alpha and 1 - alpha weights, blend output
+    color: np.ndarray
+    alpha: np.ndarray
+    inverse_alpha: np.ndarray
+    blended: np.ndarray
+
+
+def render_label(text: str, font_px: int, color_bgr: tuple, thickness: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """(h, w, 3) BGR and (h, w) float32 alpha of `text` with a dark outline."""
+    font = load_font(font_px, bold=thickness > 1)
+    stroke = max(1, thickness)
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke)
+    size = (max(right - left, 1), max(bottom - top, 1))
+    b, g, r = color_bgr
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((-left, -top), text, font=font, fill=(r, g, b, 255),
+                               stroke_width=stroke, stroke_fill=(0, 0, 0, 255))
+    rgba = np.asarray(image)
+    return np.ascontiguousarray(rgba[:, :, 2::-1]), rgba[:, :, 3].astype(np.float32) / 255.0
+
+
+def label_origin(position: str, frame_size: tuple[int, int], patch_size: tuple[int, int],
+                 custom_x: int = 80, custom_y: int = 80) -> tuple[int, int]:
+    """Top-left corner of the label, `MARGIN` pixels in from the chosen frame edges."""
+    width, height = frame_size
+    w, h = patch_size
+    if position == "Bottom Right":
+        return width - w - MARGIN, height - h - MARGIN
+    if position == "Bottom Left":
+        return MARGIN, height - h - MARGIN
+    if position == "Top Right":
+        return width - w - MARGIN, MARGIN
+    if position == "Top Left":
+        return MARGIN, MARGIN
+    if position == "Center":
+        return (width - w) // 2, (height - h) // 2
+    # Custom: the point is the text's bottom-left corner, like cv2.putText's origin
+    return int(custom_x / 100 * width), int(custom_y / 100 * height) - h
+
+
+class LabelAtlas:
+    """Every label of a job, pre-rendered and pre-positioned for one frame size."""
+
+    def __init__(self, texts: Iterable[str], frame_size: tuple[int, int], style):
+        self.frame_size = frame_size
+        font_px = max(8, round(style.motion_font_scale * FONT_PX_PER_SCALE))
+        self._patches: dict[str, _Patch | None] = {}
+        for text in set(texts):
+            self._patches[text] = self._place(text, font_px, style)
+
+    def _place(self, text: str, font_px: int, style) -> _Patch | None:
+        color, alpha = render_label(text, font_px, style.motion_color_bgr, style.motion_font_thickness)
+        h, w = alpha.shape
+        x, y = label_origin(style.motion_position, self.frame_size, (w, h), style.custom_x, style.custom_y)
+        # Clip to the frame; a label entirely off-frame is skipped
+        width, height = self.frame_size
+        x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        color = np.ascontiguousarray(color[y0 - y:y1 - y, x0 - x:x1 - x])
+        alpha = np.ascontiguousarray(alpha[y0 - y:y1 - y, x0 - x:x1 - x])
+        return _Patch(slice(y0, y1), slice(x0, x1), color, alpha, 1.0 - alpha, np.empty_like(color))
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._patches
+
+    def draw(self, frame: np.ndarray, text: str) -> None:
+        """Blend a pre-rendered label onto `frame` in place."""
+        patch = self._patches.get(text)
+        if patch is None:
+            return
+        roi = frame[patch.rows, patch.cols]
+        cv2.blendLinear(roi, patch.color, patch.inverse_alpha, patch.alpha, dst=patch.blended)
+        roi[:] = patch.blended
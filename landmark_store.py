@@ -0,0 +1,201 @@
+"""
+Columnar landmark export (Parquet / Arrow IPC).
+
+One row per frame: `frame`, `timestamp` (seconds) and one float32 column per
+joint coordinate (`nose_x`, `nose_y`, `nose_z`, `nose_visibility`, ...). Frames
+without a pose are NaN. `LandmarkWriter` fills a preallocated batch during the
+render and writes it as one row group / record batch when full.
+
+`LandmarkReader` memory-maps the file and uses the per-batch timestamp ranges
+to read only the batches a time-range query touches, so hour-long sessions
+are never loaded whole. Arrow IPC (`.arrow`) files are read zero-copy;
+Parquet row groups are decoded individually.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from pose_backends import NUM_LANDMARKS
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = ipc = pq = None
+    PYARROW_AVAILABLE = False
+
+# MediaPipe Pose landmark names, in index order
+LANDMARK_NAMES = [
+    "nose", "left_eye_inner", "left_eye", "left_eye_outer", "right_eye_inner", "right_eye",
+    "right_eye_outer", "left_ear", "right_ear", "mouth_left", "mouth_right",
+    "left_shoulder", "right_shoulder", "left_elbow", "right_elbow", "left_wrist", "right_wrist",
+    "left_pinky", "right_pinky", "left_index", "right_index", "left_thumb", "right_thumb",
+    "left_hip", "right_hip", "left_knee", "right_knee", "left_ankle", "right_ankle",
+    "left_heel", "right_heel", "left_foot_index", "right_foot_index",
+]
+COORDINATES = ("x", "y", "z", "visibility")
+LANDMARK_COLUMNS = [f"{name}_{coord}" for name in LANDMARK_NAMES for coord in COORDINATES]
+
+# Frames per row group / record batch (about 0.5 MB of landmarks)
+DEFAULT_BATCH_FRAMES = 1024
+
+
+def landmark_schema() -> "pa.Schema":
+    fields = [pa.field("frame", pa.int32()), pa.field("timestamp", pa.float64())]
+    fields += [pa.field(column, pa.float32()) for column in LANDMARK_COLUMNS]
+    return pa.schema(fields)
+
+
+def _is_parquet(path: Path) -> bool:
+    return path.suffix.lower() in (".parquet", ".pq")
+
+
+class LandmarkWriter:
+    """Append per-frame landmarks; writes a row group every `batch_frames` frames."""
+
+    def __init__(self, path: str | Path, fps: float, batch_frames: int = DEFAULT_BATCH_FRAMES):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("Landmark export needs pyarrow")
+        self.path = Path(path)
+        self.fps = fps
+        self.batch_frames = batch_frames
+        self.frames_written = 0
+        self._schema = landmark_schema()
+        self._frames = np.empty(batch_frames, dtype=np.int32)
+        self._values = np.empty((batch_frames, NUM_LANDMARKS * 4), dtype=np.float32)
+        self._count = 0
+        self._writer = None
+
+    def open(self) -> "LandmarkWriter":
+        if _is_parquet(self.path):
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        else:
+            self._writer = ipc.new_file(self.path, self._schema)
+        return self
+
+    def append(self, frame_idx: int, landmarks: np.ndarray | None) -> None:
+        self._frames[self._count] = frame_idx
+        if landmarks is None:
+            self._values[self._count] = np.nan
+        else:
+            self._values[self._count] = landmarks.reshape(-1)
+        self._count += 1
+        if self._count == self.batch_frames:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._count:
+            return
+        n = self._count
+        frames = self._frames[:n]
+        columns = [pa.array(frames), pa.array(frames / self.fps)]
+        columns += [pa.array(self._values[:n, i]) for i in range(self._values.shape[1])]
+        batch = pa.RecordBatch.from_arrays(columns, schema=self._schema)
+        if _is_parquet(self.path):
+            self._writer.write_batch(batch, row_group_size=n)
+        else:
+            self._writer.write_batch(batch)
+        self.frames_written += n
+        self._count = 0
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "LandmarkWriter":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_landmarks(path: str | Path, landmarks: np.ndarray, fps: float,
+                    batch_frames: int = DEFAULT_BATCH_FRAMES) -> Path:
+    """Export a whole (frames, 33, 4) track, e.g. `RenderResult.landmarks`."""
+    with LandmarkWriter(path, fps, batch_frames) as writer:
+        for frame_idx, frame_landmarks in enumerate(landmarks):
+            writer.append(frame_idx, frame_landmarks)
+    return Path(path)
+
+
+class LandmarkReader:
+    """Memory-mapped reader with time-range queries over batch timestamp ranges."""
+
+    def __init__(self, path: str | Path):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("Reading landmark exports needs pyarrow")
+        self.path = Path(path)
+        if _is_parquet(self.path):
+            self._parquet = pq.ParquetFile(self.path, memory_map=True)
+            self._ipc = None
+            metadata = self._parquet.metadata
+            ts_index = self._parquet.schema_arrow.get_field_index("timestamp")
+            ranges = []
+            for i in range(metadata.num_row_groups):
+                stats = metadata.row_group(i).column(ts_index).statistics
+                ranges.append((stats.min, stats.max))
+        else:
+            self._source = pa.memory_map(str(self.path), "r")
+            self._ipc = ipc.open_file(self._source)
+            self._parquet = None
+            ranges = []
+            for i in range(self._ipc.num_record_batches):
+                timestamps = self._ipc.get_batch(i).column("timestamp")
+                ranges.append((timestamps[0].as_py(), timestamps[-1].as_py()) if len(timestamps) else (0.0, -1.0))
+        self._starts = np.array([r[0] for r in ranges], dtype=np.float64)
+        self._ends = np.array([r[1] for r in ranges], dtype=np.float64)
+
+    @property
+    def num_batches(self) -> int:
+        return len(self._starts)
+
+    @property
+    def duration(self) -> float:
+        return float(self._ends.max()) if len(self._ends) else 0.0
+
+    def _batch(self, i: int) -> "pa.RecordBatch | pa.Table":
+        if self._ipc is not None:
+            return self._ipc.get_batch(i)
+        return self._parquet.read_row_group(i)
+
+    def read_range(self, start: float, end: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(frames, timestamps, (n, 33, 4) landmarks) for start <= timestamp < end."""
+        # Timestamps grow with the frame index, so batches are sorted by time
+        first = int(np.searchsorted(self._ends, start, side="left"))
+        last = int(np.searchsorted(self._starts, end, side="left"))
+        frames, timestamps, values = [], [], []
+        for i in range(first, last):
+            batch = self._batch(i)
+            ts = batch.column("timestamp").to_numpy()
+            lo, hi = np.searchsorted(ts, [start, end], side="left")
+            if lo == hi:
+                continue
+            frames.append(batch.column("frame").to_numpy()[lo:hi])
+            timestamps.append(ts[lo:hi])
+            values.append(np.column_stack([batch.column(c).to_numpy()[lo:hi] for c in LANDMARK_COLUMNS]))
+        if not frames:
+            return (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64),
+                    np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32))
+        return (np.concatenate(frames), np.concatenate(timestamps),
+                np.concatenate(values).reshape(-1, NUM_LANDMARKS, 4))
+
+    def read_all(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.read_range(float("-inf"), float("inf"))
+
+    def close(self) -> None:
+        if self._ipc is not None:
+            self._source.close()
+            self._ipc = None
+
+    def __enter__(self) -> "LandmarkReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,215 @@
+"""
+Live skeleton overlay for cameras and network streams.
+
+A reader thread keeps only the newest frames (drop-oldest), so a slow pose
+model never builds up a backlog: the overlay always shows the latest frame
+it could afford. Frames are decoded into recycled buffers, but a buffer is
+only reused once it was dropped from the queue or the consumer handed it
+back, so a frame is never overwritten while it is inferred or drawn. Local
+files can be replayed at their real frame rate to test the live path
+offline. The inference stride adapts to keep the capture-to-display latency
+within a budget. A source that stalls still yields regularly (without a
+frame), so the page stays responsive, and is given up after
+`LIVE_STALL_SECONDS`.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator, NamedTuple
+
+import cv2
+import numpy as np
+
+from overlay import draw_improved_skeleton, draw_pose_landmarks
+from person_detector import PersonTracker
+from pose_backends import PoseBackend
+from render_engine import OverlayStyle
+
+DEFAULT_LATENCY_BUDGET = 0.15  # seconds from capture to display
+MAX_STRIDE = 8
+# A source without a new frame for this long is treated as ended
+LIVE_STALL_SECONDS = float(os.environ.get("LIVE_STALL_SECONDS", "30"))
+
+
+def parse_source(text: str) -> int | str:
+    """Webcam index ("0") or a URL / file path."""
+    text = text.strip()
+    return int(text) if text.isdigit() else text
+
+
+class FrameGrabber:
+    """Reads frames on a thread into a small queue that drops the oldest frame when full."""
+
+    def __init__(self, source: int | str, realtime: bool = False, depth: int = 1):
+        self.source = source
+        # Files decode faster than real time; pace them at their own fps
+        self.realtime = realtime
+        self.depth = depth
+        self.dropped = 0
+        self.finished = False
+        self.fps = 0.0
+        self._queue: deque[tuple[np.ndarray, float]] = deque()
+        # Buffers nobody holds: dropped frames and frames given back with `release`
+        self._free: list[np.ndarray] = []
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cap = None
+
+    def start(self) -> "FrameGrabber":
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            raise ValueError(f"Cannot open live source: {self.source}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        index = 0
+        try:
+            while not self._stop.is_set():
+                # A new buffer only while none is free: at most the queue, the
+                # consumer's frames and the one being decoded exist at once
+                with self._ready:
+                    buffer = self._free.pop() if self._free else None
+                ret, frame = self._cap.read(image=buffer)
+                if not ret:
+                    break
+                if self.realtime:
+                    delay = started + index / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                index += 1
+                with self._ready:
+                    if len(self._queue) == self.depth:
+                        dropped, _ = self._queue.popleft()
+                        self._free.append(dropped)
+                        self.dropped += 1
+                    self._queue.append((frame, time.perf_counter()))
+                    self._ready.notify()
+        finally:
+            self._cap.release()
+            with self._ready:
+                self.finished = True
+                self._ready.notify_all()
+
+    def read(self, timeout: float = 1.0) -> tuple[np.ndarray, float] | None:
+        """
+        Newest frame and its capture time, or None if the source ended (or
+        timed out). The frame is the caller's until it is given back with
+        `release`; frames never released are simply not reused.
+        """
+        with self._ready:
+            if not self._queue and not self.finished:
+                self._ready.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+    def release(self, frame: np.ndarray) -> None:
+        """Hand a frame from `read` back for decoding into, once it is no longer used."""
+        with self._ready:
+            self._free.append(frame)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def __enter__(self) -> "FrameGrabber":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class AdaptiveStride:
+    """Run inference less often while latency is over budget, more often when well under."""
+
+    def __init__(self, budget: float = DEFAULT_LATENCY_BUDGET, max_stride: int = MAX_STRIDE,
+                 smoothing: float = 0.2, settle_frames: int = 10):
+        self.budget = budget
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+        self.settle_frames = settle_frames
+        self.stride = 1
+        self.latency = 0.0
+        self._since_change = 0
+
+    def update(self, latency: float) -> int:
+        self.latency = latency if self.latency == 0.0 else (
+            self.smoothing * latency + (1 - self.smoothing) * self.latency)
+        self._since_change += 1
+        # Give each change a few frames to show its effect before the next one
+        if self._since_change >= self.settle_frames:
+            if self.latency > self.budget and self.stride < self.max_stride:
+                self.stride += 1
+                self._since_change = 0
+            elif self.latency < self.budget / 2 and self.stride > 1:
+                self.stride -= 1
+                self._since_change = 0
+        return self.stride
+
+
+class LiveStats(NamedTuple):
+    fps: float
+    latency_ms: float
+    dropped: int
+    stride: int
+    frames: int
+    # Seconds since the last frame while the source is stalled, else 0
+    waiting: float = 0.0
+
+
+def live_overlay(grabber: FrameGrabber, pose: PoseBackend, style: OverlayStyle,
+                 budget: float = DEFAULT_LATENCY_BUDGET,
+                 stall_seconds: float = LIVE_STALL_SECONDS) -> Iterator[tuple[np.ndarray | None, LiveStats]]:
+    """
+    Yield overlaid frames with live stats until the source ends or sends
+    nothing for `stall_seconds`. A yielded frame is valid until the next one
+    is requested; it is then given back to the grabber. While the source is
+    stalled, (None, stats) is yielded about once a second.
+    """
+    stride = AdaptiveStride(budget)
+    tracker = PersonTracker()
+    landmarks = None
+    person_box = None
+    frames = 0
+    interval = 0.0
+    last_output = None
+    last_frame = time.perf_counter()
+    while True:
+        item = grabber.read()
+        if item is None:
+            waiting = time.perf_counter() - last_frame
+            if grabber.finished or waiting >= stall_seconds:
+                return
+            yield None, LiveStats(0.0, stride.latency * 1000, grabber.dropped, stride.stride, frames, waiting)
+            continue
+        frame, captured_at = item
+        last_frame = time.perf_counter()
+
+        if frames % stride.stride == 0:
+            landmarks = pose.process(frame)
+            person_box = tracker.update(frame) if landmarks is None else None
+        if landmarks is not None:
+            draw_pose_landmarks(frame, landmarks, style.line_color_bgr, style.dot_color_bgr,
+                                style.line_thickness, style.dot_radius)
+        else:
+            draw_improved_skeleton(frame, *person_box, style.line_color_bgr, style.dot_color_bgr,
+                                   style.line_thickness, style.dot_radius)
+
+        now = time.perf_counter()
+        if last_output is not None:
+            # Average the interval, not the rate: a rate average is skewed by back-to-back frames
+            interval = now - last_output if interval == 0.0 else 0.1 * (now - last_output) + 0.9 * interval
+        last_output = now
+        frames += 1
+        stride.update(now - captured_at)
+        fps = 1.0 / interval if interval > 0 else 0.0
+        yield frame, LiveStats(fps, stride.latency * 1000, grabber.dropped, stride.stride, frames)
+        grabber.release(frame)
@@ -0,0 +1,414 @@
+"""
+Concurrent-session load test for the Streamlit apps.
+
+Starts `streamlit run <app>` on a free local port (or targets `--url`) and
+drives N headless sessions over Streamlit's own websocket protocol, the way
+a browser does: each session uploads a synthetic video (and CSV), clicks the
+generate button, waits for the run to finish and fetches every download.
+Per-step latencies, errors and the server's RSS / CPU over time (from
+/proc, including ffmpeg child processes) are reported at the end.
+
+    python load_test.py streamlit_app.py --sessions 20 --button "Generate Skeleton Overlay"
+    python load_test.py app.py --sessions 20 --button "Analysis" --csv
+
+Needs the `websockets` package (installed with recent Streamlit versions).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import cv2
+import numpy as np
+import requests
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+from laban_analysis import MOTION_LABELS
+
+STEPS = ["connect", "upload", "generate", "download"]
+RUN_TIMEOUT = 900.0
+
+
+def synthetic_video(path: str | Path, seconds: float = 10.0, size: tuple[int, int] = (640, 360),
+                    fps: float = 30.0) -> Path:
+    """A stick figure walking across a dark background (mp4v, so no ffmpeg is needed)."""
+    width, height = size
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(int(seconds * fps)):
+        frame[:] = (30, 30, 30)
+        t = i / fps
+        x = int(width * (0.2 + 0.6 * (t / seconds)))
+        y = height // 2
+        swing = int(height * 0.08 * np.sin(t * 4))
+        color = (220, 220, 220)
+        cv2.circle(frame, (x, y - height // 5), height // 20, color, -1)
+        cv2.line(frame, (x, y - height // 6), (x, y + height // 10), color, 4)
+        cv2.line(frame, (x, y - height // 10), (x - swing - 30, y), color, 3)
+        cv2.line(frame, (x, y - height // 10), (x + swing + 30, y), color, 3)
+        cv2.line(frame, (x, y + height // 10), (x - swing, y + height // 4), color, 3)
+        cv2.line(frame, (x, y + height // 10), (x + swing, y + height // 4), color, 3)
+        out.write(frame)
+    out.release()
+    return Path(path)
+
+
+def synthetic_csv(path: str | Path, seconds: float = 10.0) -> Path:
+    """Reference CSV in the `motion_time_stamp.csv` format, one motion every two seconds."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp"] + MOTION_LABELS)
+        for n, sec in enumerate(range(1, int(seconds), 2)):
+            writer.writerow([f"{sec // 60}:{sec % 60:02d}"] + [int(i == n % len(MOTION_LABELS))
+                                                              for i in range(len(MOTION_LABELS))])
+    return Path(path)
+
+
+class ResourceSampler:
+    """Samples RSS and CPU of a process and its descendants from /proc on a thread."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        # (seconds since start, rss bytes, cpu percent of one core)
+        self.samples: list[tuple[float, int, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page = os.sysconf("SC_PAGE_SIZE")
+
+    def _tree(self) -> list[int]:
+        children: dict[int, list[int]] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    stat = Path(f"/proc/{entry}/stat").read_text()
+                except OSError:
+                    continue
+                ppid = int(stat.rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+        tree, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children.get(pid, []))
+        return tree
+
+    def _usage(self) -> tuple[int, int]:
+        rss = cpu = 0
+        for pid in self._tree():
+            try:
+                fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime and stime, then rss in pages (fields 14, 15 and 24 of stat)
+            cpu += int(fields[11]) + int(fields[12])
+            rss += int(fields[21]) * self._page
+        return rss, cpu
+
+    def _run(self) -> None:
+        start = time.monotonic()
+        _, last_cpu = self._usage()
+        last = start
+        while not self._stop.wait(self.interval):
+            rss, cpu = self._usage()
+            now = time.monotonic()
+            self.samples.append((now - start, rss, (cpu - last_cpu) / self._ticks / (now - last) * 100))
+            last, last_cpu = now, cpu
+
+    def start(self) -> "ResourceSampler":
+        if Path(f"/proc/{self.pid}/stat").exists():
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+@dataclass
+class SessionResult:
+    latencies: dict[str, float] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+    downloaded_bytes: int = 0
+
+
+class Session:
+    """One simulated browser tab."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.session_id = None
+        self.elements: list = []
+        self._ws = None
+        self._widgets: dict[str, object] = {}
+
+    async def connect(self) -> None:
+        ws_url = self.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self._ws = await websockets.connect(ws_url, subprotocols=["streamlit"], max_size=None,
+                                            open_timeout=30)
+
+    async def close(self) -> None:
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def run(self, trigger: str | None = None) -> list[str]:
+        """Rerun the script with the current widget states (plus a button click); returns error texts."""
+        msg = BackMsg()
+        # An empty rerun_script must still be marked present in the oneof
+        msg.rerun_script.SetInParent()
+        states = msg.rerun_script.widget_states
+        for widget_id, value in self._widgets.items():
+            state = states.widgets.add()
+            state.id = widget_id
+            state.file_uploader_state_value.CopyFrom(value)
+        if trigger is not None:
+            state = states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+        await self._ws.send(msg.SerializeToString())
+        return await self._wait_for_run()
+
+    async def _wait_for_run(self) -> list[str]:
+        errors = []
+        deadline = time.monotonic() + RUN_TIMEOUT
+        while True:
+            data = await asyncio.wait_for(self._ws.recv(), max(deadline - time.monotonic(), 0.1))
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = msg.new_session.initialize.session_id or self.session_id
+                self.elements = []
+                errors = []
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                self.elements.append(element)
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    errors.append(f"{element.exception.type}: {element.exception.message}")
+                elif element_type == "alert" and element.alert.format == Alert.ERROR:
+                    errors.append(element.alert.body)
+            elif kind == "script_finished":
+                # A run cut short by st.rerun() is followed by another run
+                if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                        errors.append("script compile error")
+                    return errors
+
+    def widgets(self, element_type: str) -> list:
+        return [getattr(e, element_type) for e in self.elements if e.WhichOneof("type") == element_type]
+
+    async def upload(self, uploader, path: Path) -> None:
+        """Upload a file the way the browser does, then set the uploader's widget state."""
+        request = BackMsg()
+        request.file_urls_request.request_id = uuid.uuid4().hex
+        request.file_urls_request.file_names.append(path.name)
+        request.file_urls_request.session_id = self.session_id
+        await self._ws.send(request.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(self._ws.recv(), 60))
+            if msg.WhichOneof("type") == "file_urls_response":
+                break
+        if msg.file_urls_response.error_msg:
+            raise RuntimeError(msg.file_urls_response.error_msg)
+        urls = msg.file_urls_response.file_urls[0]
+        data = path.read_bytes()
+        response = await asyncio.to_thread(
+            requests.put, self.base_url + urls.upload_url, files={"file": (path.name, data)}, timeout=300)
+        response.raise_for_status()
+        state = FileUploaderState()
+        info = state.uploaded_file_info.add()
+        info.file_id = urls.file_id
+        info.name = path.name
+        info.size = len(data)
+        info.file_urls.CopyFrom(urls)
+        self._widgets[uploader.id] = state
+
+    async def download_all(self) -> int:
+        total = 0
+        for button in self.widgets("download_button"):
+            if not button.url:
+                continue
+            url = button.url if button.url.startswith("http") else self.base_url + button.url
+            response = await asyncio.to_thread(requests.get, url, timeout=300)
+            response.raise_for_status()
+            total += len(response.content)
+        return total
+
+
+async def simulate_session(base_url: str, video: Path, csv_path: Path | None, button_label: str) -> SessionResult:
+    result = SessionResult()
+    session = Session(base_url)
+    step = "connect"
+    try:
+        started = time.perf_counter()
+        await session.connect()
+        result.errors += await session.run()
+        result.latencies[step] = time.perf_counter() - started
+
+        step = "upload"
+        started = time.perf_counter()
+        for uploader in session.widgets("file_uploader"):
+            accepts_csv = any(t.lstrip(".") == "csv" for t in uploader.type)
+            if accepts_csv and csv_path is not None:
+                await session.upload(uploader, csv_path)
+            elif not accepts_csv:
+                await session.upload(uploader, video)
+        result.errors += await session.run()
+        result.latencies[step] = time.perf_counter() - started
+
+        step = "generate"
+        buttons = [b for b in session.widgets("button") if button_label in b.label]
+        if not buttons:
+            raise RuntimeError(f"no button labeled {button_label!r}")
+        started = time.perf_counter()
+        result.errors += await session.run(trigger=buttons[0].id)
+        result.latencies[step] = time.perf_counter() - started
+
+        step = "download"
+        started = time.perf_counter()
+        result.downloaded_bytes = await session.download_all()
+        result.latencies[step] = time.perf_counter() - started
+    except Exception as e:
+        result.errors.append(f"{step}: {type(e).__name__}: {e}")
+    finally:
+        await session.close()
+    return result
+
+
+async def run_sessions(base_url: str, sessions: int, ramp: float, video: Path, csv_path: Path | None,
+                       button_label: str) -> list[SessionResult]:
+    async def delayed(i: int) -> SessionResult:
+        await asyncio.sleep(i * ramp)
+        result = await simulate_session(base_url, video, csv_path, button_label)
+        status = f"{len(result.errors)} errors" if result.errors else "ok"
+        print(f"session {i}: {status}, {sum(result.latencies.values()):.1f}s", file=sys.stderr, flush=True)
+        return result
+
+    return await asyncio.gather(*(delayed(i) for i in range(sessions)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app: str, port: int) -> subprocess.Popen:
+    command = [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+               "--server.port", str(port), "--server.address", "127.0.0.1",
+               "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).ok:
+                return server
+        except requests.RequestException:
+            pass
+        if server.poll() is not None:
+            break
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("Streamlit server did not start")
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return f"p50 {p50:7.2f}s  p90 {p90:7.2f}s  p95 {p95:7.2f}s  p99 {p99:7.2f}s  max {max(values):7.2f}s"
+
+
+def report(results: list[SessionResult], sampler: ResourceSampler | None, wall: float) -> None:
+    print(f"\n{len(results)} sessions in {wall:.1f}s")
+    for step in STEPS:
+        print(f"  {step:<9} {percentiles([r.latencies[step] for r in results if step in r.latencies])}")
+    print(f"  downloaded per session: {np.mean([r.downloaded_bytes for r in results]) / 2**20:.1f} MiB")
+    failed = [r for r in results if r.errors]
+    print(f"  errors: {len(failed)}/{len(results)} sessions ({len(failed) / max(len(results), 1):.0%})")
+    for message in sorted({e for r in failed for e in r.errors})[:10]:
+        print(f"    - {message[:200]}")
+    if sampler is not None and sampler.samples:
+        rss = np.array([s[1] for s in sampler.samples], dtype=np.float64)
+        cpu = np.array([s[2] for s in sampler.samples])
+        baseline = rss[0]
+        print(f"  server RSS: start {baseline / 2**20:.0f} MiB, peak {rss.max() / 2**20:.0f} MiB, "
+              f"end {rss[-1] / 2**20:.0f} MiB, peak growth per session "
+              f"{(rss.max() - baseline) / max(len(results), 1) / 2**20:.1f} MiB")
+        print(f"  server CPU: mean {cpu.mean():.0f}%, peak {cpu.max():.0f}% (100% = one core)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("app", nargs="?", default="streamlit_app.py", help="app script to serve")
+    parser.add_argument("--url", help="test a running server instead (no resource sampling unless --pid)")
+    parser.add_argument("--pid", type=int, help="server process to sample with --url")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=0.5, help="seconds between session starts")
+    parser.add_argument("--button", default="Generate Skeleton Overlay", help="label (or part) of the button to click")
+    parser.add_argument("--csv", action="store_true", help="also upload a synthetic reference CSV")
+    parser.add_argument("--video-seconds", type=float, default=10.0)
+    parser.add_argument("--samples-csv", help="write the RSS/CPU time series here")
+    args = parser.parse_args()
+    if not WEBSOCKETS_AVAILABLE:
+        sys.exit("load_test.py needs the websockets package: pip install websockets")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="load_test_"))
+    video = synthetic_video(work_dir / "synthetic.mp4", args.video_seconds)
+    csv_path = synthetic_csv(work_dir / "synthetic.csv", args.video_seconds) if args.csv else None
+
+    server = None
+    if args.url:
+        base_url, pid = args.url, args.pid
+    else:
+        port = free_port()
+        server = start_server(args.app, port)
+        base_url, pid = f"http://127.0.0.1:{port}", server.pid
+    sampler = ResourceSampler(pid).start() if pid else None
+    try:
+        started = time.perf_counter()
+        results = asyncio.run(run_sessions(base_url, args.sessions, args.ramp, video, csv_path, args.button))
+        wall = time.perf_counter() - started
+        # Let the server settle, to see whether session memory is released
+        time.sleep(2)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    report(results, sampler, wall)
+    if args.samples_csv and sampler is not None:
+        with open(args.samples_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["seconds", "rss_bytes", "cpu_percent"])
+            writer.writerows(sampler.samples)
+
+
+if __name__ == "__main__":
+    main()
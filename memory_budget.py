@@ -0,0 +1,237 @@
+"""
+Per-job memory budget.
+
+`estimate_job_memory` adds up what one render holds at the probed resolution
+and plan: the decoder and the frame rings, the inference buffers, the pose
+model and its worker processes, the ffmpeg/x264 frame queues (lookahead,
+reference and per-thread frames), the landmark track and, once the render
+is done, the output read back into memory for playback and download.
+`fit_to_budget` lowers the encoder queue depths, then the processing and
+output resolution, until the estimate fits. If nothing fits it raises
+`MemoryBudgetError`, so the job is refused before it starts rather than
+OOM-killed halfway.
+
+The per-pixel constants were measured on ffmpeg 7 / libx264 peak RSS and are
+deliberately on the high side.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import replace
+from typing import NamedTuple
+
+from pose_backends import POSE_WORKERS
+from pose_workers import POSE_WORKER_SLOTS
+from render_engine import RenderPlan, VideoInfo, scaled_size
+from video_encoder import EncoderSettings, Rendition, ffmpeg_has_encoder, rendition_size
+
+# Default per-job budget; 0 disables the check
+MEMORY_BUDGET_MB = int(os.environ.get("MEMORY_BUDGET_MB", "1024"))
+MB = 1024 * 1024
+
+# Output scales tried, largest first, when the budget is tight
+BUDGET_SCALES = (1.0, 0.75, 0.5, 0.35, 0.25)
+
+# In-process decoding: FrameRing of 2 BGR frames plus the decoder's own frame pool
+DECODE_RING_DEPTH = 2
+DECODER_BYTES_PER_PIXEL = 15
+# Inference input buffer plus the backend's RGB/blob copy
+INFERENCE_BYTES_PER_PIXEL = 6
+BACKEND_MEMORY_MB = {"mediapipe-0": 60, "mediapipe-1": 80, "mediapipe-2": 160, "opencv-dnn": 220, "heuristic": 0}
+# Multi-person tracking: the person detector; MediaPipe needs one instance per person
+PERSON_DETECTOR_MB = 30
+# Out-of-process pose: each worker's interpreter and libraries, plus its shared frame ring
+POSE_WORKER_BASE_MB = 60
+
+# ffmpeg subprocess: fixed cost, raw-frame queues between its threads, then
+# per lookahead frame and per reference/B-frame (x264 keeps sub-pel planes)
+FFMPEG_BASE_MB = 20
+FFMPEG_PIPELINE_BYTES_PER_PIXEL = 100
+X264_LOOKAHEAD_BYTES_PER_PIXEL = 3
+X264_REFERENCE_BYTES_PER_PIXEL = 7
+# preset -> (rc-lookahead, reference + B frames)
+X264_PRESET_QUEUES = {
+    "ultrafast": (0, 1), "superfast": (0, 4), "veryfast": (10, 4), "faster": (20, 5),
+    "fast": (30, 5), "medium": (40, 6), "slow": (50, 8),
+}
+OPENCV_ENCODER_BYTES_PER_PIXEL = 12
+# GIF previews: palettegen holds every frame until the end
+GIF_BYTES_PER_PIXEL_FRAME = 4
+
+# Output size: bits per pixel at CRF 23 (halved every 6 CRF steps) and for mp4v
+H264_BITS_PER_PIXEL = 0.08
+MP4V_BITS_PER_PIXEL = 0.3
+# The finished video is held as bytes by the page and by Streamlit's media store
+RESULT_COPIES = 2
+# Browser overlay: the source held by Streamlit's media file server
+BROWSER_PLAYER_COPIES = 1
+
+LANDMARK_BYTES_PER_FRAME = 33 * 4 * 4
+# Trail/heatmap layers: full-size upscale buffers (color and 1 - alpha)
+LAYER_BYTES_PER_PIXEL = 6
+
+
+class MemoryBudgetError(ValueError):
+    """The job cannot fit the memory budget at any resolution."""
+
+
+class MemoryEstimate(NamedTuple):
+    # Bytes held while frames are being rendered
+    working_set: int
+    # Bytes held once the result is loaded for playback and download
+    result: int
+    parts: dict[str, int]
+
+    @property
+    def total(self) -> int:
+        return self.working_set + self.result
+
+    def describe(self) -> str:
+        return ", ".join(f"{name} {size / MB:.0f} MB" for name, size in self.parts.items() if size >= MB)
+
+
+class BudgetFit(NamedTuple):
+    plan: RenderPlan
+    encoder: EncoderSettings
+    estimate: MemoryEstimate
+    # Human-readable list of what was lowered to fit
+    adjustments: list[str]
+
+
+def x264_threads(encoder: EncoderSettings) -> int:
+    """x264's frame threads: the setting, or its own default of 1.5 per core."""
+    return encoder.threads or max(1, (os.cpu_count() or 1) * 3 // 2)
+
+
+def x264_lookahead(encoder: EncoderSettings) -> int:
+    default, _ = X264_PRESET_QUEUES.get(encoder.preset, X264_PRESET_QUEUES["medium"])
+    return default if encoder.lookahead is None else encoder.lookahead
+
+
+def encoder_memory(encoder: EncoderSettings, size: tuple[int, int]) -> int:
+    pixels = size[0] * size[1]
+    if not (encoder.use_ffmpeg and ffmpeg_has_encoder("libx264")):
+        return pixels * OPENCV_ENCODER_BYTES_PER_PIXEL
+    _, references = X264_PRESET_QUEUES.get(encoder.preset, X264_PRESET_QUEUES["medium"])
+    # Every frame thread beyond the first keeps about two more reference-sized frames
+    references += 2 * (x264_threads(encoder) - 1)
+    per_pixel = (FFMPEG_PIPELINE_BYTES_PER_PIXEL
+                 + X264_LOOKAHEAD_BYTES_PER_PIXEL * x264_lookahead(encoder)
+                 + X264_REFERENCE_BYTES_PER_PIXEL * references)
+    return FFMPEG_BASE_MB * MB + pixels * per_pixel
+
+
+def rendition_memory(rendition: Rendition, encoder: EncoderSettings, size: tuple[int, int], fps: float) -> int:
+    width, height = rendition_size(rendition, size)
+    if rendition.format == "gif":
+        frames = (rendition.max_seconds or 10.0) * min(fps, rendition.max_fps or fps)
+        return FFMPEG_BASE_MB * MB + int(width * height * (FFMPEG_PIPELINE_BYTES_PER_PIXEL
+                                                           + GIF_BYTES_PER_PIXEL_FRAME * frames))
+    # Downscale buffer plus its own encoder
+    return width * height * 3 + encoder_memory(encoder, (width, height))
+
+
+def output_file_size(encoder: EncoderSettings, size: tuple[int, int], frames: int) -> int:
+    if encoder.use_ffmpeg and ffmpeg_has_encoder("libx264"):
+        bits_per_pixel = H264_BITS_PER_PIXEL * 2 ** ((23 - encoder.crf) / 6)
+    else:
+        bits_per_pixel = MP4V_BITS_PER_PIXEL
+    return int(size[0] * size[1] * frames * bits_per_pixel / 8)
+
+
+def estimate_job_memory(info: VideoInfo, plan: RenderPlan, encoder: EncoderSettings | None = None,
+                        draw: bool = True, frames: int | None = None, input_bytes: int = 0,
+                        renditions: list[Rendition] = (), layers: bool = False) -> MemoryEstimate:
+    """
+    Peak memory of one job. `frames` is the number of frames rendered
+    (defaults to the whole video); `input_bytes` is the source file size,
+    which the browser overlay serves to the page. Each extra rendition adds
+    its own encoder; `layers` is whether trails or the heatmap are drawn.
+    """
+    encoder = encoder or EncoderSettings()
+    frames = info.frame_count if frames is None else frames
+    source = (info.width, info.height)
+    out_size = scaled_size(info.width, info.height, plan.output_scale if draw else 1.0)
+    inference_size = scaled_size(info.width, info.height, min(plan.inference_scale, plan.output_scale))
+    source_pixels = source[0] * source[1]
+    out_pixels = out_size[0] * out_size[1]
+
+    people = max(plan.max_people, 1)
+    backend_instances = people if plan.backend_name.startswith("mediapipe") else 1
+    workers = backend_instances if POSE_WORKERS > 0 and plan.backend_name != "heuristic" else 0
+    # Single-person rings hold inference frames; multi-person crops are small
+    ring_pixels = inference_size[0] * inference_size[1] if people == 1 else 0
+    parts = {
+        "decode": source_pixels * (DECODE_RING_DEPTH * 3 + DECODER_BYTES_PER_PIXEL),
+        "resize": DECODE_RING_DEPTH * out_pixels * 3 if draw and out_size != source else 0,
+        "pose": (inference_size[0] * inference_size[1] * INFERENCE_BYTES_PER_PIXEL
+                 + BACKEND_MEMORY_MB.get(plan.backend_name, 100) * MB * backend_instances
+                 + (PERSON_DETECTOR_MB * MB if people > 1 else 0)
+                 + workers * (POSE_WORKER_BASE_MB * MB + POSE_WORKER_SLOTS * ring_pixels * 3)),
+        "encoder": encoder_memory(encoder, out_size) if draw else 0,
+        "layers": out_pixels * LAYER_BYTES_PER_PIXEL if draw and layers else 0,
+        "renditions": sum(rendition_memory(r, encoder, out_size, info.fps) for r in renditions) if draw else 0,
+        # The engine's full-length track plus the one a job assembles from its segments (and one per person)
+        "landmarks": (max(info.frame_count, 1) + frames) * LANDMARK_BYTES_PER_FRAME * (people + 1 if people > 1 else 1),
+    }
+    if draw:
+        result = RESULT_COPIES * output_file_size(encoder, out_size, frames)
+    else:
+        result = int(BROWSER_PLAYER_COPIES * input_bytes)
+    parts["result"] = result
+    return MemoryEstimate(sum(parts.values()) - result, result, parts)
+
+
+def fit_to_budget(info: VideoInfo, plan: RenderPlan, encoder: EncoderSettings | None, budget_mb: float,
+                  draw: bool = True, frames: int | None = None, input_bytes: int = 0,
+                  renditions: list[Rendition] = (), layers: bool = False) -> BudgetFit:
+    """
+    The highest-quality settings within `budget_mb`: first the encoder's
+    lookahead and thread queues are cut, then the output (and with it the
+    inference) resolution is lowered step by step. Raises `MemoryBudgetError`
+    if even the smallest settings do not fit.
+    """
+    encoder = encoder or EncoderSettings()
+    budget = budget_mb * MB
+
+    def estimate(p: RenderPlan, e: EncoderSettings) -> MemoryEstimate:
+        return estimate_job_memory(info, p, e, draw, frames, input_bytes, renditions, layers)
+
+    current = estimate(plan, encoder)
+    if budget <= 0 or current.total <= budget:
+        return BudgetFit(plan, encoder, current, [])
+
+    adjustments = []
+    if draw and encoder.use_ffmpeg:
+        if x264_lookahead(encoder) > 0:
+            encoder = replace(encoder, lookahead=0)
+            adjustments.append("encoder lookahead off")
+        if x264_threads(encoder) > 1:
+            encoder = replace(encoder, threads=1)
+            adjustments.append("one encoder thread")
+        current = estimate(plan, encoder)
+        if current.total <= budget:
+            return BudgetFit(plan, encoder, current, adjustments)
+
+    for scale in BUDGET_SCALES:
+        if scale >= plan.output_scale:
+            continue
+        smaller = replace(plan, output_scale=scale, inference_scale=min(plan.inference_scale, scale))
+        current = estimate(smaller, encoder)
+        if current.total <= budget:
+            return BudgetFit(smaller, encoder, current,
+                             adjustments + [f"output and processing at {scale:.0%} resolution"])
+    raise MemoryBudgetError(
+        f"This job needs about {current.total / MB:.0f} MB even at the lowest settings "
+        f"({current.describe()}); the memory budget is {budget_mb:.0f} MB."
+    )
+
+
+def check_budget(estimate: MemoryEstimate, budget_mb: float) -> None:
+    """Raise `MemoryBudgetError` if `estimate` is over a (non-zero) budget."""
+    if budget_mb > 0 and estimate.total > budget_mb * MB:
+        raise MemoryBudgetError(
+            f"Estimated {estimate.total / MB:.0f} MB ({estimate.describe()}) exceeds the "
+            f"{budget_mb:.0f} MB memory budget."
+        )
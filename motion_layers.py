@@ -0,0 +1,278 @@
+"""
+Motion trail and gesture heatmap overlay layers.
+
+Both layers are kept incrementally in small float buffers (about
+`LAYER_WIDTH` pixels wide) instead of being recomputed from the landmark
+history: every frame the buffers are multiplied by a decay factor and the new
+joint positions are added, fading trails as lines from the previous position
+of each wrist and ankle, the heatmap as a Gaussian splat at each wrist
+weighted by how far it moved. Drawing composites the two layers at low
+resolution as premultiplied color and 1 - alpha, upscales only the bands
+that still hold anything visible, and blends each onto the frame in place
+with one saturating uint8 multiply-add.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import cv2
+import numpy as np
+
+from laban_analysis import LEFT_WRIST, RIGHT_WRIST
+
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+# Joint -> trail color (BGR)
+TRAIL_COLORS = {
+    LEFT_WRIST: (255, 255, 0),
+    RIGHT_WRIST: (255, 0, 255),
+    LEFT_ANKLE: (0, 255, 255),
+    RIGHT_ANKLE: (0, 255, 0),
+}
+HEATMAP_JOINTS = (LEFT_WRIST, RIGHT_WRIST)
+
+LAYER_WIDTH = 480
+# A trail fades to 5% over this many seconds
+TRAIL_SECONDS = float(os.environ.get("TRAIL_SECONDS", "0.6"))
+# Heatmap half-life; 0 keeps the heatmap for the whole video
+HEATMAP_HALF_LIFE = float(os.environ.get("HEATMAP_HALF_LIFE", "30"))
+HEATMAP_OPACITY = 0.55
+# Heatmap levels (of 255, relative to the peak) below this are not drawn
+HEATMAP_VISIBLE = 2
+# Headroom over the hottest spot when the normalization level is raised
+HEATMAP_HEADROOM = 1.25
+# Splat radius as a fraction of the frame height
+HEATMAP_SIGMA = 0.03
+# Wrist movement (in layer pixels per frame) that counts as a full-strength gesture
+HEATMAP_FULL_MOVE = 3.0
+# Empty layer rows that split the blended region into separate bands
+BAND_GAP = 3
+# Values below this are cleared, so decayed buffers never degrade to denormals
+FLOOR = 1.0 / 512
+
+
+def _heat_tables() -> tuple[np.ndarray, np.ndarray]:
+    """Heat level (0-255) -> premultiplied turbo color and 1 - alpha."""
+    levels = np.arange(256, dtype=np.uint8)
+    colors = cv2.applyColorMap(levels.reshape(-1, 1), cv2.COLORMAP_TURBO).reshape(256, 3).astype(np.float32)
+    alpha = levels.astype(np.float32) * (HEATMAP_OPACITY / 255.0)
+    return colors * alpha[:, None], 1.0 - alpha
+
+
+_HEAT_PREMULTIPLIED, _HEAT_INVERSE = _heat_tables()
+
+
+class MotionLayers:
+    """Trail and heatmap state for one render, sized for its output frames."""
+
+    def __init__(self, frame_size: tuple[int, int], fps: float, trails: bool = True, heatmap: bool = True,
+                 line_thickness: int = 2):
+        self.frame_size = frame_size
+        self.trails = trails
+        self.heatmap = heatmap
+        width, height = frame_size
+        self.scale = min(1.0, LAYER_WIDTH / width)
+        self.layer_size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+        lw, lh = self.layer_size
+        fps = fps if fps > 0 else 30.0
+
+        # Premultiplied BGRA: decaying all four channels keeps color and alpha consistent
+        self._trail = np.zeros((lh, lw, 4), dtype=np.float32)
+        self.trail_decay = 0.05 ** (1.0 / max(TRAIL_SECONDS * fps, 1.0))
+        self._thickness = max(2, round(line_thickness * self.scale * 2))
+        self._previous: dict[int, tuple[int, int] | None] = {joint: None for joint in TRAIL_COLORS}
+
+        self._heat = np.zeros((lh, lw), dtype=np.float32)
+        self.heat_decay = 0.5 ** (1.0 / (HEATMAP_HALF_LIFE * fps)) if HEATMAP_HALF_LIFE > 0 else 1.0
+        # Heat is shown relative to this level. It decays with the heat, so the normalized
+        # heat only changes where a splat lands; it is raised (with headroom) when exceeded.
+        self._heat_scale = 0.0
+        self._heat_rescaled = False
+        self._heat_dirty: list[tuple[slice, slice]] = []
+        self._frames_since_floor = 0
+        self._floor_interval = max(1, round(HEATMAP_HALF_LIFE * fps)) if HEATMAP_HALF_LIFE > 0 else 0
+        sigma = max(1.0, HEATMAP_SIGMA * lh)
+        radius = int(math.ceil(3 * sigma))
+        kernel = cv2.getGaussianKernel(2 * radius + 1, sigma)
+        self._kernel = (kernel @ kernel.T / kernel.max() ** 2).astype(np.float32)
+        self._radius = radius
+        self._last_wrists: dict[int, tuple[int, int] | None] = {joint: None for joint in HEATMAP_JOINTS}
+
+        # Low-resolution composite and the full-resolution blend inputs, reused every frame
+        self._color = np.zeros((lh, lw, 3), dtype=np.uint8)
+        self._inverse = np.zeros((lh, lw, 3), dtype=np.uint8)
+        self._heat_u8 = np.zeros((lh, lw), dtype=np.uint8)
+        # Colorized heatmap: premultiplied color and 1 - alpha, updated where the heat changed
+        self._heat_premultiplied = np.zeros((lh, lw, 3), dtype=np.float32)
+        self._heat_inverse = np.ones((lh, lw), dtype=np.float32)
+        self._trail_alpha = np.zeros((lh, lw), dtype=np.float32)
+        self._up_color = np.zeros((height, width, 3), dtype=np.uint8)
+        self._up_inverse = np.zeros((height, width, 3), dtype=np.uint8)
+
+    @staticmethod
+    def prime_frames(fps: float) -> int | None:
+        """History frames whose heatmap contribution is still above 1% (None: all of them)."""
+        if HEATMAP_HALF_LIFE <= 0:
+            return None
+        return int(math.ceil(HEATMAP_HALF_LIFE * max(fps, 1.0) * math.log2(100)))
+
+    def prime(self, history: np.ndarray) -> None:
+        """
+        Warm the layers up with the (frames, 33, 4) landmarks leading into the
+        render, oldest first, without drawing. Heat is added already decayed to
+        its present weight, so only the trail-length tail is replayed frame by frame.
+        """
+        if self.heatmap:
+            for age, landmarks in zip(range(len(history) - 1, -1, -1), history):
+                self._add_heat(None if np.isnan(landmarks[0, 0]) else landmarks, self.heat_decay ** age)
+        if self.trails:
+            tail = int(math.ceil(math.log(FLOOR) / math.log(self.trail_decay)))
+            for landmarks in history[-tail:]:
+                self._update_trails(None if np.isnan(landmarks[0, 0]) else landmarks)
+
+    def _point(self, landmarks: np.ndarray | None, joint: int) -> tuple[int, int] | None:
+        if landmarks is None or landmarks[joint, 3] <= 0:
+            return None
+        lw, lh = self.layer_size
+        return int(landmarks[joint, 0] * lw), int(landmarks[joint, 1] * lh)
+
+    def update(self, landmarks: np.ndarray | None) -> None:
+        """Decay both layers by one frame and add the joints of `landmarks` (None: no pose)."""
+        if self.trails:
+            self._update_trails(landmarks)
+        if self.heatmap:
+            if self.heat_decay < 1.0:
+                self._heat *= self.heat_decay
+                self._heat_scale *= self.heat_decay
+                self._frames_since_floor += 1
+                if self._frames_since_floor >= self._floor_interval:
+                    # Clear heat too faint to show before it decays to denormals
+                    cv2.threshold(self._heat, self._heat_scale * FLOOR, 0, cv2.THRESH_TOZERO, dst=self._heat)
+                    self._frames_since_floor = 0
+            self._add_heat(landmarks)
+
+    def _update_trails(self, landmarks: np.ndarray | None) -> None:
+        self._trail *= self.trail_decay
+        cv2.threshold(self._trail, FLOOR, 0, cv2.THRESH_TOZERO, dst=self._trail)
+        for joint, (b, g, r) in TRAIL_COLORS.items():
+            point = self._point(landmarks, joint)
+            previous = self._previous[joint]
+            if point is not None and previous is not None:
+                cv2.line(self._trail, previous, point, (b / 255, g / 255, r / 255, 1.0),
+                         self._thickness, cv2.LINE_AA)
+            self._previous[joint] = point
+
+    def _add_heat(self, landmarks: np.ndarray | None, scale: float = 1.0) -> None:
+        """Splat each wrist, weighted by how far it moved since the last frame."""
+        for joint in HEATMAP_JOINTS:
+            point = self._point(landmarks, joint)
+            last = self._last_wrists[joint]
+            self._last_wrists[joint] = point
+            if point is None or last is None:
+                continue
+            weight = min(math.hypot(point[0] - last[0], point[1] - last[1]) / HEATMAP_FULL_MOVE, 1.0)
+            if weight > 0:
+                self._splat(point, weight * scale)
+
+    def _splat(self, point: tuple[int, int], weight: float) -> None:
+        lw, lh = self.layer_size
+        x, y = point
+        r = self._radius
+        x0, y0, x1, y1 = max(x - r, 0), max(y - r, 0), min(x + r + 1, lw), min(y + r + 1, lh)
+        if x0 >= x1 or y0 >= y1:
+            return
+        region = self._heat[y0:y1, x0:x1]
+        kernel = self._kernel[y0 - (y - r):y1 - (y - r), x0 - (x - r):x1 - (x - r)]
+        cv2.scaleAdd(kernel, weight, region, dst=region)
+        peak = float(region.max())
+        if peak > self._heat_scale:
+            self._heat_scale = peak * HEATMAP_HEADROOM
+            self._heat_rescaled = True
+        else:
+            self._heat_dirty.append((slice(y0, y1), slice(x0, x1)))
+
+    def _refresh_heat(self) -> None:
+        """Recolor the heatmap where it changed since the last frame (everywhere after a rescale)."""
+        if self._heat_rescaled:
+            regions = [(slice(None), slice(None))]
+        else:
+            regions = self._heat_dirty
+        for rows, cols in regions:
+            heat = cv2.convertScaleAbs(self._heat[rows, cols], alpha=255.0 / self._heat_scale)
+            self._heat_u8[rows, cols] = heat
+            self._heat_premultiplied[rows, cols] = _HEAT_PREMULTIPLIED[heat]
+            self._heat_inverse[rows, cols] = _HEAT_INVERSE[heat]
+        self._heat_rescaled = False
+        self._heat_dirty.clear()
+
+    def _visible_mask(self) -> np.ndarray | None:
+        """Layer pixels that still hold anything visible (uint8), or None."""
+        mask = None
+        if self.heatmap and self._heat_scale > 0:
+            self._refresh_heat()
+            mask = cv2.compare(self._heat_u8, HEATMAP_VISIBLE, cv2.CMP_GE)
+        if self.trails:
+            cv2.extractChannel(self._trail, 3, dst=self._trail_alpha)
+            trail_mask = cv2.compare(self._trail_alpha, 1.0 / 255, cv2.CMP_GT)
+            mask = trail_mask if mask is None else cv2.bitwise_or(mask, trail_mask)
+        return mask
+
+    def _bands(self, mask: np.ndarray) -> list[tuple[slice, slice]]:
+        """
+        Non-overlapping boxes covering the visible pixels: runs of visible rows
+        (split where more than `BAND_GAP` rows are empty, e.g. between hands and
+        feet), each cropped to its visible columns and padded by an empty pixel
+        so the upscale fades out at the edges.
+        """
+        x, y, w, h = cv2.boundingRect(mask)
+        if not (w and h):
+            return []
+        lw, lh = self.layer_size
+        visible = np.flatnonzero(cv2.reduce(mask[y:y + h, x:x + w], 1, cv2.REDUCE_MAX).ravel()) + y
+        splits = np.flatnonzero(np.diff(visible) > BAND_GAP)
+        bands = []
+        for start, end in zip(visible[np.r_[0, splits + 1]], visible[np.r_[splits, len(visible) - 1]] + 1):
+            top, bottom = max(start - 1, 0), min(end + 1, lh)
+            columns = np.flatnonzero(cv2.reduce(mask[top:bottom, x:x + w], 0, cv2.REDUCE_MAX).ravel()) + x
+            bands.append((slice(top, bottom), slice(max(columns[0] - 1, 0), min(columns[-1] + 2, lw))))
+        return bands
+
+    def _composite(self, rows: slice, cols: slice) -> None:
+        """Premultiplied color and 1 - alpha of trails over heatmap, as uint8, within one band."""
+        heat_premultiplied = self._heat_premultiplied[rows, cols]
+        heat_inverse = self._heat_inverse[rows, cols]
+        if self.trails:
+            # Trail over heatmap: color = trail + heat (1 - a_t), 1 - a = (1 - a_t)(1 - a_h)
+            trail_inverse = 1.0 - self._trail_alpha[rows, cols]
+            premultiplied = self._trail[rows, cols, :3] * 255.0
+            premultiplied += heat_premultiplied * trail_inverse[:, :, None]
+            np.minimum(premultiplied, 255.0, out=premultiplied)
+            inverse = trail_inverse * heat_inverse
+        else:
+            premultiplied, inverse = heat_premultiplied, heat_inverse
+        self._color[rows, cols] = premultiplied
+        self._inverse[rows, cols] = (inverse * 255.0)[:, :, None]
+
+    def draw(self, frame: np.ndarray) -> None:
+        """
+        Blend the layers onto `frame` in place, only where they have anything
+        to show: frame * (1 - a) + premultiplied color, as a saturating uint8
+        multiply-add on the upscaled band.
+        """
+        mask = self._visible_mask()
+        if mask is None:
+            return
+        width, height = self.frame_size
+        for rows, cols in self._bands(mask):
+            self._composite(rows, cols)
+            fx0, fy0 = int(cols.start / self.scale), int(rows.start / self.scale)
+            fx1 = min(int(math.ceil(cols.stop / self.scale)), width)
+            fy1 = min(int(math.ceil(rows.stop / self.scale)), height)
+            size = (fx1 - fx0, fy1 - fy0)
+            color = cv2.resize(self._color[rows, cols], size, dst=self._up_color[:size[1], :size[0]],
+                               interpolation=cv2.INTER_LINEAR)
+            inverse = cv2.resize(self._inverse[rows, cols], size, dst=self._up_inverse[:size[1], :size[0]],
+                                 interpolation=cv2.INTER_LINEAR)
+            roi = frame[fy0:fy1, fx0:fx1]
+            cv2.multiply(roi, inverse, dst=roi, scale=1.0 / 255)
+            cv2.add(roi, color, dst=roi)
@@ -0,0 +1,146 @@
+"""
+Motion statistics report (CSV/XLSX).
+
+Turns an annotation table (`time_sec` plus one 0/1 column per motion) and the
+landmark track into per-label counts, durations and per-minute rates, a label
+co-occurrence matrix and movement-energy summaries. Everything is aggregated
+with vectorized pandas/NumPy operations and written in one pass to
+`motion_report.csv` (the `timestamp,motion` log) and `motion_report.xlsx`
+(same sheet names as the bundled template, plus the detail sheets).
+
+`cached_report` keys the files by a digest of their inputs, so re-running the
+page or downloading again reuses the files already next to the render output.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from laban_analysis import compute_motion_features, format_timestamp
+
+
+def timestamp_seconds(timestamps: pd.Series) -> pd.Series:
+    """Whole seconds from H:MM:SS, MM:SS or plain-second timestamps."""
+    if timestamps.empty:
+        return pd.Series([], index=timestamps.index, dtype=int)
+    text = timestamps.astype(str).str.strip()
+    # Left-pad to H:M:S so every row splits into the same three fields
+    padded = (2 - text.str.count(':')).clip(lower=0).map(lambda n: "0:" * n) + text
+    hms = padded.str.split(':', n=2, expand=True).apply(pd.to_numeric, errors='coerce').fillna(0)
+    return (hms[0] * 3600 + hms[1] * 60 + hms[2]).astype(int)
+
+
+def label_matrix(motion_df: pd.DataFrame, motion_cols: list[str], duration_seconds: float) -> pd.DataFrame:
+    """0/1 matrix indexed by every second of the video (rows for the same second are OR-ed)."""
+    last_annotated = int(motion_df['time_sec'].max()) + 1 if len(motion_df) else 0
+    seconds = max(int(np.ceil(duration_seconds)), last_annotated)
+    matrix = (motion_df[motion_cols].apply(pd.to_numeric, errors='coerce').fillna(0) == 1).astype(np.int8)
+    matrix = matrix.groupby(motion_df['time_sec'].astype(int)).max()
+    return matrix.reindex(pd.RangeIndex(seconds, name='second'), fill_value=0)
+
+
+def label_statistics(matrix: pd.DataFrame) -> pd.DataFrame:
+    """Per label: labeled seconds, episodes (runs of consecutive seconds), duration and rate."""
+    minutes = max(len(matrix) / 60.0, 1 / 60.0)
+    values = matrix.to_numpy()
+    starts = (np.diff(values, axis=0, prepend=0) == 1).sum(axis=0)
+    labeled = values.sum(axis=0)
+    return pd.DataFrame({
+        'motion': matrix.columns,
+        'count': labeled,
+        'episodes': starts,
+        'total_seconds': labeled.astype(float),
+        'share_of_video': labeled / max(len(matrix), 1),
+        'episodes_per_minute': starts / minutes,
+    })
+
+
+def cooccurrence(matrix: pd.DataFrame) -> pd.DataFrame:
+    """Seconds in which each pair of labels is active together (diagonal = label count)."""
+    values = matrix.to_numpy(dtype=np.int32)
+    return pd.DataFrame(values.T @ values, index=matrix.columns, columns=matrix.columns)
+
+
+def energy_tables(landmarks: np.ndarray, fps: float, aspect: float,
+                  matrix: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Movement energy per minute, and mean energy per second while each label is active."""
+    features = compute_motion_features(landmarks, fps, aspect)
+    if features.empty:
+        return pd.DataFrame(columns=['minute', 'movement_energy']), pd.DataFrame(columns=['motion', 'mean_energy'])
+
+    energy = features.set_index('second')['movement_energy'].reindex(matrix.index, fill_value=0.0)
+    per_minute = energy.groupby(energy.index // 60).agg(['sum', 'mean', 'max'])
+    per_minute.columns = ['movement_energy', 'mean_energy_per_second', 'peak_energy_per_second']
+    per_minute = per_minute.rename_axis('minute').reset_index()
+
+    values = matrix.to_numpy(dtype=np.float64)
+    counts = values.sum(axis=0)
+    weighted = values.T @ energy.to_numpy()
+    per_label = pd.DataFrame({
+        'motion': matrix.columns,
+        'mean_energy': np.divide(weighted, counts, out=np.zeros_like(weighted), where=counts > 0),
+    })
+    return per_minute, per_label
+
+
+def motion_log(matrix: pd.DataFrame) -> pd.DataFrame:
+    """Long `timestamp,motion` table: one row per labeled second and motion."""
+    stacked = matrix.stack()
+    stacked = stacked[stacked == 1]
+    seconds = stacked.index.get_level_values(0)
+    return pd.DataFrame({
+        'timestamp': [format_timestamp(int(s)) for s in seconds],
+        'motion': stacked.index.get_level_values(1),
+    })
+
+
+def build_report(motion_df: pd.DataFrame, motion_cols: list[str], landmarks: np.ndarray,
+                 fps: float, aspect: float, duration_seconds: float) -> dict[str, pd.DataFrame]:
+    matrix = label_matrix(motion_df, motion_cols, duration_seconds)
+    stats = label_statistics(matrix)
+    per_minute, per_label = energy_tables(landmarks, fps, aspect, matrix)
+    summary = stats.merge(per_label, on='motion', how='left')
+    return {
+        'Motion Report': motion_log(matrix),
+        'Summary Dashboard': summary,
+        'Co-occurrence': cooccurrence(matrix).rename_axis('motion').reset_index(),
+        'Movement Energy': per_minute,
+    }
+
+
+def write_report(tables: dict[str, pd.DataFrame], csv_path: Path, xlsx_path: Path) -> tuple[Path, Path | None]:
+    tables['Motion Report'].to_csv(csv_path, index=False)
+    try:
+        with pd.ExcelWriter(xlsx_path) as writer:
+            for sheet, table in tables.items():
+                table.to_excel(writer, sheet_name=sheet, index=False)
+    except ImportError:
+        # XLSX needs openpyxl; the CSV is still useful without it
+        return csv_path, None
+    return csv_path, xlsx_path
+
+
+def report_digest(motion_df: pd.DataFrame, motion_cols: list[str], landmarks: np.ndarray, fps: float) -> str:
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(motion_df[['time_sec'] + motion_cols], index=False).to_numpy().tobytes())
+    digest.update(",".join(motion_cols).encode())
+    digest.update(np.ascontiguousarray(landmarks).tobytes())
+    digest.update(repr(fps).encode())
+    return digest.hexdigest()[:16]
+
+
+def cached_report(motion_df: pd.DataFrame, motion_cols: list[str], landmarks: np.ndarray, fps: float,
+                  aspect: float, duration_seconds: float, out_dir: str | Path) -> tuple[Path, Path | None]:
+    """Build the report once per distinct input and reuse the files afterwards."""
+    out_dir = Path(out_dir)
+    key = report_digest(motion_df, motion_cols, landmarks, fps)
+    csv_path = out_dir / f"motion_report_{key}.csv"
+    xlsx_path = out_dir / f"motion_report_{key}.xlsx"
+    if csv_path.exists():
+        return csv_path, (xlsx_path if xlsx_path.exists() else None)
+    tables = build_report(motion_df, motion_cols, landmarks, fps, aspect, duration_seconds)
+    return write_report(tables, csv_path, xlsx_path)
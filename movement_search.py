@@ -0,0 +1,357 @@
+"""
+Movement similarity search over the analysis catalog.
+
+Every stored landmark track is cut into overlapping windows of
+`WINDOW_SECONDS`, and each window becomes one embedding: `WINDOW_SAMPLES`
+evenly spaced poses of the head, arms and hips, centered on the torso,
+scaled by the torso length (so position in frame and distance to the camera
+do not matter) and L2-normalized, so the dot product of two embeddings is
+their cosine similarity.
+
+`MovementIndex` keeps the embeddings on disk as float16 arrays that are
+memory-mapped for search. Small indexes are searched exactly in NumPy
+chunks. Above `EXACT_SEARCH_LIMIT` windows the main part is an inverted
+file: the windows are grouped by their nearest of about sqrt(N) k-means
+centroids and stored list by list, and a query only scores the lists of its
+`IVF_PROBES` nearest centroids. Analyses added since the last rebuild sit in
+a small tail that is always searched exactly.
+
+Sessions share one `MovementIndex`, and other server processes may write the
+same directory, so every update and rebuild holds a file lock and starts
+from what is on disk. The k-means rebuild runs in a background thread and
+only takes the lock to swap in its result; searches meanwhile use the old
+main part plus the tail.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from analysis_catalog import ANALYSIS_CATALOG_DIR, AnalysisCatalog
+from landmark_store import PYARROW_AVAILABLE, LandmarkReader
+
+MOVEMENT_INDEX_DIR = Path(os.environ.get("MOVEMENT_INDEX_DIR", ANALYSIS_CATALOG_DIR / "movement_index"))
+
+WINDOW_SECONDS = 2.0
+WINDOW_STEP_SECONDS = 0.5
+WINDOW_SAMPLES = 8
+# Nose, shoulders, elbows, wrists, hips
+EMBEDDING_JOINTS = (0, 11, 12, 13, 14, 15, 16, 23, 24)
+_SHOULDERS, _HIPS = (1, 2), (7, 8)
+EMBEDDING_DIM = WINDOW_SAMPLES * len(EMBEDDING_JOINTS) * 2
+# Windows with a pose in fewer of their samples than this are not indexed
+MIN_VALID_SAMPLES = 0.75
+
+# Above this many windows the main part of the index is an inverted file
+EXACT_SEARCH_LIMIT = int(os.environ.get("EXACT_SEARCH_LIMIT", "200000"))
+IVF_PROBES = 16
+# The tail is merged into the main part once it outgrows this share of it
+TAIL_REBUILD_FRACTION = 0.2
+KMEANS_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+# Rows scored per matrix product
+SEARCH_CHUNK = 65536
+
+WINDOW_DTYPE = np.dtype([("source", np.int32), ("start", np.float32)])
+
+
+def window_starts(frames: int, fps: float) -> tuple[np.ndarray, np.ndarray]:
+    """First frame of every window, and the frame offsets sampled within a window."""
+    span = max(int(round(WINDOW_SECONDS * fps)), WINDOW_SAMPLES)
+    step = max(int(round(WINDOW_STEP_SECONDS * fps)), 1)
+    starts = np.arange(0, max(frames - span + 1, 0), step)
+    return starts, np.linspace(0, span - 1, WINDOW_SAMPLES).round().astype(int)
+
+
+def embed_windows(track: np.ndarray, fps: float, aspect: float,
+                  starts: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Embeddings of the windows of a (frames, 33, 4) track starting at frame
+    `starts` (default: every `WINDOW_STEP_SECONDS`). Returns the start times
+    in seconds of the windows that had enough pose, and their (n, D) float32
+    embeddings.
+    """
+    default_starts, offsets = window_starts(len(track), fps)
+    starts = default_starts if starts is None else np.asarray(starts)
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.float32), np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    points = track[starts[:, None] + offsets[None, :]][:, :, EMBEDDING_JOINTS, :2]
+    valid = np.isfinite(points).all(axis=(2, 3))
+    keep = valid.mean(axis=1) >= MIN_VALID_SAMPLES
+    points, valid, starts = points[keep], valid[keep], starts[keep]
+
+    # Fill missing samples from the nearest earlier one (or the first valid one)
+    samples = np.arange(WINDOW_SAMPLES)
+    source = np.maximum.accumulate(np.where(valid, samples, -1), axis=1)
+    source = np.where(source < 0, valid.argmax(axis=1)[:, None], source)
+    points = np.take_along_axis(points, source[:, :, None, None], axis=1).copy()
+
+    points[..., 0] *= aspect
+    shoulders = points[:, :, _SHOULDERS].mean(axis=2)
+    hips = points[:, :, _HIPS].mean(axis=2)
+    center = ((shoulders + hips) / 2).mean(axis=1)
+    scale = np.median(np.linalg.norm(shoulders - hips, axis=2), axis=1)
+    keep = scale > 1e-3
+    vectors = ((points[keep] - center[keep, None, None]) / scale[keep, None, None, None]).reshape(keep.sum(), EMBEDDING_DIM)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+    return (starts[keep] / fps).astype(np.float32), vectors.astype(np.float32)
+
+
+def embed_window(track: np.ndarray, fps: float, aspect: float, start_seconds: float) -> np.ndarray | None:
+    """The embedding of the window starting at `start_seconds`, or None if it has too little pose."""
+    _, offsets = window_starts(len(track), fps)
+    start = int(round(start_seconds * fps))
+    if start < 0 or start + offsets[-1] >= len(track):
+        return None
+    _, vectors = embed_windows(track, fps, aspect, np.array([start]))
+    return vectors[0] if len(vectors) else None
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (highest cosine) of every vector, in chunks."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for begin in range(0, len(vectors), SEARCH_CHUNK):
+        chunk = np.asarray(vectors[begin:begin + SEARCH_CHUNK], dtype=np.float32)
+        labels[begin:begin + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, seed: int = 0) -> np.ndarray:
+    """(k, D) unit centroids trained on a sample of the (unit) vectors."""
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(KMEANS_SAMPLE, len(vectors)), replace=False))],
+                        dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = ~sums.any(axis=1)
+        # Empty clusters restart at random samples
+        sums[empty] = sample[rng.choice(len(sample), empty.sum())]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-6)
+    return centroids
+
+
+def _top(scores: np.ndarray, count: int) -> np.ndarray:
+    """Indices of the `count` highest scores, best first."""
+    if len(scores) > count:
+        top = np.argpartition(-scores, count)[:count]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+@contextmanager
+def _file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive lock on `path`; yields False if `blocking` is off and it is taken."""
+    with open(path, "a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class MovementIndex:
+    def __init__(self, root: str | Path = MOVEMENT_INDEX_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Guards the in-memory state; the file lock serializes writers
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._rebuilding = False
+        self._load()
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Exclusive write access across threads and processes, with the state reloaded from disk."""
+        with self._write_lock, _file_lock(self.root / "index.lock"):
+            self._load()
+            yield
+
+    def _path(self, name: str) -> Path:
+        return self.root / f"{name}.npy"
+
+    def _load(self) -> None:
+        if self._path("main_vectors").exists():
+            main = np.load(self._path("main_vectors"), mmap_mode="r")
+            main_windows = np.load(self._path("main_windows"), mmap_mode="r")
+        else:
+            main = np.empty((0, EMBEDDING_DIM), dtype=np.float16)
+            main_windows = np.empty(0, dtype=WINDOW_DTYPE)
+        centroids = np.load(self._path("centroids")) if self._path("centroids").exists() else None
+        offsets = np.load(self._path("offsets")) if self._path("offsets").exists() else None
+        if self._path("tail_vectors").exists():
+            tail = np.load(self._path("tail_vectors"))
+            tail_windows = np.load(self._path("tail_windows"))
+        else:
+            tail = np.empty((0, EMBEDDING_DIM), dtype=np.float16)
+            tail_windows = np.empty(0, dtype=WINDOW_DTYPE)
+        # Sources last: `_save` writes them last, so they cover every window read above
+        sources_path = self.root / "sources.json"
+        sources = json.loads(sources_path.read_text()) if sources_path.exists() else []
+        with self._lock:
+            self.sources = sources
+            self._main, self._main_windows = main, main_windows
+            self._centroids, self._offsets = centroids, offsets
+            self._tail, self._tail_windows = tail, tail_windows
+
+    def _save(self, arrays: dict[str, np.ndarray], sources: list[dict]) -> None:
+        """Write arrays, then the source list, each to a temporary name first."""
+        for name, array in arrays.items():
+            partial = self.root / f"{name}.partial.npy"
+            np.save(partial, array)
+            os.replace(partial, self._path(name))
+        partial = self.root / "sources.partial.json"
+        partial.write_text(json.dumps(sources))
+        os.replace(partial, self.root / "sources.json")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._main) + len(self._tail)
+
+    def update(self, catalog: AnalysisCatalog) -> int:
+        """Index the catalog's analyses that are not indexed yet; returns the number of new windows."""
+        if not PYARROW_AVAILABLE:
+            return 0
+        with self._writing():
+            indexed = {source["id"] for source in self.sources}
+            new = catalog.analyses()
+            new = new[~new["id"].isin(indexed) & new["landmarks_path"].notna()]
+            vectors, windows = [self._tail], [self._tail_windows]
+            sources = list(self.sources)
+            for analysis in new.itertuples():
+                if not Path(analysis.landmarks_path).exists():
+                    continue
+                with LandmarkReader(analysis.landmarks_path) as reader:
+                    _, _, track = reader.read_all()
+                starts, embeddings = embed_windows(track, analysis.fps, analysis.aspect)
+                source = len(sources)
+                sources.append({"id": analysis.id, "video_name": analysis.video_name, "video_path": analysis.video_path})
+                vectors.append(embeddings.astype(np.float16))
+                windows.append(np.rec.fromarrays([np.full(len(starts), source, dtype=np.int32), starts],
+                                                 dtype=WINDOW_DTYPE))
+            added = sum(len(v) for v in vectors[1:])
+            if not added and len(sources) == len(indexed):
+                return 0
+            tail, tail_windows = np.concatenate(vectors), np.concatenate(windows)
+            self._save({"tail_vectors": tail, "tail_windows": tail_windows}, sources)
+            with self._lock:
+                self.sources = sources
+                self._tail, self._tail_windows = tail, tail_windows
+            rebuild = len(self._main) + len(tail) > EXACT_SEARCH_LIMIT \
+                and len(tail) > TAIL_REBUILD_FRACTION * len(self._main)
+        if rebuild:
+            self._start_rebuild()
+        return added
+
+    def _start_rebuild(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True, name="movement-index-rebuild").start()
+
+    def _rebuild(self) -> None:
+        """Merge the tail into the main part and regroup it into inverted lists."""
+        try:
+            # One rebuild at a time across processes; another one covers this tail too
+            with _file_lock(self.root / "rebuild.lock", blocking=False) as held:
+                if held:
+                    self._regroup()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _regroup(self) -> None:
+        with self._writing():
+            main, main_windows = self._main, self._main_windows
+            tail, tail_windows = self._tail, self._tail_windows
+        if len(main) + len(tail) <= EXACT_SEARCH_LIMIT or len(tail) <= TAIL_REBUILD_FRACTION * len(main):
+            return
+        vectors = np.concatenate([main, tail])
+        windows = np.concatenate([main_windows, tail_windows])
+        centroids = spherical_kmeans(vectors, max(16, int(np.sqrt(len(vectors)))))
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        with self._writing():
+            # Updates only append to the tail; what they added meanwhile stays in it
+            self._save({"main_vectors": vectors[order], "main_windows": windows[order], "centroids": centroids,
+                        "offsets": offsets, "tail_vectors": self._tail[len(tail):],
+                        "tail_windows": self._tail_windows[len(tail):]}, self.sources)
+            self._load()
+
+    def _candidates(self, query: np.ndarray, count: int, exact: bool) -> tuple[list[dict], np.ndarray, np.ndarray]:
+        """The sources, and (scores, windows) of the best `count` windows of each part."""
+        # One consistent snapshot: an update or rebuild may swap the state meanwhile
+        with self._lock:
+            sources, main, main_windows = self.sources, self._main, self._main_windows
+            centroids, list_offsets = self._centroids, self._offsets
+            tail, tail_windows = self._tail, self._tail_windows
+        scores, windows = [], []
+        if centroids is not None and not exact:
+            lists = _top(centroids @ query, IVF_PROBES)
+            parts = [(main[list_offsets[i]:list_offsets[i + 1]],
+                      main_windows[list_offsets[i]:list_offsets[i + 1]]) for i in lists]
+        else:
+            parts = [(main[begin:begin + SEARCH_CHUNK], main_windows[begin:begin + SEARCH_CHUNK])
+                     for begin in range(0, len(main), SEARCH_CHUNK)]
+        parts.append((tail, tail_windows))
+        for vectors, part_windows in parts:
+            if len(vectors) == 0:
+                continue
+            part_scores = np.asarray(vectors, dtype=np.float32) @ query
+            top = _top(part_scores, count)
+            scores.append(part_scores[top])
+            windows.append(np.asarray(part_windows[top]))
+        if not scores:
+            return sources, np.empty(0, dtype=np.float32), np.empty(0, dtype=WINDOW_DTYPE)
+        return sources, np.concatenate(scores), np.concatenate(windows)
+
+    def search(self, query: np.ndarray, catalog: AnalysisCatalog, k: int = 10, exact: bool | None = None,
+               exclude: tuple[str, float] | None = None) -> pd.DataFrame:
+        """
+        The `k` windows most similar to the embedding `query`, best first, at
+        most one per moment (overlapping windows of a video count once).
+        Speakers are read from `catalog`, since they can be renamed after
+        indexing; analyses deleted from it are left out. `exclude` is an
+        (analysis id, start seconds) window to leave out, typically the query
+        itself. `exact` forces or skips the inverted lists; by default they
+        are used when the index has them.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        sources, scores, windows = self._candidates(query, k * 8, bool(exact))
+        order = np.argsort(-scores)
+        speakers = catalog.speakers_of(sorted({sources[i]["id"] for i in np.unique(windows["source"])}))
+        rows: list[dict] = []
+        for score, window in zip(scores[order], windows[order]):
+            source = sources[window["source"]]
+            start = float(window["start"])
+            if source["id"] not in speakers:
+                continue
+            if exclude is not None and source["id"] == exclude[0] and abs(start - exclude[1]) < WINDOW_SECONDS:
+                continue
+            if any(row["analysis_id"] == source["id"] and abs(row["start"] - start) < WINDOW_SECONDS for row in rows):
+                continue
+            rows.append({"analysis_id": source["id"], "speaker": speakers[source["id"]],
+                         "video_name": source["video_name"], "video_path": source["video_path"],
+                         "start": start, "end": start + WINDOW_SECONDS, "score": float(score)})
+            if len(rows) == k:
+                break
+        return pd.DataFrame(rows, columns=["analysis_id", "speaker", "video_name", "video_path",
+                                           "start", "end", "score"])
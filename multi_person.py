@@ -0,0 +1,395 @@
+"""
+Multi-person pose tracking.
+
+`MultiPersonPose` runs a person detector once every `PERSON_DETECT_INTERVAL`
+inferences on the whole frame and keeps a track with a stable ID for each
+person it finds. Every inference crops each tracked person out of the frame
+into a fixed-size pooled buffer (letterboxed, so neighbours stay out of it)
+and runs pose on the crop only, so the cost grows with the number of people
+rather than with one full-frame inference per person: a stateless backend
+gets all crops as one batch, a stateful one (MediaPipe, which tracks within
+its input) gets an instance per person from a pool. Between detections each
+box follows its person's landmarks.
+
+Detection uses a MobileNet-SSD person model when its files are present,
+OpenCV's HOG people detector when the OpenCV build has it, and otherwise the
+foreground blobs of a background subtractor.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pose_backends import PoseBackend, create_backend
+
+MAX_PEOPLE = int(os.environ.get("MAX_PEOPLE", "6"))
+# Inferences between two full-frame person detections
+PERSON_DETECT_INTERVAL = int(os.environ.get("PERSON_DETECT_INTERVAL", "10"))
+# Person crops are resized to this (width, height) before pose estimation
+CROP_SIZE = (192, 256)
+# Crop margin around a person's box, as a fraction of its size
+CROP_MARGIN = 0.1
+DETECT_WIDTH = 480
+# A detection and a track overlapping this much (intersection over union) are the same person
+MATCH_IOU = 0.3
+# A box this much inside a track's box is part of that person (a partial detection, a converged track)
+COVERED = 0.6
+# EMA weight of a new box measurement
+BOX_SMOOTHING = 0.5
+# Inferences in a row with a pose before a new track gets a person ID and is drawn
+CONFIRM_HITS = 3
+# Landmarks at least this visible define the box between detections
+BOX_VISIBILITY = 0.5
+
+# Skeleton colors (BGR) for the second person onwards; the first uses the chosen line color
+PERSON_COLORS = (
+    (255, 128, 0), (0, 200, 0), (0, 200, 255), (255, 0, 255), (255, 255, 0),
+    (128, 0, 255), (0, 128, 255), (128, 255, 0),
+)
+
+# MobileNet-SSD (Caffe, VOC classes), loaded from local files
+PERSON_DNN_MODEL = Path(os.environ.get("PERSON_DNN_MODEL", "models/MobileNetSSD_deploy.caffemodel"))
+PERSON_DNN_CONFIG = Path(os.environ.get("PERSON_DNN_CONFIG", "models/MobileNetSSD_deploy.prototxt"))
+SSD_PERSON_CLASS = 15
+
+
+def person_color(person_id: int, first_color: tuple) -> tuple:
+    """Skeleton color of a person: IDs 0, 1, 2... cycle through `first_color` then `PERSON_COLORS`."""
+    colors = (tuple(first_color),) + PERSON_COLORS
+    return colors[person_id % len(colors)]
+
+
+def box_intersection(a: np.ndarray, b: np.ndarray) -> float:
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    return float(max(0.0, x1 - x0) * max(0.0, y1 - y0))
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection over union of two (x, y, w, h) boxes."""
+    inter = box_intersection(a, b)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_covered(a: np.ndarray, b: np.ndarray) -> float:
+    """Fraction of box `a` that lies inside box `b`."""
+    area = a[2] * a[3]
+    return box_intersection(a, b) / area if area > 0 else 0.0
+
+
+def landmark_box(landmarks: np.ndarray, min_visibility: float = BOX_VISIBILITY) -> np.ndarray | None:
+    """Normalized (x, y, w, h) around the visible landmarks, padded for the head and limbs."""
+    visible = landmarks[landmarks[:, 3] >= min_visibility, :2]
+    if len(visible) < 3 or not np.isfinite(visible).all():
+        return None
+    x0, y0 = visible.min(axis=0)
+    x1, y1 = visible.max(axis=0)
+    pad_x, pad_y = (x1 - x0) * 0.15, (y1 - y0) * 0.15
+    return np.array([x0 - pad_x, y0 - 2 * pad_y, x1 - x0 + 2 * pad_x, y1 - y0 + 3 * pad_y], dtype=np.float32)
+
+
+class PersonDetector:
+    """Finds people in a frame; returns normalized (x, y, w, h) boxes, most confident first."""
+
+    name = "base"
+
+    def detect(self, frame: np.ndarray) -> list[np.ndarray]:
+        raise NotImplementedError
+
+    def _small(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        if width <= DETECT_WIDTH:
+            return frame
+        return cv2.resize(frame, (DETECT_WIDTH, max(1, height * DETECT_WIDTH // width)), interpolation=cv2.INTER_AREA)
+
+
+class SSDPersonDetector(PersonDetector):
+    name = "mobilenet-ssd"
+
+    def __init__(self, model_path: Path = PERSON_DNN_MODEL, config_path: Path = PERSON_DNN_CONFIG,
+                 threshold: float = 0.5):
+        self._net = cv2.dnn.readNet(str(model_path), str(config_path))
+        self.threshold = threshold
+
+    @staticmethod
+    def files_present(model_path: Path = PERSON_DNN_MODEL, config_path: Path = PERSON_DNN_CONFIG) -> bool:
+        return Path(model_path).exists() and Path(config_path).exists()
+
+    def detect(self, frame: np.ndarray) -> list[np.ndarray]:
+        blob = cv2.dnn.blobFromImage(frame, 0.007843, (300, 300), (127.5, 127.5, 127.5), crop=False)
+        self._net.setInput(blob)
+        boxes = []
+        for _, label, confidence, x0, y0, x1, y1 in self._net.forward()[0, 0]:
+            if int(label) == SSD_PERSON_CLASS and confidence >= self.threshold:
+                boxes.append((confidence, np.array([x0, y0, x1 - x0, y1 - y0], dtype=np.float32)))
+        return [box for _, box in sorted(boxes, key=lambda b: -b[0])]
+
+
+class HOGPersonDetector(PersonDetector):
+    name = "hog"
+
+    def __init__(self):
+        self._hog = cv2.HOGDescriptor()
+        self._hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    @staticmethod
+    def available() -> bool:
+        # Not every OpenCV build ships the HOG descriptor
+        return hasattr(cv2, "HOGDescriptor")
+
+    def detect(self, frame: np.ndarray) -> list[np.ndarray]:
+        small = self._small(frame)
+        height, width = small.shape[:2]
+        rects, weights = self._hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return []
+        keep = cv2.dnn.NMSBoxes([list(map(int, r)) for r in rects], np.ravel(weights).tolist(), 0.0, 0.4)
+        keep = sorted(np.ravel(keep), key=lambda i: -float(np.ravel(weights)[i]))
+        return [np.array(rects[i], dtype=np.float32) / (width, height, width, height) for i in keep]
+
+
+class ForegroundPersonDetector(PersonDetector):
+    """Moving blobs of a background subtractor; people who stay still are kept by their tracks."""
+
+    name = "foreground"
+
+    def __init__(self, work_width: int = 320, min_area_ratio: float = 0.01):
+        self.work_width = work_width
+        self.min_area_ratio = min_area_ratio
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=False)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._join = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 15))
+        self._small_frame = None
+        self._frames_seen = 0
+
+    def detect(self, frame: np.ndarray) -> list[np.ndarray]:
+        height, width = frame.shape[:2]
+        size = (min(width, self.work_width), max(1, height * min(width, self.work_width) // width))
+        if self._small_frame is None or self._small_frame.shape[1::-1] != size:
+            self._small_frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        cv2.resize(frame, size, dst=self._small_frame, interpolation=cv2.INTER_AREA)
+        mask = self._subtractor.apply(self._small_frame)
+        self._frames_seen += 1
+        # On the first frame the background model is empty and everything is foreground
+        if self._frames_seen == 1:
+            return []
+        cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel, dst=mask)
+        # Join a person's separate parts (head, arms, legs) into one blob
+        cv2.dilate(mask, self._join, dst=mask, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_area_ratio * size[0] * size[1]
+        blobs = sorted((c for c in contours if cv2.contourArea(c) >= min_area), key=cv2.contourArea, reverse=True)
+        return [np.array(cv2.boundingRect(c), dtype=np.float32) / (size[0], size[1], size[0], size[1])
+                for c in blobs]
+
+
+def create_person_detector() -> PersonDetector:
+    if SSDPersonDetector.files_present():
+        return SSDPersonDetector()
+    if HOGPersonDetector.available():
+        return HOGPersonDetector()
+    return ForegroundPersonDetector()
+
+
+@dataclass
+class PersonTrack:
+    # Order of creation within the tracker
+    key: int
+    # Normalized (x, y, w, h)
+    box: np.ndarray
+    # Person ID, given once the track is confirmed (so false detections use up no IDs)
+    id: int | None = None
+    # Inferences since the person was last detected or posed
+    misses: int = 0
+    # Inferences in a row with a pose
+    hits: int = 0
+    landmarks: np.ndarray | None = None
+
+
+class MultiPersonPose:
+    """
+    Tracks up to `max_people` people with stable IDs and estimates each one's
+    pose on a crop. `process(frame)` returns `{person_id: landmarks}` in
+    normalized frame coordinates for everyone posed in that frame.
+    """
+
+    def __init__(self, backend_name: str, max_people: int = MAX_PEOPLE,
+                 detect_interval: int = PERSON_DETECT_INTERVAL, detector: PersonDetector | None = None):
+        self.backend_name = backend_name
+        self.max_people = max_people
+        self.detect_interval = max(1, detect_interval)
+        # A track survives two detection rounds without being seen
+        self.max_misses = 2 * self.detect_interval
+        self.detector = detector or create_person_detector()
+        self.tracks: list[PersonTrack] = []
+        self._next_id = 0
+        self._next_key = 0
+        self._inferences = 0
+        self._shared: PoseBackend | None = None
+        # Stateful backends: one instance per tracked person, reused when a track ends
+        self._assigned: dict[int, PoseBackend] = {}
+        self._idle: list[PoseBackend] = []
+        self._crops = [np.empty((CROP_SIZE[1], CROP_SIZE[0], 3), dtype=np.uint8) for _ in range(max_people)]
+
+    def open(self) -> "MultiPersonPose":
+        backend = create_backend(self.backend_name).open()
+        if backend.stateful:
+            self._idle.append(backend)
+        else:
+            self._shared = backend
+        return self
+
+    def close(self) -> None:
+        for backend in [*self._assigned.values(), *self._idle, *([self._shared] if self._shared else [])]:
+            backend.close()
+        self._assigned.clear()
+        self._idle.clear()
+        self._shared = None
+
+    def __enter__(self) -> "MultiPersonPose":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def next_id(self) -> int:
+        """The ID the next new person gets; IDs are never reused."""
+        return self._next_id
+
+    def seed(self, landmarks_by_id: dict[int, np.ndarray], next_id: int = 0) -> None:
+        """
+        Start from people seen just before (e.g. in the previous segment),
+        keeping their IDs. `next_id` carries on the numbering from there, so
+        someone who left earlier never has their ID given to a newcomer.
+        """
+        for person_id, landmarks in sorted(landmarks_by_id.items()):
+            box = landmark_box(landmarks)
+            if box is not None and len(self.tracks) < self.max_people:
+                self.tracks.append(PersonTrack(self._next_key, box, person_id, hits=CONFIRM_HITS))
+                self._next_key += 1
+        self._next_id = max([self._next_id, next_id, *(pid + 1 for pid in landmarks_by_id)])
+
+    def redetect(self) -> None:
+        """Run the person detector on the next frame (e.g. after a seek)."""
+        self._inferences = 0
+
+    def process(self, frame: np.ndarray) -> dict[int, np.ndarray]:
+        if self._inferences % self.detect_interval == 0:
+            self._associate(self.detector.detect(frame))
+        self._inferences += 1
+        if not self.tracks:
+            return {}
+
+        height, width = frame.shape[:2]
+        mappings = [self._crop(frame, track.box, crop) for track, crop in zip(self.tracks, self._crops)]
+        crops = self._crops[:len(mappings)]
+        if self._shared is not None:
+            results = self._shared.process_batch(crops)
+        else:
+            # Every person's frame is submitted before any result is awaited, so worker processes run together
+            backends = [self._backend(track.key) for track in self.tracks]
+            tickets = [backend.submit(crop) for backend, crop in zip(backends, crops)]
+            results = [backend.result(ticket) for backend, ticket in zip(backends, tickets)]
+
+        people = {}
+        for track, (x0, y0, sx, sy), landmarks in zip(self.tracks, mappings, results):
+            if landmarks is None:
+                track.misses += 1
+                track.hits = 0
+                track.landmarks = None
+                continue
+            # Crop coordinates back to the frame
+            landmarks = landmarks.copy()
+            landmarks[:, 0] = (x0 + landmarks[:, 0] * sx) / width
+            landmarks[:, 1] = (y0 + landmarks[:, 1] * sy) / height
+            landmarks[:, 2] *= sx / width
+            track.landmarks = landmarks
+            track.misses = 0
+            track.hits += 1
+            box = landmark_box(landmarks)
+            if box is not None:
+                track.box += BOX_SMOOTHING * (box - track.box)
+            if track.id is None and track.hits >= CONFIRM_HITS:
+                track.id = self._next_id
+                self._next_id += 1
+            if track.id is not None:
+                people[track.id] = landmarks
+        self._prune()
+        return people
+
+    def _associate(self, detections: list[np.ndarray]) -> None:
+        """
+        Greedy IoU matching of detections to tracks; unmatched detections
+        start new tracks unless they are mostly inside an existing one.
+        """
+        pairs = sorted(((box_iou(track.box, box), t, d) for t, track in enumerate(self.tracks)
+                        for d, box in enumerate(detections)), reverse=True)
+        used_tracks, used_detections = set(), set()
+        for iou, t, d in pairs:
+            if iou < MATCH_IOU:
+                break
+            if t in used_tracks or d in used_detections:
+                continue
+            used_tracks.add(t)
+            used_detections.add(d)
+            track = self.tracks[t]
+            track.box += BOX_SMOOTHING * (detections[d] - track.box)
+            track.misses = 0
+        for d, box in enumerate(detections):
+            if d in used_detections or len(self.tracks) >= self.max_people:
+                continue
+            if not any(box_covered(box, track.box) > COVERED for track in self.tracks):
+                self.tracks.append(PersonTrack(self._next_key, box.copy()))
+                self._next_key += 1
+
+    def _prune(self) -> None:
+        """Drop tracks not seen for too long and younger tracks that have drifted onto an older one."""
+        kept: list[PersonTrack] = []
+        # Confirmed tracks first, oldest first
+        for track in sorted(self.tracks, key=lambda t: (t.id is None, t.key)):
+            if track.misses > self.max_misses or any(box_covered(track.box, k.box) > COVERED for k in kept):
+                self._release(track.key)
+            else:
+                kept.append(track)
+        self.tracks = kept
+
+    def _backend(self, key: int) -> PoseBackend:
+        if key not in self._assigned:
+            self._assigned[key] = self._idle.pop() if self._idle else create_backend(self.backend_name).open()
+        return self._assigned[key]
+
+    def _release(self, key: int) -> None:
+        backend = self._assigned.pop(key, None)
+        if backend is not None:
+            self._idle.append(backend)
+
+    @staticmethod
+    def _crop(frame: np.ndarray, box: np.ndarray, dst: np.ndarray) -> tuple[float, float, float, float]:
+        """
+        Letterbox the person's box plus a margin into `dst`, so neighbours
+        outside the box never reach the pose model. Returns (x0, y0, sx, sy):
+        crop coordinate u maps to frame pixel x0 + u * sx (likewise y).
+        """
+        height, width = frame.shape[:2]
+        bx, by, bw, bh = box * (width, height, width, height)
+        x, y = int(max(bx - bw * CROP_MARGIN, 0)), int(max(by - bh * CROP_MARGIN, 0))
+        w = max(int(min(bx + bw * (1 + CROP_MARGIN), width)) - x, 2)
+        h = max(int(min(by + bh * (1 + CROP_MARGIN), height)) - y, 2)
+        x, y = min(x, width - w), min(y, height - h)
+        scale = min(CROP_SIZE[0] / w, CROP_SIZE[1] / h)
+        fit_w, fit_h = max(int(w * scale), 1), max(int(h * scale), 1)
+        ox, oy = (CROP_SIZE[0] - fit_w) // 2, (CROP_SIZE[1] - fit_h) // 2
+        dst[:oy] = 0
+        dst[oy + fit_h:] = 0
+        dst[:, :ox] = 0
+        dst[:, ox + fit_w:] = 0
+        cv2.resize(frame[y:y + h, x:x + w], (fit_w, fit_h), dst=dst[oy:oy + fit_h, ox:ox + fit_w],
+                   interpolation=cv2.INTER_AREA)
+        return x - ox / scale, y - oy / scale, CROP_SIZE[0] / scale, CROP_SIZE[1] / scale
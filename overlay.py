@@ -0,0 +1,95 @@
+"""
+Frame overlay drawing shared by the render engine.
+
+Pose skeletons come in as normalized (33, 4) landmark arrays from
+`pose_backends`; the heuristic skeleton (sized from `person_detector`'s box)
+motion label text and multi-person tags are drawn straight onto the BGR
+frame.
+"""
+
+import cv2
+
+from pose_backends import POSE_CONNECTIONS
+
+def draw_improved_skeleton(frame, center_x, center_y, width, height, line_color_bgr, dot_color_bgr, line_thickness, dot_radius):
+    """Draw an improved skeleton that adapts to the person's position and size"""
+    
+    # Calculate skeleton dimensions based on person size
+    skeleton_height = int(height * 0.8)
+    skeleton_width = int(width * 0.6)
+    
+    # Head (smaller and positioned better)
+    head_radius = max(5, int(skeleton_height * 0.08))
+    head_y = center_y - skeleton_height // 2 + head_radius
+    cv2.circle(frame, (center_x, head_y), head_radius, dot_color_bgr, -1)
+    
+    # Neck
+    neck_y = head_y + head_radius + 5
+    cv2.line(frame, (center_x, head_y + head_radius), (center_x, neck_y), line_color_bgr, line_thickness)
+    
+    # Shoulders
+    shoulder_y = neck_y + 10
+    shoulder_width = skeleton_width // 2
+    cv2.line(frame, (center_x - shoulder_width, shoulder_y), (center_x + shoulder_width, shoulder_y), line_color_bgr, line_thickness)
+    
+    # Arms
+    arm_length = skeleton_height // 3
+    # Left arm
+    cv2.line(frame, (center_x - shoulder_width, shoulder_y), (center_x - shoulder_width - 10, shoulder_y + arm_length), line_color_bgr, line_thickness)
+    # Right arm
+    cv2.line(frame, (center_x + shoulder_width, shoulder_y), (center_x + shoulder_width + 10, shoulder_y + arm_length), line_color_bgr, line_thickness)
+    
+    # Torso
+    torso_y = shoulder_y + 20
+    cv2.line(frame, (center_x, shoulder_y), (center_x, torso_y), line_color_bgr, line_thickness)
+    
+    # Hips
+    hip_y = torso_y + 15
+    hip_width = skeleton_width // 2
+    cv2.line(frame, (center_x - hip_width, hip_y), (center_x + hip_width, hip_y), line_color_bgr, line_thickness)
+    
+    # Legs
+    leg_length = skeleton_height // 2
+    # Left leg
+    cv2.line(frame, (center_x - hip_width, hip_y), (center_x - hip_width - 5, hip_y + leg_length), line_color_bgr, line_thickness)
+    # Right leg
+    cv2.line(frame, (center_x + hip_width, hip_y), (center_x + hip_width + 5, hip_y + leg_length), line_color_bgr, line_thickness)
+    
+    # Add some joints as dots
+    joint_radius = max(2, dot_radius // 2)
+    cv2.circle(frame, (center_x - shoulder_width, shoulder_y), joint_radius, dot_color_bgr, -1)  # Left shoulder
+    cv2.circle(frame, (center_x + shoulder_width, shoulder_y), joint_radius, dot_color_bgr, -1)  # Right shoulder
+    cv2.circle(frame, (center_x - hip_width, hip_y), joint_radius, dot_color_bgr, -1)  # Left hip
+    cv2.circle(frame, (center_x + hip_width, hip_y), joint_radius, dot_color_bgr, -1)  # Right hip
+
+def draw_pose_landmarks(frame, landmarks, line_color_bgr, dot_color_bgr, line_thickness, dot_radius):
+    """Draw a (33, 4) normalized landmark array; joints with zero visibility are skipped"""
+    height, width = frame.shape[:2]
+    points = [(int(x * width), int(y * height)) for x, y, _, _ in landmarks]
+    visible = landmarks[:, 3] > 0
+
+    # Draw connections with custom colors
+    for start_idx, end_idx in POSE_CONNECTIONS:
+        if visible[start_idx] and visible[end_idx]:
+            cv2.line(frame, points[start_idx], points[end_idx], line_color_bgr, line_thickness)
+
+    # Draw landmarks as dots
+    for point, is_visible in zip(points, visible):
+        if is_visible:
+            cv2.circle(frame, point, dot_radius, dot_color_bgr, -1)
+
+def draw_person_tag(frame, landmarks, text, color_bgr, font_scale=0.5, font_thickness=1):
+    """Draw a person's tag (e.g. "P2") centered above their highest visible landmark"""
+    height, width = frame.shape[:2]
+    visible = landmarks[landmarks[:, 3] > 0]
+    if len(visible) == 0:
+        return
+    top = visible[visible[:, 1].argmin()]
+    text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+    text_x = min(max(int(top[0] * width) - text_size[0] // 2, 0), width - text_size[0])
+    text_y = max(int(top[1] * height) - 2 * text_size[1], text_size[1])
+
+    cv2.putText(frame, text, (text_x, text_y),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0,0,0), font_thickness+2, cv2.LINE_AA)
+    cv2.putText(frame, text, (text_x, text_y),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, color_bgr, font_thickness, cv2.LINE_AA)
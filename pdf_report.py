@@ -0,0 +1,268 @@
+"""
+Per-job Thai and English PDF reports.
+
+Pages are composed with Pillow and saved as PDF. The expensive parts are
+shared: the page template with the branding assets (`Logo.png`,
+`Trademark.png`) is rasterized once per process, and the charts are rendered
+once per job and pasted into both language versions. Charts only carry the
+Laban terms and numbers, so they need no translation.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from fonts import load_font
+from laban_analysis import MOTION_LABELS_TH
+from motion_report import build_report, report_digest
+
+APP_DIR = Path(__file__).resolve().parent
+LOGO_PATH = APP_DIR / "Logo.png"
+TRADEMARK_PATH = APP_DIR / "Trademark.png"
+
+# A4 at 150 dpi
+PAGE_SIZE = (1240, 1754)
+PAGE_DPI = 150
+MARGIN = 90
+HEADER_HEIGHT = 230
+ACCENT = (231, 76, 60)     # matches the Streamlit theme's primaryColor
+INK = (29, 28, 27)
+MUTED = (120, 114, 108)
+GRID = (225, 220, 214)
+
+TEXTS = {
+    "en": {
+        "title": "Presentation Analysis Report",
+        "generated": "Generated",
+        "video": "Video",
+        "duration": "Duration",
+        "labeled": "Seconds with a motion label",
+        "top_motion": "Most frequent motion",
+        "none": "-",
+        "counts_title": "Motion counts",
+        "table_title": "Motion statistics",
+        "motion": "Motion",
+        "seconds": "Seconds",
+        "episodes": "Episodes",
+        "per_minute": "Per minute",
+        "energy_title": "Movement energy per minute",
+        "cooccurrence_title": "Motions occurring together (seconds)",
+        "page": "Page",
+    },
+    "th": {
+        "title": "รายงานการวิเคราะห์การนำเสนอ",
+        "generated": "วันที่สร้าง",
+        "video": "วิดีโอ",
+        "duration": "ความยาว",
+        "labeled": "จำนวนวินาทีที่พบการเคลื่อนไหว",
+        "top_motion": "การเคลื่อนไหวที่พบบ่อยที่สุด",
+        "none": "-",
+        "counts_title": "จำนวนการเคลื่อนไหว",
+        "table_title": "สถิติการเคลื่อนไหว",
+        "motion": "การเคลื่อนไหว",
+        "seconds": "วินาที",
+        "episodes": "จำนวนครั้ง",
+        "per_minute": "ต่อนาที",
+        "energy_title": "พลังงานการเคลื่อนไหวต่อนาที",
+        "cooccurrence_title": "การเคลื่อนไหวที่เกิดพร้อมกัน (วินาที)",
+        "page": "หน้า",
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _brand_image(path: Path, width: int) -> Image.Image | None:
+    """Branding asset flattened onto white and resized, once per process."""
+    if not path.exists():
+        return None
+    with Image.open(path) as source:
+        source = source.convert("RGBA")
+        height = round(source.height * width / source.width)
+        resized = source.resize((width, height), Image.LANCZOS)
+    flat = Image.new("RGB", resized.size, "white")
+    flat.paste(resized, mask=resized.getchannel("A"))
+    return flat
+
+
+@functools.lru_cache(maxsize=None)
+def _template_page() -> Image.Image:
+    """Blank page with the header band and branding; copied for every page."""
+    page = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(page)
+    trademark = _brand_image(TRADEMARK_PATH, PAGE_SIZE[0] - 2 * MARGIN)
+    if trademark is not None:
+        page.paste(trademark, (MARGIN, 50))
+    logo = _brand_image(LOGO_PATH, 260)
+    if logo is not None:
+        page.paste(logo, (PAGE_SIZE[0] - MARGIN - logo.width, PAGE_SIZE[1] - MARGIN - logo.height + 40))
+    draw.rectangle([MARGIN, HEADER_HEIGHT - 8, PAGE_SIZE[0] - MARGIN, HEADER_HEIGHT - 4], fill=ACCENT)
+    return page
+
+
+def _bar_chart(labels: list[str], values: np.ndarray, size: tuple[int, int], horizontal: bool = True) -> Image.Image:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = load_font(20)
+    width, height = size
+    top = max(float(np.max(values)), 1e-9) if len(values) else 1.0
+    if horizontal:
+        label_w = 170
+        row_h = height / max(len(labels), 1)
+        for i, (label, value) in enumerate(zip(labels, values)):
+            y = i * row_h
+            bar_w = (width - label_w - 80) * value / top
+            draw.text((0, y + row_h / 2), label, fill=INK, font=font, anchor="lm")
+            draw.rectangle([label_w, y + row_h * 0.2, label_w + bar_w, y + row_h * 0.8], fill=ACCENT)
+            draw.text((label_w + bar_w + 10, y + row_h / 2), f"{value:g}", fill=MUTED, font=font, anchor="lm")
+    else:
+        base = height - 40
+        col_w = (width - 20) / max(len(labels), 1)
+        draw.line([0, base, width, base], fill=GRID, width=2)
+        for i, (label, value) in enumerate(zip(labels, values)):
+            x = 10 + i * col_w
+            bar_h = (base - 30) * value / top
+            draw.rectangle([x + col_w * 0.15, base - bar_h, x + col_w * 0.85, base], fill=ACCENT)
+            draw.text((x + col_w / 2, base - bar_h - 6), f"{value:g}", fill=MUTED, font=font, anchor="mb")
+            draw.text((x + col_w / 2, base + 8), label, fill=MUTED, font=font, anchor="mt")
+    return image
+
+
+def _heatmap(matrix: pd.DataFrame, size: tuple[int, int]) -> Image.Image:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = load_font(17)
+    n = len(matrix)
+    label_w = 150
+    cell = min((size[0] - label_w) / max(n, 1), (size[1] - label_w) / max(n, 1))
+    values = matrix.to_numpy(dtype=float)
+    top = max(values.max(), 1.0) if values.size else 1.0
+    for i, name in enumerate(matrix.index):
+        draw.text((label_w - 10, label_w + (i + 0.5) * cell), name, fill=INK, font=font, anchor="rm")
+        draw.text((label_w + (i + 0.5) * cell, label_w - 10), name[:4], fill=INK, font=font, anchor="mb")
+        for j in range(n):
+            shade = values[i, j] / top
+            color = tuple(int(255 - (255 - c) * shade) for c in ACCENT)
+            x, y = label_w + j * cell, label_w + i * cell
+            draw.rectangle([x, y, x + cell - 2, y + cell - 2], fill=color)
+            if values[i, j]:
+                draw.text((x + cell / 2, y + cell / 2), f"{values[i, j]:g}", fill=INK, font=font, anchor="mm")
+    return image
+
+
+def render_charts(tables: dict[str, pd.DataFrame]) -> dict[str, Image.Image]:
+    """Language-neutral charts for one job, shared by every report language."""
+    summary = tables["Summary Dashboard"]
+    energy = tables["Movement Energy"]
+    cooccurrence = tables["Co-occurrence"].set_index("motion")
+    return {
+        "counts": _bar_chart(list(summary["motion"]), summary["count"].to_numpy(), (PAGE_SIZE[0] - 2 * MARGIN, 460)),
+        "energy": _bar_chart([str(m) for m in energy.get("minute", [])],
+                             energy.get("movement_energy", pd.Series(dtype=float)).to_numpy(dtype=float).round(1),
+                             (PAGE_SIZE[0] - 2 * MARGIN, 420), horizontal=False),
+        "cooccurrence": _heatmap(cooccurrence, (PAGE_SIZE[0] - 2 * MARGIN, 780)),
+    }
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _footer(draw: ImageDraw.ImageDraw, text: dict, number: int) -> None:
+    draw.text((MARGIN, PAGE_SIZE[1] - MARGIN + 20), f"{text['page']} {number}", fill=MUTED, font=load_font(18))
+
+
+def _compose_pages(lang: str, tables: dict[str, pd.DataFrame], charts: dict[str, Image.Image],
+                   video_name: str, duration_seconds: float, generated: date) -> list[Image.Image]:
+    text = TEXTS[lang]
+    summary = tables["Summary Dashboard"]
+    title_font, heading_font, body_font = load_font(44, bold=True), load_font(30, bold=True), load_font(24)
+
+    def motion_name(name: str) -> str:
+        return f"{MOTION_LABELS_TH.get(name, name)} ({name})" if lang == "th" else name
+
+    first = _template_page().copy()
+    draw = ImageDraw.Draw(first)
+    y = HEADER_HEIGHT + 30
+    draw.text((MARGIN, y), text["title"], fill=INK, font=title_font)
+    y += 80
+    top = summary.loc[summary["count"].idxmax()] if len(summary) and summary["count"].max() > 0 else None
+    facts = [
+        (text["generated"], generated.isoformat()),
+        (text["video"], video_name),
+        (text["duration"], _format_duration(duration_seconds)),
+        (text["labeled"], str(len(tables["Motion Report"]["timestamp"].unique()))),
+        (text["top_motion"], motion_name(top["motion"]) if top is not None else text["none"]),
+    ]
+    for label, value in facts:
+        draw.text((MARGIN, y), f"{label}:", fill=MUTED, font=body_font)
+        draw.text((MARGIN + 420, y), value, fill=INK, font=body_font)
+        y += 40
+    y += 30
+    draw.text((MARGIN, y), text["counts_title"], fill=INK, font=heading_font)
+    y += 55
+    first.paste(charts["counts"], (MARGIN, y))
+    _footer(draw, text, 1)
+
+    second = _template_page().copy()
+    draw = ImageDraw.Draw(second)
+    y = HEADER_HEIGHT + 30
+    draw.text((MARGIN, y), text["table_title"], fill=INK, font=heading_font)
+    y += 60
+    columns = [(text["motion"], 0), (text["seconds"], 470), (text["episodes"], 640), (text["per_minute"], 830)]
+    for header, x in columns:
+        draw.text((MARGIN + x, y), header, fill=MUTED, font=body_font)
+    y += 40
+    for row in summary.itertuples(index=False):
+        draw.line([MARGIN, y - 4, PAGE_SIZE[0] - MARGIN, y - 4], fill=GRID, width=1)
+        cells = [motion_name(row.motion), f"{row.total_seconds:g}", f"{row.episodes}", f"{row.episodes_per_minute:.2f}"]
+        for (_, x), cell in zip(columns, cells):
+            draw.text((MARGIN + x, y), cell, fill=INK, font=body_font)
+        y += 36
+    y += 40
+    draw.text((MARGIN, y), text["energy_title"], fill=INK, font=heading_font)
+    y += 55
+    second.paste(charts["energy"], (MARGIN, y))
+    _footer(draw, text, 2)
+
+    third = _template_page().copy()
+    draw = ImageDraw.Draw(third)
+    y = HEADER_HEIGHT + 30
+    draw.text((MARGIN, y), text["cooccurrence_title"], fill=INK, font=heading_font)
+    third.paste(charts["cooccurrence"], (MARGIN, y + 60))
+    _footer(draw, text, 3)
+    return [first, second, third]
+
+
+def write_pdf_reports(tables: dict[str, pd.DataFrame], video_name: str, duration_seconds: float,
+                      paths: dict[str, Path], generated: date | None = None) -> dict[str, Path]:
+    """Write one PDF per language in `paths`, rendering the charts only once."""
+    charts = render_charts(tables)
+    generated = generated or date.today()
+    for lang, path in paths.items():
+        pages = _compose_pages(lang, tables, charts, video_name, duration_seconds, generated)
+        pages[0].save(path, "PDF", resolution=PAGE_DPI, save_all=True, append_images=pages[1:])
+    return paths
+
+
+def cached_pdf_reports(motion_df: pd.DataFrame, motion_cols: list[str], landmarks: np.ndarray, fps: float,
+                       aspect: float, duration_seconds: float, video_name: str,
+                       out_dir: str | Path) -> dict[str, Path]:
+    """Thai and English reports for a job, generated once per distinct input and day."""
+    out_dir = Path(out_dir)
+    today = date.today()
+    # The pages also print the video name and the date
+    printed = hashlib.sha1(f"{video_name}\n{today.isoformat()}".encode()).hexdigest()[:8]
+    key = f"{report_digest(motion_df, motion_cols, landmarks, fps)}_{printed}"
+    paths = {lang: out_dir / f"presentation_report_{key}_{lang}.pdf" for lang in ("th", "en")}
+    if all(path.exists() for path in paths.values()):
+        return paths
+    tables = build_report(motion_df, motion_cols, landmarks, fps, aspect, duration_seconds)
+    return write_pdf_reports(tables, video_name, duration_seconds, paths, today)
@@ -0,0 +1,136 @@
+"""
+Fallback person detector used when no pose is found.
+
+`PersonTracker` replaces the per-frame full-resolution contour search with a
+persistent background subtractor on a downscaled frame. It searches near the
+previous box first, follows a presenter who stands still with template
+matching, and smooths the box over time so the heuristic skeleton does not
+jitter. A tracker can be seeded with the box another one ended on (e.g. the
+previous checkpoint segment's), so the box carries on instead of restarting
+at the frame center.
+"""
+
+from __future__ import annotations
+
+import cv2
+import numpy as np
+
+
+class PersonTracker:
+    def __init__(self, work_width: int = 320, smoothing: float = 0.25, search_margin: float = 0.5,
+                 min_area_ratio: float = 0.002, method: str = "MOG2"):
+        self.work_width = work_width
+        # EMA weight of the newest measurement (lower = smoother, slower)
+        self.smoothing = smoothing
+        # How far around the previous box to search, as a fraction of its size
+        self.search_margin = search_margin
+        self.min_area_ratio = min_area_ratio
+        if method == "KNN":
+            self._subtractor = cv2.createBackgroundSubtractorKNN(detectShadows=False)
+        else:
+            self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=False)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self._frames_seen = 0
+        self._scale = None
+        self._small = None
+        self._gray = None
+        self._mask = None
+        self._template = None  # grayscale patch of the last box
+        self._smoothed = None  # smoothed (cx, cy, w, h) in work coordinates
+        self._seed = None  # (cx, cy, w, h) in frame pixels until the first frame
+
+    def seed(self, box: tuple[int, int, int, int]) -> None:
+        """Start from `box` (center_x, center_y, width, height in frame pixels) found before the first frame."""
+        self._seed = box
+
+    @property
+    def box(self) -> tuple[int, int, int, int] | None:
+        """The smoothed box in frame pixels, or the seed; None before the person was ever found."""
+        if self._smoothed is None:
+            return self._seed
+        cx, cy, w, h = (self._smoothed / self._scale).astype(int)
+        return int(cx), int(cy), int(w), int(h)
+
+    def update(self, frame: np.ndarray) -> tuple[int, int, int, int]:
+        """Return the smoothed person (center_x, center_y, width, height) in frame pixels."""
+        height, width = frame.shape[:2]
+        if self._scale is None:
+            self._scale = min(1.0, self.work_width / width)
+            work_size = (max(1, int(width * self._scale)), max(1, int(height * self._scale)))
+            self._small = np.empty((work_size[1], work_size[0], 3), dtype=np.uint8)
+            self._gray = np.empty((work_size[1], work_size[0]), dtype=np.uint8)
+            self._mask = np.empty((work_size[1], work_size[0]), dtype=np.uint8)
+            if self._seed is not None:
+                self._smoothed = np.array(self._seed, dtype=np.float32) * self._scale
+
+        cv2.resize(frame, self._small.shape[1::-1], dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        mask = self._subtractor.apply(self._small, fgmask=self._mask)
+        cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel, dst=mask)
+        cv2.dilate(mask, self._kernel, dst=mask, iterations=2)
+
+        self._frames_seen += 1
+        box = None
+        # On the first frame the background model is empty and everything is foreground
+        if self._frames_seen > 1:
+            if self._smoothed is not None:
+                box = self._find_foreground(mask, self._search_window())
+                if box is None:
+                    box = self._match_template()
+            if box is None:
+                box = self._find_foreground(mask, None)
+
+        if box is not None:
+            x, y, w, h = box
+            self._template = self._gray[y:y + h, x:x + w].copy()
+            measurement = np.array([x + w / 2, y + h / 2, w, h], dtype=np.float32)
+            if self._smoothed is None:
+                self._smoothed = measurement
+            else:
+                self._smoothed += self.smoothing * (measurement - self._smoothed)
+
+        if self._smoothed is None:
+            # Fallback to frame center
+            return width // 2, height // 2, width // 4, height // 2
+        return self.box
+
+    def _search_window(self) -> tuple[int, int, int, int]:
+        """The smoothed box grown by the search margin (the raw box can be a partial blob)."""
+        cx, cy, w, h = self._smoothed
+        half_w, half_h = w * (0.5 + self.search_margin), h * (0.5 + self.search_margin)
+        img_h, img_w = self._gray.shape
+        x0, y0 = max(0, int(cx - half_w)), max(0, int(cy - half_h))
+        x1, y1 = min(img_w, int(cx + half_w) + 1), min(img_h, int(cy + half_h) + 1)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def _find_foreground(self, mask: np.ndarray, window) -> tuple[int, int, int, int] | None:
+        """Bounding box of the foreground blobs (person parts) inside the window."""
+        ox, oy = 0, 0
+        if window is not None:
+            ox, oy, w, h = window
+            mask = mask[oy:oy + h, ox:ox + w]
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_area_ratio * self._gray.size
+        parts = [c for c in contours if cv2.contourArea(c) >= min_area]
+        if not parts:
+            return None
+        if window is None:
+            # Full-frame search: keep the largest blob, not every moving thing
+            parts = [max(parts, key=cv2.contourArea)]
+        x, y, w, h = cv2.boundingRect(np.concatenate(parts))
+        return x + ox, y + oy, w, h
+
+    def _match_template(self) -> tuple[int, int, int, int] | None:
+        """Follow a presenter who stopped moving (and faded into the background model)."""
+        # Flat patches match anywhere, so only follow textured ones
+        if self._template is None or self._template.size == 0 or self._template.std() < 10:
+            return None
+        sx, sy, sw, sh = self._search_window()
+        th, tw = self._template.shape
+        if sw < tw or sh < th:
+            return None
+        scores = cv2.matchTemplate(self._gray[sy:sy + sh, sx:sx + sw], self._template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < 0.5:
+            return None
+        return sx + bx, sy + by, tw, th
@@ -0,0 +1,330 @@
+"""
+Pose estimation backends.
+
+Every backend takes a BGR frame and returns a (33, 4) float32 array of
+normalized MediaPipe-style landmarks (x, y, z, visibility), or None when no
+person was found. Joints a backend cannot estimate get visibility 0 and are
+skipped when drawing.
+
+By default the models run in worker processes, behind the same interface
+(see `pose_workers`).
+
+`select_backend` runs a short micro-benchmark on sample frames and picks the
+fastest backend whose accuracy score meets a floor on the current host.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from frame_buffers import reuse_buffer
+
+# Try to import mediapipe, with fallback for deployment
+try:
+    import mediapipe as mp
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    mp = None
+    MEDIAPIPE_AVAILABLE = False
+
+NUM_LANDMARKS = 33
+
+# MediaPipe's 33-landmark topology, kept here so drawing works without mediapipe.
+POSE_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+)
+
+# OpenPose COCO keypoint index -> MediaPipe landmark index
+COCO_TO_MEDIAPIPE = {
+    0: 0,    # nose
+    15: 2,   # left eye
+    14: 5,   # right eye
+    17: 7,   # left ear
+    16: 8,   # right ear
+    5: 11,   # left shoulder
+    2: 12,   # right shoulder
+    6: 13,   # left elbow
+    3: 14,   # right elbow
+    7: 15,   # left wrist
+    4: 16,   # right wrist
+    11: 23,  # left hip
+    8: 24,   # right hip
+    12: 25,  # left knee
+    9: 26,   # right knee
+    13: 27,  # left ankle
+    10: 28,  # right ankle
+}
+
+# Local OpenPose model files (Caffe .caffemodel + .prototxt, or a TensorFlow .pb graph)
+DNN_MODEL_PATH = Path(os.environ.get("POSE_DNN_MODEL", "models/pose_iter_440000.caffemodel"))
+DNN_CONFIG_PATH = Path(os.environ.get("POSE_DNN_CONFIG", "models/pose_deploy_linevec.prototxt"))
+DNN_INPUT_SIZE = int(os.environ.get("POSE_DNN_INPUT_SIZE", "256"))
+
+DEFAULT_ACCURACY_FLOOR = 0.6
+
+# Models run in worker processes (see pose_workers), keeping this many warm; 0 runs them in-process
+POSE_WORKERS = int(os.environ.get("POSE_WORKERS", "2"))
+
+
+class PoseBackend:
+    """Base class: a context manager with a `process(frame_bgr)` method."""
+
+    name = "base"
+    # Nominal accuracy in [0, 1] relative to MediaPipe's heavy model
+    accuracy = 0.0
+    # Whether `process` carries tracking state from frame to frame (one instance per person)
+    stateful = False
+
+    def open(self) -> "PoseBackend":
+        return self
+
+    def close(self) -> None:
+        pass
+
+    def process(self, frame_bgr: np.ndarray) -> np.ndarray | None:
+        raise NotImplementedError
+
+    def process_batch(self, frames: list[np.ndarray]) -> list[np.ndarray | None]:
+        """Landmarks for several frames (e.g. person crops); backends that can batch override this."""
+        return [self.process(frame) for frame in frames]
+
+    def submit(self, frame_bgr: np.ndarray):
+        """
+        Start on a frame and return a ticket for `result`, so callers can keep
+        several out-of-process backends busy at once. In-process backends
+        finish the frame here.
+        """
+        return self.process(frame_bgr)
+
+    def result(self, ticket) -> np.ndarray | None:
+        return ticket
+
+    def __enter__(self) -> "PoseBackend":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MediaPipeBackend(PoseBackend):
+    """MediaPipe Pose at model complexity 0 (lite), 1 (full) or 2 (heavy)."""
+
+    ACCURACY_BY_COMPLEXITY = {0: 0.75, 1: 0.9, 2: 1.0}
+    stateful = True
+
+    def __init__(self, model_complexity: int = 1):
+        self.model_complexity = model_complexity
+        self.name = f"mediapipe-{model_complexity}"
+        self.accuracy = self.ACCURACY_BY_COMPLEXITY[model_complexity]
+        self._pose = None
+        self._rgb = None
+
+    def open(self) -> "MediaPipeBackend":
+        self._pose = mp.solutions.pose.Pose(
+            model_complexity=self.model_complexity,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5,
+        )
+        return self
+
+    def close(self) -> None:
+        if self._pose is not None:
+            self._pose.close()
+            self._pose = None
+
+    def process(self, frame_bgr: np.ndarray) -> np.ndarray | None:
+        # Convert BGR to RGB for MediaPipe, into a buffer reused across frames
+        self._rgb = reuse_buffer(self._rgb, frame_bgr.shape)
+        cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        results = self._pose.process(self._rgb)
+        if not results.pose_landmarks:
+            return None
+        return np.array(
+            [(lm.x, lm.y, lm.z, lm.visibility) for lm in results.pose_landmarks.landmark],
+            dtype=np.float32,
+        )
+
+
+class OpenCVDNNBackend(PoseBackend):
+    """OpenPose body model run through `cv2.dnn`, loaded from local files."""
+
+    name = "opencv-dnn"
+    accuracy = 0.7
+
+    def __init__(self, model_path: Path = DNN_MODEL_PATH, config_path: Path = DNN_CONFIG_PATH,
+                 input_size: int = DNN_INPUT_SIZE, threshold: float = 0.1):
+        self.model_path = Path(model_path)
+        self.config_path = Path(config_path)
+        self.input_size = input_size
+        self.threshold = threshold
+        self._net = None
+
+    @staticmethod
+    def files_present(model_path: Path = DNN_MODEL_PATH, config_path: Path = DNN_CONFIG_PATH) -> bool:
+        model_path = Path(model_path)
+        # TensorFlow graphs are self-contained; Caffe models need their prototxt
+        if model_path.suffix == ".pb":
+            return model_path.exists()
+        return model_path.exists() and Path(config_path).exists()
+
+    def open(self) -> "OpenCVDNNBackend":
+        if self.model_path.suffix == ".pb":
+            self._net = cv2.dnn.readNet(str(self.model_path))
+        else:
+            self._net = cv2.dnn.readNet(str(self.model_path), str(self.config_path))
+        return self
+
+    def close(self) -> None:
+        self._net = None
+
+    def _blob(self, frames: list[np.ndarray]) -> np.ndarray:
+        size = (self.input_size, self.input_size)
+        if self.model_path.suffix == ".pb":
+            return cv2.dnn.blobFromImages(frames, 1.0, size, (127.5, 127.5, 127.5), swapRB=True, crop=False)
+        return cv2.dnn.blobFromImages(frames, 1.0 / 255, size, (0, 0, 0), swapRB=False, crop=False)
+
+    def _landmarks(self, heatmaps: np.ndarray) -> np.ndarray | None:
+        map_h, map_w = heatmaps.shape[1:3]
+        landmarks = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        found = 0
+        for coco_idx, mp_idx in COCO_TO_MEDIAPIPE.items():
+            _, confidence, _, point = cv2.minMaxLoc(heatmaps[coco_idx])
+            if confidence < self.threshold:
+                continue
+            landmarks[mp_idx] = (point[0] / map_w, point[1] / map_h, 0.0, confidence)
+            found += 1
+        # Require a handful of joints before calling it a person
+        return landmarks if found >= 4 else None
+
+    def process(self, frame_bgr: np.ndarray) -> np.ndarray | None:
+        return self.process_batch([frame_bgr])[0]
+
+    def process_batch(self, frames: list[np.ndarray]) -> list[np.ndarray | None]:
+        # One forward pass for the whole batch
+        self._net.setInput(self._blob(frames))
+        return [self._landmarks(heatmaps) for heatmaps in self._net.forward()]
+
+
+class HeuristicBackend(PoseBackend):
+    """No landmarks: the render loop draws the contour-based skeleton instead."""
+
+    name = "heuristic"
+    accuracy = 0.1
+
+    def process(self, frame_bgr: np.ndarray) -> np.ndarray | None:
+        return None
+
+
+def available_backends() -> list[str]:
+    """Names of the backends that can run on this host, most accurate first."""
+    names = []
+    if MEDIAPIPE_AVAILABLE:
+        names += ["mediapipe-2", "mediapipe-1", "mediapipe-0"]
+    if OpenCVDNNBackend.files_present():
+        names.append("opencv-dnn")
+    names.append("heuristic")
+    return names
+
+
+def create_backend(name: str, isolated: bool | None = None) -> PoseBackend:
+    """
+    The backend `name`. Unless `isolated` is False (or `POSE_WORKERS` is 0)
+    its model runs in a worker process; the heuristic has no model to isolate.
+    """
+    if isolated is None:
+        isolated = POSE_WORKERS > 0 and name != "heuristic"
+    if isolated:
+        # Imported here: pose_workers builds on this module
+        from pose_workers import WorkerPoseBackend
+        return WorkerPoseBackend(name)
+    if name.startswith("mediapipe-"):
+        return MediaPipeBackend(int(name.rsplit("-", 1)[1]))
+    if name == "opencv-dnn":
+        return OpenCVDNNBackend()
+    if name == "heuristic":
+        return HeuristicBackend()
+    raise ValueError(f"Unknown pose backend: {name}")
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    fps: float
+    detection_rate: float
+    score: float
+
+
+# Speeds are per host and frame size, so they are timed once per process. Detection
+# rates depend on the video, so they are measured on every call's sample frames
+_SPEED_CACHE: dict[tuple, float] = {}
+
+
+def benchmark_backends(frames: list[np.ndarray], names: list[str] | None = None) -> list[BenchmarkResult]:
+    """
+    Time each backend on the sample frames.
+
+    The score is the backend's nominal accuracy scaled by how often it found a
+    person in the samples. The heuristic backend always yields a box, so its
+    score is its nominal accuracy.
+    """
+    names = names or available_backends()
+    results = []
+    for name in names:
+        key = (name, frames[0].shape if frames else None)
+        timed = key not in _SPEED_CACHE
+        with create_backend(name) as backend:
+            if isinstance(backend, HeuristicBackend) and not timed:
+                results.append(BenchmarkResult(name, _SPEED_CACHE[key], 1.0, backend.accuracy))
+                continue
+            if frames and timed:
+                backend.process(frames[0])  # warm-up (model load, graph init)
+            detected = 0
+            start = time.perf_counter()
+            for frame in frames:
+                if backend.process(frame) is not None:
+                    detected += 1
+            elapsed = time.perf_counter() - start
+        if timed:
+            _SPEED_CACHE[key] = len(frames) / elapsed if elapsed > 0 else float("inf")
+        if isinstance(backend, HeuristicBackend):
+            detection_rate = 1.0
+        else:
+            detection_rate = detected / len(frames) if frames else 0.0
+        results.append(BenchmarkResult(name, _SPEED_CACHE[key], detection_rate, backend.accuracy * detection_rate))
+    return results
+
+
+def select_backend(frames: list[np.ndarray], accuracy_floor: float = DEFAULT_ACCURACY_FLOOR) -> tuple[str, list[BenchmarkResult]]:
+    """Pick the fastest backend meeting the accuracy floor (or the best-scoring one)."""
+    results = benchmark_backends(frames)
+    eligible = [r for r in results if r.score >= accuracy_floor]
+    if eligible:
+        best = max(eligible, key=lambda r: r.fps)
+    else:
+        best = max(results, key=lambda r: (r.score, r.fps))
+    return best.name, results
+
+
+def sample_frames(cap: cv2.VideoCapture, count: int = 8) -> list[np.ndarray]:
+    """Read `count` frames spread over the video, then rewind to the start."""
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    positions = np.linspace(0, max(total - 1, 0), num=count, dtype=int) if total > 0 else range(count)
+    for pos in positions:
+        if total > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(pos))
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    return frames
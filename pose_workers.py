@@ -0,0 +1,417 @@
+"""
+Pose inference in worker processes.
+
+A crash or hang inside a pose model (MediaPipe's `process`, an OpenCV DNN
+forward pass) would take the whole Streamlit server down, and the model's
+Python-side work holds the GIL that every other session needs. With
+`POSE_WORKERS` > 0 each pose backend instance is a `WorkerPoseBackend`: a
+proxy whose model runs in a separate process.
+
+Frames never go through pickle. Each worker has a ring of
+`POSE_WORKER_SLOTS` frame slots in `multiprocessing.shared_memory` and a
+second block for the (33, 4) landmark results; the pipe between the two
+processes only carries slot numbers, shapes and found flags. Up to a ring's
+worth of frames can be submitted before their results are collected, so a
+caller can keep several workers (one per tracked person) busy at once.
+
+Every result is waited for at most `POSE_FRAME_TIMEOUT` seconds per frame.
+A worker that misses it or dies is killed and restarted, and its pending
+frames come back as "no pose"; after `MAX_CONSECUTIVE_FAILURES` failures in
+a row the backend gives up with `PoseWorkerError`. Closed backends return
+their worker to a process-wide pool, which keeps up to `POSE_WORKERS` warm
+workers for the next render. At most `POSE_MAX_WORKERS` workers run at once,
+leased or idle; a lease at the cap waits up to `POSE_LEASE_TIMEOUT` seconds
+for one to be released and then fails with `PoseWorkerError`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from pose_backends import NUM_LANDMARKS, POSE_WORKERS, PoseBackend, create_backend
+
+POSE_WORKER_SLOTS = int(os.environ.get("POSE_WORKER_SLOTS", "4"))
+POSE_FRAME_TIMEOUT = float(os.environ.get("POSE_FRAME_TIMEOUT", "5"))
+# Starting a worker imports the model libraries and loads the model
+POSE_WORKER_START_TIMEOUT = float(os.environ.get("POSE_WORKER_START_TIMEOUT", "60"))
+MAX_CONSECUTIVE_FAILURES = 3
+# Worker processes alive at once across all sessions, and how long a lease waits for one
+POSE_MAX_WORKERS = int(os.environ.get("POSE_MAX_WORKERS", "8"))
+POSE_LEASE_TIMEOUT = float(os.environ.get("POSE_LEASE_TIMEOUT", "30"))
+
+LANDMARK_SHAPE = (NUM_LANDMARKS, 4)
+
+# Spawned, not forked: the server is multithreaded and MediaPipe is not fork-safe
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+class PoseWorkerError(RuntimeError):
+    """A pose worker could not start, or kept crashing or timing out."""
+
+
+def _worker_main(backend_name: str, conn, results_name: str, slots: int) -> None:
+    # Ctrl-C is the server's to handle; it stops workers through the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    results_block = SharedMemory(results_name)
+    results = np.ndarray((slots, *LANDMARK_SHAPE), dtype=np.float32, buffer=results_block.buf)
+    ring = None
+    slot_bytes = 0
+    backend = create_backend(backend_name, isolated=False).open()
+    conn.send(("ready",))
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            kind = message[0]
+            if kind == "frames":
+                _, seq, frames = message
+                views = [np.ndarray(shape, dtype=np.uint8, buffer=ring.buf, offset=slot * slot_bytes)
+                         for slot, shape in frames]
+                try:
+                    landmarks = backend.process_batch(views)
+                except Exception:
+                    conn.send((seq, None, traceback.format_exc()))
+                    continue
+                finally:
+                    # The ring may be replaced by the next message
+                    del views
+                found = []
+                for (slot, _), points in zip(frames, landmarks):
+                    if points is not None:
+                        results[slot] = points
+                    found.append(points is not None)
+                conn.send((seq, found, None))
+            elif kind == "ring":
+                if ring is not None:
+                    ring.close()
+                ring = SharedMemory(message[1])
+                slot_bytes = message[2]
+            elif kind == "reset":
+                # A fresh model for a new stream: no tracking state carried over
+                backend.close()
+                backend.open()
+                conn.send(("ready",))
+            elif kind == "stop":
+                break
+    finally:
+        backend.close()
+        del results
+        results_block.close()
+        if ring is not None:
+            ring.close()
+
+
+def _unlink(block: SharedMemory | None) -> None:
+    if block is None:
+        return
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class PoseWorker:
+    """One worker process running `backend_name`, with its frame ring and result block."""
+
+    def __init__(self, backend_name: str, slots: int = POSE_WORKER_SLOTS,
+                 frame_timeout: float = POSE_FRAME_TIMEOUT):
+        self.backend_name = backend_name
+        self.slots = slots
+        self.frame_timeout = frame_timeout
+        self.restarts = 0
+        self._failures = 0
+        self._process = None
+        self._conn = None
+        self._results_block = None
+        self._results = None
+        self._ring = None
+        self._frames = None
+        self._slot_bytes = 0
+        self._next_slot = 0
+        self._seq = 0
+        # (seq, slots) of submitted frames, oldest first, and collected results by seq
+        self._pending: deque[tuple[int, list[int]]] = deque()
+        self._done: dict[int, list[np.ndarray | None]] = {}
+
+    def start(self) -> "PoseWorker":
+        self._results_block = SharedMemory(create=True, size=self.slots * NUM_LANDMARKS * 4 * 4)
+        self._results = np.ndarray((self.slots, *LANDMARK_SHAPE), dtype=np.float32, buffer=self._results_block.buf)
+        self._conn, child_conn = _CONTEXT.Pipe()
+        self._process = _CONTEXT.Process(
+            target=_worker_main, args=(self.backend_name, child_conn, self._results_block.name, self.slots),
+            daemon=True, name=f"pose-{self.backend_name}",
+        )
+        self._process.start()
+        child_conn.close()
+        if self._slot_bytes:
+            try:
+                self._conn.send(("ring", self._ring.name, self._slot_bytes))
+            except (BrokenPipeError, OSError):
+                # Died on startup: `_wait_ready` reports it
+                pass
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self) -> None:
+        try:
+            ready = self._conn.poll(POSE_WORKER_START_TIMEOUT) and self._conn.recv() == ("ready",)
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.stop()
+            raise PoseWorkerError(f"Pose worker for {self.backend_name} did not start")
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def reset(self) -> None:
+        """Drop the model's tracking state (and anything still pending)."""
+        self._drain()
+        self._conn.send(("reset",))
+        self._wait_ready()
+
+    def stop(self) -> None:
+        if self._process is not None:
+            try:
+                self._conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(1.0)
+            self._kill()
+        self._results = None
+        self._frames = None
+        _unlink(self._results_block)
+        _unlink(self._ring)
+        self._results_block = self._ring = None
+        self._slot_bytes = 0
+
+    def _kill(self) -> None:
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._process = None
+        self._conn.close()
+
+    def _restart(self) -> None:
+        """Replace a dead or hung worker; its pending frames found no pose."""
+        for seq, slots in self._pending:
+            self._done[seq] = [None] * len(slots)
+        self._pending.clear()
+        self._kill()
+        self.restarts += 1
+        self._failures += 1
+        if self._failures >= MAX_CONSECUTIVE_FAILURES:
+            self.stop()
+            raise PoseWorkerError(f"Pose worker for {self.backend_name} failed {self._failures} times in a row")
+        self._results = None
+        _unlink(self._results_block)
+        self.start()
+
+    def _ensure_ring(self, slot_bytes: int) -> None:
+        if slot_bytes <= self._slot_bytes:
+            return
+        # Pending frames live in the old ring until their results are in
+        self._drain()
+        self._frames = None
+        _unlink(self._ring)
+        self._ring = SharedMemory(create=True, size=self.slots * slot_bytes)
+        self._frames = np.ndarray(self.slots * slot_bytes, dtype=np.uint8, buffer=self._ring.buf)
+        self._slot_bytes = slot_bytes
+        try:
+            self._conn.send(("ring", self._ring.name, slot_bytes))
+        except (BrokenPipeError, OSError):
+            # The new worker is sent the ring as it starts
+            self._restart()
+
+    def submit(self, frames: list[np.ndarray]) -> int:
+        """Copy up to `slots` uint8 frames into the ring and queue them; returns a ticket for `result`."""
+        if len(frames) > self.slots:
+            raise ValueError(f"At most {self.slots} frames per submit")
+        self._ensure_ring(max(frame.nbytes for frame in frames))
+        while self.slots - sum(len(slots) for _, slots in self._pending) < len(frames):
+            self._collect()
+        message = []
+        slots = []
+        for frame in frames:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.slots
+            begin = slot * self._slot_bytes
+            self._frames[begin:begin + frame.nbytes].reshape(frame.shape)[...] = frame
+            message.append((slot, frame.shape))
+            slots.append(slot)
+        self._seq += 1
+        self._pending.append((self._seq, slots))
+        try:
+            self._conn.send(("frames", self._seq, message))
+        except (BrokenPipeError, OSError):
+            self._restart()
+        return self._seq
+
+    def result(self, ticket: int) -> list[np.ndarray | None]:
+        """The landmarks (or None) of each frame of a submit, waiting for them if needed."""
+        while ticket not in self._done:
+            self._collect()
+        return self._done.pop(ticket)
+
+    def _collect(self) -> None:
+        """Wait for the oldest pending submit, restarting the worker if it hangs or dies."""
+        seq, slots = self._pending[0]
+        try:
+            reply = self._conn.recv() if self._conn.poll(self.frame_timeout * len(slots)) else None
+        except (EOFError, OSError):
+            reply = None
+        if reply is None:
+            self._restart()
+            return
+        self._pending.popleft()
+        reply_seq, found, error = reply
+        if error is not None:
+            # The model raised (rather than crashed): fail the render as it would in-process
+            raise PoseWorkerError(f"Pose worker for {self.backend_name} raised:\n{error}")
+        self._failures = 0
+        self._done[reply_seq] = [self._results[slot].copy() if hit else None for slot, hit in zip(slots, found)]
+
+    def _drain(self) -> None:
+        while self._pending:
+            self._collect()
+
+
+class PoseWorkerPool:
+    """
+    Warm workers, leased to one backend instance at a time; at most
+    `idle_limit` are kept idle and `max_workers` are alive (leased or idle).
+    """
+
+    def __init__(self, idle_limit: int = POSE_WORKERS, max_workers: int = POSE_MAX_WORKERS,
+                 lease_timeout: float = POSE_LEASE_TIMEOUT):
+        self.idle_limit = idle_limit
+        self.max_workers = max_workers
+        self.lease_timeout = lease_timeout
+        # Least recently released first
+        self._idle: list[PoseWorker] = []
+        # Leased and idle workers, including ones still starting
+        self._live = 0
+        self._available = threading.Condition()
+
+    def lease(self, backend_name: str) -> PoseWorker:
+        deadline = time.monotonic() + self.lease_timeout
+        stale = None
+        with self._available:
+            while True:
+                matching = [i for i, worker in enumerate(self._idle) if worker.backend_name == backend_name]
+                if matching:
+                    worker = self._idle.pop(matching[-1])
+                    break
+                worker = None
+                if self._live < self.max_workers:
+                    self._live += 1
+                    break
+                if self._idle:
+                    # At the cap: an idle worker of another backend makes room
+                    stale = self._idle.pop(0)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoseWorkerError(f"All {self.max_workers} pose workers are busy; try again shortly")
+                self._available.wait(remaining)
+        # The slot taken above is this lease's from here on
+        if stale is not None:
+            stale.stop()
+        if worker is not None:
+            if worker.alive:
+                try:
+                    worker.reset()
+                    return worker
+                except PoseWorkerError:
+                    pass
+            worker.stop()
+        try:
+            return PoseWorker(backend_name).start()
+        except BaseException:
+            self._forget(1)
+            raise
+
+    def _forget(self, count: int) -> None:
+        with self._available:
+            self._live -= count
+            self._available.notify_all()
+
+    def release(self, worker: PoseWorker) -> None:
+        evicted = []
+        with self._available:
+            if worker.alive:
+                self._idle.append(worker)
+            else:
+                evicted.append(worker)
+            while len(self._idle) > self.idle_limit:
+                evicted.append(self._idle.pop(0))
+            self._live -= len(evicted)
+            self._available.notify_all()
+        for stale in evicted:
+            stale.stop()
+
+    def shutdown(self) -> None:
+        with self._available:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+        self._forget(len(workers))
+
+
+_POOL = PoseWorkerPool()
+atexit.register(_POOL.shutdown)
+
+
+class WorkerPoseBackend(PoseBackend):
+    """A pose backend whose model runs in a leased worker process."""
+
+    def __init__(self, backend_name: str, pool: PoseWorkerPool = _POOL):
+        backend = create_backend(backend_name, isolated=False)
+        self.backend_name = backend_name
+        self.name = backend.name
+        self.accuracy = backend.accuracy
+        self.stateful = backend.stateful
+        self._pool = pool
+        self._worker = None
+
+    @property
+    def restarts(self) -> int:
+        return self._worker.restarts if self._worker is not None else 0
+
+    def open(self) -> "WorkerPoseBackend":
+        self._worker = self._pool.lease(self.backend_name)
+        return self
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._pool.release(self._worker)
+            self._worker = None
+
+    def process(self, frame_bgr: np.ndarray) -> np.ndarray | None:
+        return self.result(self.submit(frame_bgr))
+
+    def process_batch(self, frames: list[np.ndarray]) -> list[np.ndarray | None]:
+        # The worker runs each ring-sized chunk as one batch
+        slots = self._worker.slots
+        tickets = [self._worker.submit(frames[i:i + slots]) for i in range(0, len(frames), slots)]
+        return [points for ticket in tickets for points in self._worker.result(ticket)]
+
+    def submit(self, frame_bgr: np.ndarray) -> int:
+        return self._worker.submit([frame_bgr])
+
+    def result(self, ticket: int) -> np.ndarray | None:
+        return self._worker.result(ticket)[0]
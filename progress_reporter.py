@@ -0,0 +1,149 @@
+"""
+Throttled progress reporting for long renders.
+
+Render loops call the reporter once per frame; it only forwards an update
+to the UI when `min_interval` seconds have passed (or the stage changes), so
+the browser gets a few deltas per second instead of one per frame. The
+throughput is smoothed across updates and the ETA is derived from it.
+
+`CAP_PROP_FRAME_COUNT` comes from the container header and is 0 or wrong for
+some files (streams, variable frame rate, broken headers); `expected_frames`
+cross-checks it against the container duration reported by ffmpeg.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from video_encoder import FFMPEG_BIN
+
+# Seconds between UI updates
+PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL", "0.25"))
+
+_DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def container_duration(video_path: str | Path) -> float | None:
+    """Duration in seconds from the container, via `ffmpeg -i` (None if unavailable)."""
+    if shutil.which(FFMPEG_BIN) is None:
+        return None
+    try:
+        log = subprocess.run([FFMPEG_BIN, "-hide_banner", "-i", str(video_path)],
+                             capture_output=True, text=True, timeout=30).stderr
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _DURATION.search(log)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def expected_frames(video_path: str | Path, fps: float, frame_count: int) -> int:
+    """
+    Frame count to report progress against: the header count unless it is
+    missing or disagrees with duration x fps by more than a second or 5%.
+    0 means unknown.
+    """
+    duration = container_duration(video_path)
+    if duration is None or fps <= 0:
+        return max(frame_count, 0)
+    estimate = round(duration * fps)
+    if frame_count <= 0 or abs(frame_count - estimate) > max(fps, 0.05 * estimate):
+        return estimate
+    return frame_count
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressState(NamedTuple):
+    stage: str
+    done: int
+    # 0 when the total is unknown
+    total: int
+    fps: float
+    eta_seconds: float | None
+
+    @property
+    def fraction(self) -> float:
+        return min(self.done / self.total, 1.0) if self.total > 0 else 0.0
+
+    def describe(self) -> str:
+        count = f"{self.done}/{self.total}" if self.total > 0 else f"{self.done}"
+        return f"{self.stage}: frame {count} • {self.fps:.1f} fps • ETA {format_eta(self.eta_seconds)}"
+
+
+class ProgressReporter:
+    """
+    `progress(done, total)` callback that forwards at most one `ProgressState`
+    per `min_interval` to `on_update`.
+
+    `total_frames`, if given, overrides the total the render loop passes
+    (e.g. from `expected_frames`). When the frames done overtake the total,
+    the total is treated as an underestimate and extended, so the bar never
+    sits at 100% while work continues.
+    """
+
+    def __init__(self, on_update: Callable[[ProgressState], None], total_frames: int | None = None,
+                 stage: str = "Rendering", min_interval: float = PROGRESS_INTERVAL, smoothing: float = 0.3):
+        self.on_update = on_update
+        self.total_frames = total_frames
+        self.stage_name = stage
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self.fps = 0.0
+        self._done = 0
+        self._total = total_frames or 0
+        self._last_time = None
+        self._last_done = 0
+        self._finished = False
+
+    def __call__(self, done: int, total: int = 0) -> None:
+        self._done = done
+        self._total = self.total_frames or total
+        now = time.perf_counter()
+        if self._last_time is None:
+            self._last_time, self._last_done = now, done
+            self._emit()
+        elif now - self._last_time >= self.min_interval:
+            # Rate over the whole interval, smoothed across intervals
+            rate = (done - self._last_done) / (now - self._last_time)
+            self.fps = rate if self.fps == 0.0 else self.smoothing * rate + (1 - self.smoothing) * self.fps
+            self._last_time, self._last_done = now, done
+            self._emit()
+
+    def stage(self, name: str) -> None:
+        """Switch to a new stage and show it immediately."""
+        self.stage_name = name
+        self._emit()
+
+    def finish(self, stage: str = "Done", done: int | None = None) -> None:
+        """Show the final state; `done` is the final frame count if the last call preceded it."""
+        self._finished = True
+        self._done = self._done if done is None else done
+        self._total = self._done
+        self.stage(stage)
+
+    def state(self) -> ProgressState:
+        total = self._total
+        if total > 0 and self._done >= total and not self._finished:
+            # Header count was low: keep one second of slack until the end is reached
+            total = self._done + max(int(self.fps), 1)
+        remaining = total - self._done if total > 0 else None
+        eta = remaining / self.fps if remaining is not None and self.fps > 0 else None
+        return ProgressState(self.stage_name, self._done, total, self.fps, eta)
+
+    def _emit(self) -> None:
+        self.on_update(self.state())
@@ -0,0 +1,350 @@
+"""
+Skeleton overlay render engine.
+
+Decodes a video, runs pose estimation, draws the skeleton and motion labels
+and encodes the result. Nothing here depends on Streamlit, so batch jobs can
+call `render_overlay_video` directly; the UI passes a progress callback.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import cv2
+import numpy as np
+
+from frame_buffers import AllocationCounter, FrameRing
+from label_atlas import LabelAtlas
+from landmark_store import LandmarkWriter
+from motion_layers import MotionLayers
+from multi_person import MultiPersonPose, person_color
+from overlay import draw_improved_skeleton, draw_person_tag, draw_pose_landmarks
+from person_detector import PersonTracker
+from pose_backends import NUM_LANDMARKS, create_backend
+from video_encoder import EncoderSettings, Rendition, RenditionWriter, open_video_writer
+
+
+@dataclass
+class OverlayStyle:
+    line_color_bgr: tuple = (0, 0, 255)
+    dot_color_bgr: tuple = (255, 255, 255)
+    line_thickness: int = 2
+    dot_radius: int = 1
+    motion_color_bgr: tuple = (255, 255, 255)
+    motion_font_scale: float = 0.35
+    motion_font_thickness: int = 1
+    motion_position: str = "Bottom Right"
+    custom_x: int = 80
+    custom_y: int = 80
+    # Fading wrist/ankle trails and a cumulative gesture heatmap (see `motion_layers`)
+    trails: bool = False
+    heatmap: bool = False
+
+
+@dataclass
+class RenderPlan:
+    """How to trade quality for speed. Scales are relative to the source resolution."""
+
+    backend_name: str
+    inference_stride: int = 1
+    inference_scale: float = 1.0
+    output_scale: float = 1.0
+    # More than 1 tracks several people, each posed on their own crop (see `multi_person`)
+    max_people: int = 1
+
+
+class VideoInfo(NamedTuple):
+    fps: float
+    width: int
+    height: int
+    frame_count: int
+    duration: float
+
+
+class RenderResult(NamedTuple):
+    output_path: str
+    codec: str
+    frames: int
+    elapsed: float
+    output_size: tuple[int, int]
+    # Frame buffers OpenCV had to allocate instead of reusing, per frame (0 is ideal)
+    allocations_per_frame: float
+    # Bytes allocated per frame, when RENDER_TRACE_ALLOCATIONS=1
+    bytes_per_frame: float | None
+    # (frames, 33, 4) landmarks as drawn on each frame, NaN where no pose was found
+    landmarks: np.ndarray
+    # Person ID -> (frames, 33, 4) track when several people are tracked; `landmarks`
+    # is then whoever has the lowest ID in each frame
+    people: dict[int, np.ndarray]
+    # The ID the next new person would get (pass it on with `people_seed`)
+    next_person_id: int = 0
+    # The fallback box (center_x, center_y, width, height) at the end, if the person
+    # was ever tracked (pass it on with `tracker_seed`)
+    tracker_box: tuple[int, int, int, int] | None = None
+
+
+def probe_video(cap: cv2.VideoCapture) -> VideoInfo:
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return VideoInfo(fps, width, height, frame_count, frame_count / fps)
+
+
+def scaled_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    """Scale a frame size, keeping dimensions even (most encoders require it)."""
+    if scale >= 1.0:
+        return width, height
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def build_motion_lookup(motion_df, motion_cols: list[str], names: dict[str, str] | None = None) -> dict[int, str]:
+    """
+    Map each annotated second to its overlay text (first row wins for
+    duplicates). `names` translates column names, e.g. `MOTION_LABELS_TH`.
+    """
+    rows = motion_df.drop_duplicates('time_sec')
+    active = rows[motion_cols] == 1
+    lookup = {}
+    for sec, flags in zip(rows['time_sec'], active.to_numpy()):
+        motions = [col for col, on in zip(motion_cols, flags) if on]
+        if motions:
+            lookup[int(sec)] = " + ".join((names or {}).get(col, col) for col in motions)
+    return lookup
+
+
+def grow_track(track: np.ndarray, frame_idx: int) -> np.ndarray:
+    """`track` with room for `frame_idx` (at least doubled, NaN-filled) if it is too short."""
+    if frame_idx < len(track):
+        return track
+    extra = np.full((max(frame_idx + 1 - len(track), len(track)), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    return np.concatenate([track, extra])
+
+
+def highlight_ranges(labeled_seconds, fps: float, frame_count: int, padding: float = 1.0) -> list[tuple[int, int]]:
+    """
+    `[start, end)` frame ranges covering each labeled second plus `padding`
+    seconds on both sides; overlapping or touching windows are merged. With
+    an unknown `frame_count` (0) the last range may reach past the end; the
+    render stops there.
+    """
+    ranges: list[tuple[int, int]] = []
+    for sec in sorted(labeled_seconds):
+        start = max(0, int((sec - padding) * fps))
+        end = int(np.ceil((sec + 1 + padding) * fps))
+        if frame_count > 0:
+            end = min(frame_count, end)
+        if start >= end:
+            continue
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def render_overlay_video(
+    video_path: str | Path,
+    output_path: str | Path | None,
+    motion_lookup: dict[int, str],
+    style: OverlayStyle,
+    plan: RenderPlan,
+    progress: Callable[[int, int], None] | None = None,
+    encoder: EncoderSettings | None = None,
+    landmark_writer: LandmarkWriter | None = None,
+    frame_ranges: list[tuple[int, int | None]] | None = None,
+    renditions: list[tuple[Rendition, str | Path]] | None = None,
+    layer_history: np.ndarray | None = None,
+    people_seed: dict[int, np.ndarray] | None = None,
+    next_person_id: int = 0,
+    tracker_seed: tuple[int, int, int, int] | None = None,
+) -> RenderResult:
+    """
+    Render the overlay video. `landmark_writer`, if given, must already be
+    open; it receives every frame's landmarks (None when no pose was found)
+    and is flushed in batches as the render goes.
+
+    `frame_ranges` restricts the render to sorted `[start, end)` source frame
+    ranges: the decoder seeks to each start and the frames in between are
+    never decoded. The output is the ranges played back to back. A range
+    ending at None runs to the end of the video.
+
+    `renditions` are `(rendition, path)` pairs encoded from the same overlay
+    frames as the main output, each by its own encoder.
+
+    `layer_history` is the landmark track that precedes the first frame in
+    the output (e.g. the previous segments of a job), used to warm up the
+    trail and heatmap layers so they carry on seamlessly.
+
+    With `plan.max_people > 1` every tracked person is drawn in their own
+    color with an ID tag. `people_seed` maps person IDs to their last
+    landmarks before the first frame and `next_person_id` is the first ID a
+    newcomer may get (the previous segment's `RenderResult.next_person_id`),
+    so a job's segments keep the same IDs.
+
+    `tracker_seed` is the fallback box the previous segment ended on (its
+    `RenderResult.tracker_box`); each range's person tracker starts from it,
+    or from the box the range before it ended on.
+
+    With `output_path=None` only the landmarks are computed: nothing is drawn
+    or encoded (the browser draws the skeleton over the original video).
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError("Failed to open video file")
+
+    info = probe_video(cap)
+    draw = output_path is not None
+    out_size = scaled_size(info.width, info.height, plan.output_scale if draw else 1.0)
+    inference_size = scaled_size(info.width, info.height, plan.inference_scale)
+    # Inference never needs more pixels than the (possibly downscaled) output frame has
+    resize_for_inference = inference_size[0] < out_size[0]
+    out, codec = open_video_writer(output_path, info.fps, out_size, encoder) if draw else (None, "none")
+    rendition_writers = [RenditionWriter(rendition, path, info.fps, out_size, encoder)
+                         for rendition, path in (renditions or [])] if draw else []
+    # Labels are rendered once here; the loop only blends the cached patches
+    labels = LabelAtlas(motion_lookup.values(), out_size, style) if draw else None
+    layers = None
+    if draw and (style.trails or style.heatmap):
+        layers = MotionLayers(out_size, info.fps, style.trails, style.heatmap, style.line_thickness)
+        if layer_history is not None:
+            layers.prime(layer_history)
+
+    # Preallocated buffers: decode, resize and inference input are written in place
+    decode_ring = FrameRing((info.height, info.width, 3))
+    output_ring = FrameRing((out_size[1], out_size[0], 3)) if out_size != (info.width, info.height) else None
+    inference_buffer = np.empty((inference_size[1], inference_size[0], 3), dtype=np.uint8) if resize_for_inference else None
+
+    # Per-frame landmark track for the analysis stages; grown if the frame count was wrong
+    track = np.full((max(info.frame_count, 1), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    multi_person = plan.max_people > 1
+    people_tracks: dict[int, np.ndarray] = {}
+
+    # The whole video is one open-ended range
+    ranges = frame_ranges if frame_ranges is not None else [(0, None)]
+    # Open-ended ranges are counted to the probed frame count (0 when unknown)
+    total_frames = sum((end if end is not None else max(info.frame_count, begin)) - begin for begin, end in ranges)
+
+    start = time.perf_counter()
+    processed = 0
+    position = 0
+    landmarks = None
+    people = {}
+    person_box = None
+    tracker_box = tracker_seed
+    if multi_person:
+        pose = MultiPersonPose(plan.backend_name, plan.max_people)
+        pose.seed(people_seed or {}, next_person_id)
+    else:
+        pose = create_backend(plan.backend_name)
+    try:
+        with pose, AllocationCounter() as allocations:
+            for range_start, range_end in ranges:
+                if range_start != position:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, range_start)
+                frame_idx = range_start
+                # A new range starts with fresh inference and background model; the
+                # fallback box carries on from where the last one ended
+                since_inference = 0
+                tracker = PersonTracker()
+                if tracker_box is not None:
+                    tracker.seed(tracker_box)
+                if multi_person:
+                    pose.redetect()
+                while range_end is None or frame_idx < range_end:
+                    allocations.begin_frame()
+                    buffer = decode_ring.next()
+                    ret, frame = cap.read(image=buffer)
+                    if not ret:
+                        break
+                    allocations.check(frame, buffer)
+
+                    if progress is not None:
+                        progress(processed, total_frames)
+
+                    if output_ring is not None:
+                        buffer = output_ring.next()
+                        frame = allocations.check(
+                            cv2.resize(frame, out_size, dst=buffer, interpolation=cv2.INTER_AREA), buffer)
+
+                    # Skipped frames reuse the last pose (or fallback box)
+                    if since_inference % plan.inference_stride == 0:
+                        if resize_for_inference:
+                            pose_input = allocations.check(
+                                cv2.resize(frame, inference_size, dst=inference_buffer, interpolation=cv2.INTER_AREA),
+                                inference_buffer)
+                        else:
+                            pose_input = frame
+                        if multi_person:
+                            people = pose.process(pose_input)
+                            landmarks = people[min(people)] if people else None
+                        else:
+                            landmarks = pose.process(pose_input)
+                        person_box = tracker.update(frame) if landmarks is None and draw else None
+                    since_inference += 1
+
+                    if landmarks is not None:
+                        track = grow_track(track, frame_idx)
+                        track[frame_idx] = landmarks
+                    for person_id, person_landmarks in people.items():
+                        if person_id not in people_tracks:
+                            people_tracks[person_id] = np.full_like(track, np.nan)
+                        people_tracks[person_id] = grow_track(people_tracks[person_id], frame_idx)
+                        people_tracks[person_id][frame_idx] = person_landmarks
+
+                    if landmark_writer is not None:
+                        landmark_writer.append(frame_idx, landmarks)
+
+                    if draw:
+                        if layers is not None:
+                            # Under the skeleton; decayed every frame, so skipped inferences keep fading
+                            layers.update(landmarks)
+                            layers.draw(frame)
+                        if people:
+                            for person_id, person_landmarks in people.items():
+                                color = person_color(person_id, style.line_color_bgr)
+                                draw_pose_landmarks(frame, person_landmarks, color, style.dot_color_bgr,
+                                                    style.line_thickness, style.dot_radius)
+                                draw_person_tag(frame, person_landmarks, f"P{person_id + 1}", color)
+                        elif landmarks is not None:
+                            draw_pose_landmarks(frame, landmarks, style.line_color_bgr, style.dot_color_bgr,
+                                                style.line_thickness, style.dot_radius)
+                        else:
+                            # Fallback: draw improved skeleton if no pose detected
+                            center_x, center_y, person_w, person_h = person_box
+                            draw_improved_skeleton(frame, center_x, center_y, person_w, person_h,
+                                                   style.line_color_bgr, style.dot_color_bgr,
+                                                   style.line_thickness, style.dot_radius)
+
+                        text = motion_lookup.get(int(frame_idx / info.fps))
+                        if text:
+                            labels.draw(frame, text)
+
+                        out.write(frame)
+                        for writer in rendition_writers:
+                            writer.write(frame)
+
+                    frame_idx += 1
+                    processed += 1
+                    allocations.end_frame()
+                position = frame_idx
+                tracker_box = tracker.box
+    finally:
+        cap.release()
+        if out is not None:
+            out.release()
+        for writer in rendition_writers:
+            writer.release()
+
+    # The track follows the source timeline; frames outside the ranges stay NaN
+    track_frames = max(position, info.frame_count) if frame_ranges is not None else position
+    # Tracks only grow on a pose, so one may end before the timeline does
+    return RenderResult(str(output_path) if draw else "", codec, processed, time.perf_counter() - start, out_size,
+                        allocations.misses_per_frame, allocations.bytes_per_frame,
+                        grow_track(track, track_frames - 1)[:track_frames],
+                        {person_id: grow_track(person_track, track_frames - 1)[:track_frames]
+                         for person_id, person_track in people_tracks.items()},
+                        pose.next_id if multi_person else 0, tracker_box)
@@ -0,0 +1,158 @@
+"""
+Deadline-aware quality/speed planner.
+
+Given the probed video and measured per-stage costs, `plan_render` picks the
+inference stride, inference resolution, pose backend (MediaPipe model
+complexity) and output resolution with the best expected quality that still
+finishes before the deadline. A video of unknown length (a frame count of 0)
+cannot be planned against a deadline; it gets the fastest plan, with no
+predicted time.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import os
+import tempfile
+import time
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from pose_backends import create_backend
+from render_engine import RenderPlan, VideoInfo, scaled_size
+from video_encoder import EncoderSettings, open_video_writer
+
+# Option -> relative quality. The plan's quality is the product of these and the
+# backend's nominal accuracy.
+STRIDE_OPTIONS = {1: 1.0, 2: 0.95, 3: 0.9, 4: 0.85, 6: 0.75}
+INFERENCE_SCALE_OPTIONS = {1.0: 1.0, 0.75: 0.97, 0.5: 0.9, 0.35: 0.8}
+OUTPUT_SCALE_OPTIONS = {1.0: 1.0, 0.75: 0.9, 0.5: 0.75}
+
+# Drawing, resizing and Python overhead are not measured separately
+SAFETY_MARGIN = 1.15
+
+
+class StageCosts(NamedTuple):
+    decode: float  # seconds per source frame
+    encode: float  # seconds per full-resolution output frame
+    # backend -> (fixed, per-pixel) seconds per inference, where the per-pixel
+    # term is for a full-resolution frame: cost(scale) = fixed + per_pixel * scale**2
+    inference: dict[str, tuple[float, float]]
+
+
+class PlanEstimate(NamedTuple):
+    plan: RenderPlan
+    # NaN when the video's length is unknown
+    predicted_seconds: float
+    quality: float
+    feasible: bool
+
+
+_COST_CACHE: dict[tuple, StageCosts] = {}
+
+
+def measure_stage_costs(cap: cv2.VideoCapture, backend_names: list[str], sample_count: int = 6,
+                        encoder: EncoderSettings | None = None) -> StageCosts:
+    """Time decode, encode and per-backend inference on the first frames, then rewind."""
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    encoder = encoder or EncoderSettings()
+    key = (tuple(backend_names), width, height, encoder.use_ffmpeg, encoder.preset, encoder.crf)
+    if key in _COST_CACHE:
+        return _COST_CACHE[key]
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    frames = []
+    start = time.perf_counter()
+    for _ in range(sample_count):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    decode = (time.perf_counter() - start) / max(len(frames), 1)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    if not frames:
+        raise ValueError("Could not decode any frames to measure")
+
+    fd, probe_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        out, _ = open_video_writer(probe_path, 30.0, (width, height), encoder)
+        start = time.perf_counter()
+        for frame in frames:
+            out.write(frame)
+        out.release()
+        encode = (time.perf_counter() - start) / len(frames)
+    finally:
+        os.remove(probe_path)
+
+    half_size = scaled_size(width, height, 0.5)
+    half_frames = [cv2.resize(f, half_size, interpolation=cv2.INTER_AREA) for f in frames]
+    inference = {}
+    for name in backend_names:
+        with create_backend(name) as backend:
+            backend.process(frames[0])  # warm-up
+            full = _time_per_frame(backend, frames)
+            half = _time_per_frame(backend, half_frames)
+        # Two-point fit of fixed + per_pixel * scale**2
+        per_pixel = max((full - half) / 0.75, 0.0)
+        inference[name] = (max(full - per_pixel, 0.0), per_pixel)
+
+    costs = StageCosts(decode, encode, inference)
+    _COST_CACHE[key] = costs
+    return costs
+
+
+def _time_per_frame(backend, frames: list[np.ndarray]) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        backend.process(frame)
+    return (time.perf_counter() - start) / len(frames)
+
+
+def predict_seconds(info: VideoInfo, costs: StageCosts, plan: RenderPlan) -> float:
+    frames = info.frame_count
+    inference_scale = min(plan.inference_scale, plan.output_scale)
+    fixed, per_pixel = costs.inference[plan.backend_name]
+    per_frame = costs.decode + costs.encode * plan.output_scale ** 2
+    inferences = math.ceil(frames / plan.inference_stride)
+    return SAFETY_MARGIN * (frames * per_frame + inferences * (fixed + per_pixel * inference_scale ** 2))
+
+
+def plan_render(info: VideoInfo, costs: StageCosts, deadline_seconds: float,
+                backend_names: list[str]) -> PlanEstimate:
+    """
+    Best-quality plan that meets the deadline, or the fastest plan if none
+    does or the frame count is unknown.
+    """
+    known_length = info.frame_count > 0
+    if not known_length:
+        # Rank the plans by their cost over a nominal minute of video
+        info = info._replace(frame_count=max(round(info.fps * 60), 60))
+    # The heuristic fallback is only planned for when nothing else is available
+    names = [n for n in backend_names if n != "heuristic"] or list(backend_names)
+    candidates = []
+    for name, stride, inference_scale, output_scale in itertools.product(
+        names, STRIDE_OPTIONS, INFERENCE_SCALE_OPTIONS, OUTPUT_SCALE_OPTIONS
+    ):
+        if inference_scale > output_scale:
+            continue  # same cost as inferring at output_scale, no better
+        plan = RenderPlan(name, stride, inference_scale, output_scale)
+        quality = (
+            create_backend(name).accuracy
+            * STRIDE_OPTIONS[stride]
+            * INFERENCE_SCALE_OPTIONS[inference_scale]
+            * OUTPUT_SCALE_OPTIONS[output_scale]
+        )
+        predicted = predict_seconds(info, costs, plan)
+        candidates.append(PlanEstimate(plan, predicted, quality, predicted <= deadline_seconds))
+
+    feasible = [c for c in candidates if c.feasible]
+    if not known_length:
+        return min(candidates, key=lambda c: c.predicted_seconds)._replace(predicted_seconds=math.nan, feasible=False)
+    if feasible:
+        return max(feasible, key=lambda c: (c.quality, -c.predicted_seconds))
+    return min(candidates, key=lambda c: c.predicted_seconds)
@@ -0,0 +1,181 @@
+"""
+Streamlit component that draws the skeleton and motion labels in the browser.
+
+The original video plays in a <video> element with a <canvas> on top. The
+video is served by URL from Streamlit's media file server (as `st.video`
+does), so the browser fetches and caches it once instead of receiving it
+inside the component's HTML on every rerun. The landmark stream from `landmark_stream.encode_track` is inflated and
+prefix-summed once in JavaScript, then each displayed frame is drawn from it.
+Style controls live in the component, so changing a color or thickness
+redraws immediately without a Streamlit rerun or any server work.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import streamlit.components.v1 as components
+from streamlit import runtime
+
+from render_engine import OverlayStyle
+
+POSITIONS = ["Bottom Right", "Bottom Left", "Top Right", "Top Left", "Center", "Custom"]
+
+# Hershey simplex glyphs are about 22 px tall at font scale 1.0
+HERSHEY_PX_PER_SCALE = 22
+
+_TEMPLATE = """
+<div id="player" style="position:relative;width:100%;font-family:sans-serif">
+  <video id="video" controls playsinline style="width:100%;display:block"></video>
+  <canvas id="overlay" style="position:absolute;left:0;top:0;pointer-events:none"></canvas>
+</div>
+<div style="display:flex;flex-wrap:wrap;gap:12px;margin-top:8px;font:13px sans-serif;align-items:center">
+  <label>Lines <input id="line" type="color"></label>
+  <label>Dots <input id="dot" type="color"></label>
+  <label>Text <input id="textColor" type="color"></label>
+  <label>Thickness <input id="thickness" type="range" min="1" max="10"></label>
+  <label>Dot radius <input id="radius" type="range" min="1" max="10"></label>
+  <label>Text size <input id="fontScale" type="range" min="0.1" max="2" step="0.05"></label>
+  <label>Position <select id="position"></select></label>
+</div>
+<script>
+const stream = __STREAM__;
+const videoUrl = "__VIDEO_URL__";
+const style = __STYLE__;
+const positions = __POSITIONS__;
+const video = document.getElementById("video");
+const canvas = document.getElementById("overlay");
+const ctx = canvas.getContext("2d");
+const stride = stream.joints * stream.channels;
+let values = null, present = null;
+
+async function inflate(b64) {
+  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+  const body = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Uint8Array(await new Response(body).arrayBuffer());
+}
+
+async function load() {
+  const raw = await inflate(stream.data);
+  values = new Int16Array(raw.buffer, 0, stream.frames * stride);
+  // Undo the delta coding in place (Int16Array wraps like the encoder did)
+  for (let i = stride; i < values.length; i++) values[i] += values[i - stride];
+  present = Uint8Array.from(atob(stream.present), c => c.charCodeAt(0));
+  draw();
+}
+
+function hasPose(f) { return (present[f >> 3] >> (f & 7)) & 1; }
+
+function resize() {
+  const w = video.clientWidth, h = video.clientHeight;
+  if (canvas.width !== w || canvas.height !== h) { canvas.width = w; canvas.height = h; }
+}
+
+function draw() {
+  resize();
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  if (!values) return;
+  const f = Math.min(Math.floor(video.currentTime * stream.fps), stream.frames - 1);
+  const px = canvas.width / (video.videoWidth || canvas.width);
+  if (f >= 0 && hasPose(f)) {
+    const base = f * stride, s = stream.scale, W = canvas.width, H = canvas.height;
+    const x = j => values[base + j * 3] / s * W, y = j => values[base + j * 3 + 1] / s * H;
+    const visible = j => values[base + j * 3 + 2] / s > 0;
+    ctx.strokeStyle = style.line; ctx.lineWidth = style.thickness * px; ctx.lineCap = "round";
+    ctx.beginPath();
+    for (const [a, b] of stream.connections) {
+      if (visible(a) && visible(b)) { ctx.moveTo(x(a), y(a)); ctx.lineTo(x(b), y(b)); }
+    }
+    ctx.stroke();
+    ctx.fillStyle = style.dot;
+    for (let j = 0; j < stream.joints; j++) {
+      if (!visible(j)) continue;
+      ctx.beginPath(); ctx.arc(x(j), y(j), Math.max(style.radius * px, 1), 0, 2 * Math.PI); ctx.fill();
+    }
+  }
+  const text = stream.labels[Math.floor(video.currentTime)];
+  if (text) drawText(text, px);
+}
+
+function drawText(text, px) {
+  const size = style.fontScale * __PX_PER_SCALE__ * px, margin = 20 * px;
+  ctx.font = `${Math.max(size, 6)}px sans-serif`;
+  const w = ctx.measureText(text).width, W = canvas.width, H = canvas.height;
+  let tx, ty;
+  switch (style.position) {
+    case "Bottom Right": tx = W - w - margin; ty = H - margin; break;
+    case "Bottom Left": tx = margin; ty = H - margin; break;
+    case "Top Right": tx = W - w - margin; ty = margin + size; break;
+    case "Top Left": tx = margin; ty = margin + size; break;
+    case "Center": tx = (W - w) / 2; ty = (H + size) / 2; break;
+    default: tx = style.customX / 100 * W; ty = style.customY / 100 * H;
+  }
+  ctx.lineWidth = Math.max(size / 6, 2); ctx.strokeStyle = "#000"; ctx.strokeText(text, tx, ty);
+  ctx.fillStyle = style.text; ctx.fillText(text, tx, ty);
+}
+
+function bind(id, key, parse) {
+  const el = document.getElementById(id);
+  el.value = style[key];
+  el.addEventListener("input", () => { style[key] = parse ? parse(el.value) : el.value; draw(); });
+}
+const positionSelect = document.getElementById("position");
+for (const p of positions) positionSelect.add(new Option(p, p));
+bind("line", "line"); bind("dot", "dot"); bind("textColor", "text");
+bind("thickness", "thickness", Number); bind("radius", "radius", Number);
+bind("fontScale", "fontScale", Number); bind("position", "position");
+
+// Redraw once per presented video frame where supported, otherwise per animation frame
+if ("requestVideoFrameCallback" in HTMLVideoElement.prototype) {
+  const onFrame = () => { draw(); video.requestVideoFrameCallback(onFrame); };
+  video.requestVideoFrameCallback(onFrame);
+} else {
+  const loop = () => { draw(); requestAnimationFrame(loop); };
+  requestAnimationFrame(loop);
+}
+video.addEventListener("seeked", draw);
+video.addEventListener("loadedmetadata", draw);
+new ResizeObserver(draw).observe(video);
+video.src = videoUrl;
+load();
+</script>
+"""
+
+
+def _hex(color_bgr: tuple) -> str:
+    b, g, r = color_bgr
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def media_url(video_path: str | Path, mime_type: str, coordinates: str) -> str:
+    """
+    Register a file with Streamlit's media file server and return its URL
+    relative to the page, so it also resolves under a `baseUrlPath`. The file
+    stays served while the element at `coordinates` is on the page.
+    """
+    url = runtime.get_instance().media_file_mgr.add(str(video_path), mime_type, coordinates)
+    return url.lstrip("/")
+
+
+def skeleton_player(video_path: str | Path, stream: dict, style: OverlayStyle,
+                    mime_type: str = "video/mp4", height: int = 520) -> None:
+    """Show the original video with the skeleton from `stream` drawn on top."""
+    client_style = {
+        "line": _hex(style.line_color_bgr),
+        "dot": _hex(style.dot_color_bgr),
+        "text": _hex(style.motion_color_bgr),
+        "thickness": style.line_thickness,
+        "radius": style.dot_radius,
+        "fontScale": style.motion_font_scale,
+        "position": style.motion_position,
+        "customX": style.custom_x,
+        "customY": style.custom_y,
+    }
+    html = (_TEMPLATE
+            .replace("__STREAM__", json.dumps(stream))
+            .replace("__STYLE__", json.dumps(client_style))
+            .replace("__POSITIONS__", json.dumps(POSITIONS))
+            .replace("__PX_PER_SCALE__", str(HERSHEY_PX_PER_SCALE))
+            .replace("__VIDEO_URL__", media_url(video_path, mime_type, "skeleton_player")))
+    components.html(html, height=height)
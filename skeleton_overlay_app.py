@@ -4,6 +4,8 @@ import mediapipe as mp
 import tempfile
 import numpy as np
 
+from progress_reporter import ProgressReporter, expected_frames
+
 st.title("🦴 Skeleton Overlay App (Lumi Edition) 💚")
 st.write("อัปโหลดวิดีโอ → สร้าง Skeleton Overlay (ไม่มี Motion Detection)")
 
@@ -33,10 +35,19 @@ if uploaded_file is not None:
         mp_drawing = mp.solutions.drawing_utils
         pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
+        progress_bar = st.progress(0.0, text="Starting...")
+        report_progress = ProgressReporter(
+            lambda state: progress_bar.progress(state.fraction, text=state.describe()),
+            expected_frames(video_path, fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+        )
+        frame_idx = 0
+
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
                 break
+            report_progress(frame_idx)
+            frame_idx += 1
 
             frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             results = pose.process(frame_rgb)
@@ -56,6 +67,8 @@ if uploaded_file is not None:
         cap.release()
         out.release()
         pose.close()
+        report_progress.finish(done=frame_idx)
+        progress_bar.empty()
 
         st.success("✅ Skeleton Overlay เสร็จแล้ว!")
         st.video(output_video)
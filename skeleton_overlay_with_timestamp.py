@@ -5,6 +5,8 @@ import tempfile
 import numpy as np
 import os # Added for file existence check
 
+from progress_reporter import ProgressReporter, expected_frames
+
 # Try to import mediapipe, with fallback for deployment
 try:
     import mediapipe as mp
@@ -324,11 +326,13 @@ if uploaded_video and uploaded_csv:
             margin_x = 20
             margin_y = 20
             frame_idx = 0
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Progress bar
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+
+            # Progress bar: a few updates per second, against a cross-checked frame count
+            progress_bar = st.progress(0.0, text="Starting...")
+            report_progress = ProgressReporter(
+                lambda state: progress_bar.progress(state.fraction, text=state.describe()),
+                expected_frames(video_path, fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+            )
 
             # Initialize MediaPipe Pose if available
             if MEDIAPIPE_AVAILABLE:
@@ -341,10 +345,7 @@ if uploaded_video and uploaded_csv:
                         if not ret:
                             break
 
-                        # Update progress
-                        progress = frame_idx / total_frames
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing frame {frame_idx}/{total_frames}")
+                        report_progress(frame_idx)
 
                         # Convert BGR to RGB for MediaPipe
                         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -421,10 +422,7 @@ if uploaded_video and uploaded_csv:
                     if not ret:
                         break
 
-                    # Update progress
-                    progress = frame_idx / total_frames
-                    progress_bar.progress(progress)
-                    status_text.text(f"Processing frame {frame_idx}/{total_frames}")
+                    report_progress(frame_idx)
 
                     # Improved skeleton drawing (fallback)
                     center_x, center_y, person_w, person_h = detect_person_center(frame)
@@ -468,10 +466,10 @@ if uploaded_video and uploaded_csv:
 
             cap.release()
             out.release()
+            report_progress.finish(done=frame_idx)
             
             # Clear progress indicators
             progress_bar.empty()
-            status_text.empty()
 
             # Check if video was created successfully
             if os.path.exists(output_video) and os.path.getsize(output_video) > 0:
@@ -3,107 +3,64 @@ import cv2
 import pandas as pd
 import tempfile
 import numpy as np
+import hashlib
+import math
 import os  # Added for file existence check
+import re
+import time
+import uuid
+from dataclasses import replace
+
+from pose_backends import (
+    DEFAULT_ACCURACY_FLOOR,
+    MEDIAPIPE_AVAILABLE,
+    available_backends,
+    create_backend,
+    sample_frames,
+    select_backend,
+)
+from analysis_catalog import METRICS, AnalysisCatalog
+from job_store import JobStore, checkpoint_segments, job_params, run_job
+from laban_analysis import MOTION_LABELS, MOTION_LABELS_TH, detect_motion_labels, format_timestamp
+from landmark_stream import encode_track, stream_size
+from live_stream import DEFAULT_LATENCY_BUDGET, FrameGrabber, live_overlay, parse_source
+from memory_budget import MEMORY_BUDGET_MB, MemoryBudgetError, fit_to_budget
+from multi_person import MAX_PEOPLE
+from motion_report import cached_report, report_digest, timestamp_seconds
+from movement_search import WINDOW_SECONDS, WINDOW_STEP_SECONDS, MovementIndex, embed_window
+from pdf_report import cached_pdf_reports
+from progress_reporter import ProgressReporter, expected_frames
+from render_engine import (
+    OverlayStyle,
+    RenderPlan,
+    build_motion_lookup,
+    highlight_ranges,
+    probe_video,
+)
+from render_planner import plan_render, measure_stage_costs
+from skeleton_component import skeleton_player
+from video_index import FrameSeeker, cached_index, cheap_keyframes, thumbnail_strip
+from video_encoder import (
+    DEFAULT_CRF,
+    DEFAULT_PRESET,
+    H264_PRESETS,
+    DEFAULT_RENDITIONS,
+    EncoderSettings,
+    ffmpeg_has_encoder,
+    preview_concat,
+    rendition_supported,
+)
 
-# Try to import mediapipe, with fallback for deployment
-try:
-    import mediapipe as mp
-    mp_drawing = mp.solutions.drawing_utils
-    mp_pose = mp.solutions.pose
-    MEDIAPIPE_AVAILABLE = True
-except ImportError:
-    MEDIAPIPE_AVAILABLE = False
+if not MEDIAPIPE_AVAILABLE:
     st.warning("⚠️ MediaPipe not available - using improved skeleton overlay")
 
-def detect_person_center(frame):
-    """Detect the center of the person in the frame using motion detection"""
-    # Convert to grayscale
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    # Apply Gaussian blur
-    blurred = cv2.GaussianBlur(gray, (21, 21), 0)
-    
-    # Use adaptive threshold to find moving objects
-    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    
-    # Find contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    if contours:
-        # Find the largest contour (likely the person)
-        largest_contour = max(contours, key=cv2.contourArea)
-        
-        # Get bounding rectangle
-        x, y, w, h = cv2.boundingRect(largest_contour)
-        
-        # Calculate center
-        center_x = x + w // 2
-        center_y = y + h // 2
-        
-        return center_x, center_y, w, h
-    
-    # Fallback to frame center
-    h, w = frame.shape[:2]
-    return w // 2, h // 2, w // 4, h // 2
-
-def draw_improved_skeleton(frame, center_x, center_y, width, height, line_color_bgr, dot_color_bgr, line_thickness, dot_radius):
-    """Draw an improved skeleton that adapts to the person's position and size"""
-    
-    # Calculate skeleton dimensions based on person size
-    skeleton_height = int(height * 0.8)
-    skeleton_width = int(width * 0.6)
-    
-    # Head (smaller and positioned better)
-    head_radius = max(5, int(skeleton_height * 0.08))
-    head_y = center_y - skeleton_height // 2 + head_radius
-    cv2.circle(frame, (center_x, head_y), head_radius, dot_color_bgr, -1)
-    
-    # Neck
-    neck_y = head_y + head_radius + 5
-    cv2.line(frame, (center_x, head_y + head_radius), (center_x, neck_y), line_color_bgr, line_thickness)
-    
-    # Shoulders
-    shoulder_y = neck_y + 10
-    shoulder_width = skeleton_width // 2
-    cv2.line(frame, (center_x - shoulder_width, shoulder_y), (center_x + shoulder_width, shoulder_y), line_color_bgr, line_thickness)
-    
-    # Arms
-    arm_length = skeleton_height // 3
-    # Left arm
-    cv2.line(frame, (center_x - shoulder_width, shoulder_y), (center_x - shoulder_width - 10, shoulder_y + arm_length), line_color_bgr, line_thickness)
-    # Right arm
-    cv2.line(frame, (center_x + shoulder_width, shoulder_y), (center_x + shoulder_width + 10, shoulder_y + arm_length), line_color_bgr, line_thickness)
-    
-    # Torso
-    torso_y = shoulder_y + 20
-    cv2.line(frame, (center_x, shoulder_y), (center_x, torso_y), line_color_bgr, line_thickness)
-    
-    # Hips
-    hip_y = torso_y + 15
-    hip_width = skeleton_width // 2
-    cv2.line(frame, (center_x - hip_width, hip_y), (center_x + hip_width, hip_y), line_color_bgr, line_thickness)
-    
-    # Legs
-    leg_length = skeleton_height // 2
-    # Left leg
-    cv2.line(frame, (center_x - hip_width, hip_y), (center_x - hip_width - 5, hip_y + leg_length), line_color_bgr, line_thickness)
-    # Right leg
-    cv2.line(frame, (center_x + hip_width, hip_y), (center_x + hip_width + 5, hip_y + leg_length), line_color_bgr, line_thickness)
-    
-    # Add some joints as dots
-    joint_radius = max(2, dot_radius // 2)
-    cv2.circle(frame, (center_x - shoulder_width, shoulder_y), joint_radius, dot_color_bgr, -1)  # Left shoulder
-    cv2.circle(frame, (center_x + shoulder_width, shoulder_y), joint_radius, dot_color_bgr, -1)  # Right shoulder
-    cv2.circle(frame, (center_x - hip_width, hip_y), joint_radius, dot_color_bgr, -1)  # Left hip
-    cv2.circle(frame, (center_x + hip_width, hip_y), joint_radius, dot_color_bgr, -1)  # Right hip
-
 st.set_page_config(page_title="Lumi Skeleton Overlay", layout="wide")
 
 # Build marker to verify latest deploy is running - FORCE DEPLOY
 st.caption("🚀 NEW BUILD: HH:MM:SS format • IMPROVED SKELETON • Python 3.13 compatible")
 
 st.title("🌸 Skeleton Overlay with Reference Timestamp 💚")
-st.write("Upload video + reference CSV → Overlay skeleton & motion text based on CSV timestamps.")
+st.write("Upload video + reference CSV → Overlay skeleton & motion text based on CSV timestamps. Without a CSV, motion labels are detected from the pose.")
 
 # Sidebar for color customization
 st.sidebar.header("🎨 Skeleton Color Settings")
@@ -154,6 +111,9 @@ else:
 st.sidebar.subheader("Skeleton Style")
 line_thickness = st.sidebar.slider("Line thickness", 1, 10, 2)
 dot_radius = st.sidebar.slider("Dot radius", 1, 10, 1)
+motion_trails = st.sidebar.checkbox("Motion trails (wrists and ankles)", value=False)
+gesture_heatmap = st.sidebar.checkbox("Gesture heatmap", value=False,
+                                      help="Where the hands gestured most; older movement fades out over a few minutes.")
 
 # Display current color preview
 st.sidebar.subheader("Color Preview")
@@ -194,6 +154,7 @@ else:
 st.sidebar.subheader("Movement Text Style")
 motion_font_scale = st.sidebar.slider("Text size", 0.1, 2.0, 0.35, 0.05)
 motion_font_thickness = st.sidebar.slider("Text thickness", 1, 5, 1)
+label_language = st.sidebar.radio("Label language", ["English", "ไทย"], horizontal=True)
 
 # Movement text position
 st.sidebar.subheader("Movement Text Position")
@@ -207,9 +168,222 @@ if motion_position == "Custom":
     st.sidebar.subheader("Custom Position")
     custom_x = st.sidebar.slider("X position (0-100%)", 0, 100, 80)
     custom_y = st.sidebar.slider("Y position (0-100%)", 0, 100, 80)
+else:
+    custom_x, custom_y = 80, 80
+
+# Pose backend selection
+st.sidebar.header("🧍 Pose Backend")
+backend_names = available_backends()
+backend_option = st.sidebar.selectbox(
+    "Pose backend:",
+    ["Auto"] + backend_names,
+    index=0,
+    help="Auto benchmarks the available backends on this machine and picks the fastest one that meets the accuracy floor."
+)
+if backend_option == "Auto":
+    accuracy_floor = st.sidebar.slider("Accuracy floor", 0.0, 1.0, DEFAULT_ACCURACY_FLOOR, 0.05)
+max_people = st.sidebar.number_input(
+    "People to track", min_value=1, max_value=MAX_PEOPLE, value=1,
+    help="For panels and group rehearsals: each person gets a stable ID tag (P1, P2, ...), their own skeleton "
+         "color and their own motion labels. Pose runs on each person's crop, so the cost grows with the number "
+         "of people. The browser overlay shows P1 only."
+)
+
+# Output encoding
+st.sidebar.header("🎞️ Output Encoding")
+if ffmpeg_has_encoder("libx264"):
+    use_ffmpeg = st.sidebar.checkbox("H.264 via ffmpeg (smaller, plays in browsers)", value=True)
+    h264_preset = st.sidebar.selectbox("Encoder preset", H264_PRESETS, index=H264_PRESETS.index(DEFAULT_PRESET),
+                                       disabled=not use_ffmpeg)
+    h264_crf = st.sidebar.slider("Quality (CRF, lower = better)", 18, 35, DEFAULT_CRF, disabled=not use_ffmpeg)
+    progressive = st.sidebar.checkbox("Play while rendering", value=True, disabled=not use_ffmpeg,
+                                      help="Writes a fragmented MP4 so the rendered part can be watched before the render finishes.")
+    encoder_settings = EncoderSettings(use_ffmpeg, h264_preset, h264_crf, fragmented=use_ffmpeg and progressive)
+else:
+    st.sidebar.caption("ffmpeg not found - using OpenCV encoder")
+    encoder_settings = EncoderSettings(use_ffmpeg=False)
+extra_renditions = st.sidebar.checkbox(
+    "Also render a 480p mobile version and an animated preview", value=True,
+    help="Encoded from the same frames in the same pass; phones are offered the mobile version."
+)
+renditions = [r for r in DEFAULT_RENDITIONS if rendition_supported(r)] if extra_renditions else []
+
+# Output mode
+st.sidebar.header("🖥️ Output Mode")
+output_mode = st.sidebar.radio(
+    "Skeleton drawn:",
+    ["In a rendered video", "In the browser (landmarks only)"],
+    help="In the browser, the server only tracks the pose; the skeleton is drawn over the original "
+         "video on your device and style changes apply instantly. Needs a pose backend that finds landmarks."
+)
+browser_overlay = output_mode.startswith("In the browser")
+
+# Render deadline
+st.sidebar.header("⏱️ Render Deadline")
+render_deadline = st.sidebar.number_input(
+    "Finish within (seconds, 0 = no limit)",
+    min_value=0, value=0, step=30,
+    help="Lowers inference stride, inference resolution, model complexity and output resolution as needed to finish in time."
+)
+
+# Memory budget: the server's MEMORY_BUDGET_MB is the ceiling; visitors can only lower it
+st.sidebar.header("🧠 Memory Budget")
+memory_budget_help = ("Estimated from the video resolution and pipeline depth. Encoder queues, then processing and "
+                      "output resolution are lowered to fit; a job that cannot fit is refused before it starts.")
+if MEMORY_BUDGET_MB > 0:
+    memory_budget_mb = st.sidebar.number_input(
+        f"Per-job memory (MB, at most {MEMORY_BUDGET_MB})",
+        min_value=min(256, MEMORY_BUDGET_MB), max_value=MEMORY_BUDGET_MB, value=MEMORY_BUDGET_MB, step=256,
+        help=memory_budget_help
+    )
+    # The widget bounds are only enforced in the browser
+    memory_budget_mb = min(max(memory_budget_mb, 1), MEMORY_BUDGET_MB)
+else:
+    memory_budget_mb = st.sidebar.number_input(
+        "Per-job memory (MB, 0 = no limit)", min_value=0, value=0, step=256, help=memory_budget_help
+    )
+
+input_mode = st.radio("Input", ["Video file", "Live (camera or stream)"], horizontal=True)
+
+if input_mode.startswith("Live"):
+    st.subheader("📡 Live Overlay")
+    live_kind = st.selectbox("Source", ["Webcam", "RTSP/HTTP stream", "Video file replayed in real time"])
+    if live_kind == "Webcam":
+        live_source = parse_source(st.text_input("Camera index (on the server)", "0"))
+    elif live_kind == "RTSP/HTTP stream":
+        live_source = st.text_input("Stream URL", placeholder="rtsp://camera.local/stream")
+    else:
+        replay_video = st.file_uploader("Video to replay", type=["mp4", "mov", "avi"], key="replay_video")
+        live_source = None
+        if replay_video:
+            replay_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(replay_video.name)[1])
+            replay_file.write(replay_video.read())
+            live_source = replay_file.name
+    latency_budget_ms = st.slider("Latency budget (ms)", 50, 1000, int(DEFAULT_LATENCY_BUDGET * 1000), 10,
+                                  help="The inference stride rises while capture-to-display latency is over budget.")
+    # Live favors speed: Auto uses the lightest real model available
+    live_backend = backend_option if backend_option != "Auto" else (
+        "mediapipe-0" if "mediapipe-0" in backend_names else backend_names[0])
+
+    start_col, stop_col = st.columns(2)
+    live_start = start_col.button("▶️ Start", disabled=live_source in (None, ""))
+    stop_col.button("⏹️ Stop")  # any rerun ends the live loop below
+    if live_start:
+        live_style = OverlayStyle(
+            line_color_bgr, dot_color_bgr, line_thickness, dot_radius,
+            motion_color_bgr, motion_font_scale, motion_font_thickness,
+            motion_position, custom_x, custom_y,
+        )
+        stats_text = st.empty()
+        frame_slot = st.empty()
+        try:
+            with FrameGrabber(live_source, realtime=live_kind.startswith("Video file")) as grabber, \
+                    create_backend(live_backend) as pose:
+                for frame, stats in live_overlay(grabber, pose, live_style, latency_budget_ms / 1000):
+                    if frame is None:
+                        # Stalled source: updating the page is also where a Stop click takes effect
+                        stats_text.markdown(f"⏳ Waiting for the stream ({stats.waiting:.0f} s)...")
+                        continue
+                    frame_slot.image(frame, channels="BGR", output_format="JPEG")
+                    stats_text.markdown(
+                        f"**{stats.fps:.1f} fps** • latency {stats.latency_ms:.0f} ms • "
+                        f"inference every {stats.stride} frame(s) • {stats.dropped} frames dropped • "
+                        f"backend {live_backend}"
+                    )
+            st.info("Live source ended.")
+        except ValueError as e:
+            st.error(f"❌ {e}")
+    st.stop()
+
+# Renders cut off by a server restart are finished from their checkpoints, without re-uploading
+job_store = JobStore()
+job_store.prune()
+# Jobs belong to the browser tab that started them. The token lives in the tab's URL, so it
+# survives the reconnect after a server restart, and nobody else sees or resumes the job
+job_owner = st.query_params.get("owner")
+if not job_owner:
+    job_owner = uuid.uuid4().hex
+    st.query_params["owner"] = job_owner
+analysis_catalog = AnalysisCatalog()
+
+
+@st.cache_resource
+def shared_movement_index() -> MovementIndex:
+    """One index for every session, so its rebuild and in-memory state are shared."""
+    return MovementIndex()
+
+
+movement_index = shared_movement_index()
+interrupted_jobs = job_store.interrupted_jobs(job_owner)
+if interrupted_jobs:
+    st.subheader("⏯️ Interrupted renders")
+    resume_job = None
+    for job in interrupted_jobs:
+        finished = len(job_store.completed_segments(job.id))
+        col_name, col_resume, col_discard = st.columns([4, 1, 1])
+        col_name.write(f"**{job.input_name}** • {finished}/{len(job.segments)} segments done • "
+                       f"started {time.strftime('%Y-%m-%d %H:%M', time.localtime(job.created))}")
+        if col_resume.button("Resume", key=f"resume_{job.id}"):
+            if job_store.claim(job.id, job_owner):
+                resume_job = job
+            else:
+                st.warning("Another tab is already finishing this render.")
+        if col_discard.button("Discard", key=f"discard_{job.id}"):
+            job_store.delete(job.id, job_owner)
+            st.rerun()
+    if resume_job is not None:
+        resume_bar = st.progress(0.0, text="Resuming...")
+        try:
+            resumed = run_job(job_store, resume_job, ProgressReporter(
+                lambda state: resume_bar.progress(state.fraction, text=state.describe()), stage="Resuming"))
+            st.session_state["resumed_output"] = {"name": resume_job.input_name, "output_video": resumed.output_path,
+                                                  "renditions": resumed.renditions,
+                                                  "landmarks_file": resumed.landmarks_path}
+            st.info(f"⏱️ Resumed in {resumed.elapsed:.1f}s; {resumed.resumed_frames} of {resumed.frames} frames "
+                    "came from checkpoints")
+        except Exception as e:
+            st.error(f"❌ Error while resuming the render: {str(e)}")
+        resume_bar.empty()
+
+MOBILE_USER_AGENT = re.compile(r"Mobi|Android|iPhone|iPad", re.IGNORECASE)
+
+
+def show_rendered_video(output_video, rendition_files, file_name, key):
+    """Play and offer for download the rendition that suits the client, after the animated preview."""
+    choices = {"Full resolution": output_video}
+    if rendition_files.get("mobile"):
+        choices["Mobile (480p)"] = rendition_files["mobile"]
+    choice = "Full resolution"
+    if len(choices) > 1:
+        on_mobile = bool(MOBILE_USER_AGENT.search(st.context.headers.get("User-Agent", "")))
+        choice = st.radio("Quality", list(choices), index=1 if on_mobile else 0, horizontal=True,
+                          key=f"{key}_quality",
+                          captions=[f"{os.path.getsize(path) / 2**20:.1f} MB" for path in choices.values()])
+    if rendition_files.get("preview"):
+        st.image(rendition_files["preview"], caption="Preview", width=240)
+    with open(choices[choice], "rb") as video_file:
+        video_bytes = video_file.read()
+    st.video(video_bytes)
+    st.download_button("Download Motion Overlay Video", data=video_bytes,
+                       file_name=file_name if choice == "Full resolution" else file_name.replace(".mp4", "_480p.mp4"),
+                       mime="video/mp4", key=key)
+
+
+resumed_output = st.session_state.get("resumed_output")
+if resumed_output:
+    st.success(f"✅ Finished interrupted render of {resumed_output['name']}")
+    if resumed_output["output_video"]:
+        show_rendered_video(resumed_output["output_video"], resumed_output["renditions"], "skeleton_overlay.mp4",
+                            "download_resumed_video")
+    if resumed_output["landmarks_file"]:
+        with open(resumed_output["landmarks_file"], "rb") as landmarks_file:
+            st.download_button("Download Pose Landmarks (Parquet)", data=landmarks_file.read(),
+                               file_name="pose_landmarks.parquet", mime="application/vnd.apache.parquet",
+                               key="download_resumed_landmarks")
 
 uploaded_video = st.file_uploader("Upload a video", type=["mp4","mov","avi"], help="Maximum file size: 200MB")
-uploaded_csv = st.file_uploader("Upload reference CSV", type=["csv"], help="Maximum file size: 10MB")
+uploaded_csv = st.file_uploader("Upload reference CSV (optional)", type=["csv"], help="Maximum file size: 10MB")
+speaker_name = st.text_input("Speaker", help="Who is presenting; the analysis is saved to the history under this name.")
 
 # Add file size validation
 if uploaded_video:
@@ -226,59 +400,63 @@ if uploaded_csv:
     else:
         st.success(f"✅ CSV uploaded: {uploaded_csv.name} ({uploaded_csv.size / 1024:.1f}KB)")
 
-if uploaded_video and uploaded_csv:
-    # Load CSV
-    motion_df = pd.read_csv(uploaded_csv)
-
-    st.write("📊 CSV Columns found:", list(motion_df.columns))
-    st.write("📊 First few rows:")
-    st.dataframe(motion_df.head())
-
-    timestamp_col = None
-    possible_timestamp_names = ['timestamp', 'time', 'Time', 'Timestamp', 'TIME', 'TIMESTAMP', 'time_stamp', 'time_stamp_seconds']
-    for col in motion_df.columns:
-        if col.lower() in [name.lower() for name in possible_timestamp_names]:
-            timestamp_col = col
-            break
-
-    if timestamp_col is None:
-        st.error("❌ CSV must contain a 'timestamp' column. Found columns: " + ", ".join(motion_df.columns))
-        st.stop()
-    else:
-        if timestamp_col != 'timestamp':
-            motion_df = motion_df.rename(columns={timestamp_col: 'timestamp'})
-            st.success(f"✅ Found timestamp column: '{timestamp_col}' → renamed to 'timestamp'")
-
-    def time_to_sec(t):
-        try:
-            s = str(t).strip()
-            if not s:
+if uploaded_video:
+    if uploaded_csv:
+        # Load CSV
+        motion_df = pd.read_csv(uploaded_csv)
+
+        st.write("📊 CSV Columns found:", list(motion_df.columns))
+        st.write("📊 First few rows:")
+        st.dataframe(motion_df.head())
+
+        timestamp_col = None
+        possible_timestamp_names = ['timestamp', 'time', 'Time', 'Timestamp', 'TIME', 'TIMESTAMP', 'time_stamp', 'time_stamp_seconds']
+        for col in motion_df.columns:
+            if col.lower() in [name.lower() for name in possible_timestamp_names]:
+                timestamp_col = col
+                break
+
+        if timestamp_col is None:
+            st.error("❌ CSV must contain a 'timestamp' column. Found columns: " + ", ".join(motion_df.columns))
+            st.stop()
+        else:
+            if timestamp_col != 'timestamp':
+                motion_df = motion_df.rename(columns={timestamp_col: 'timestamp'})
+                st.success(f"✅ Found timestamp column: '{timestamp_col}' → renamed to 'timestamp'")
+
+        def time_to_sec(t):
+            try:
+                s = str(t).strip()
+                if not s:
+                    return 0
+                if ':' in s:
+                    parts = s.split(':')
+                    if len(parts) == 3:  # HH:MM:SS format (preferred)
+                        h, m, s2 = parts
+                        return int(h) * 3600 + int(m) * 60 + int(float(s2))
+                    elif len(parts) == 2:  # MM:SS format (fallback)
+                        m, s2 = parts
+                        return int(m) * 60 + int(float(s2))
+                if s.replace('.', '').isdigit():
+                    return int(float(s))
+                st.error(f"❌ Unsupported timestamp format: {t}")
+                return 0
+            except Exception as e:
+                st.error(f"❌ Error converting timestamp '{t}': {str(e)}")
                 return 0
-            if ':' in s:
-                parts = s.split(':')
-                if len(parts) == 3:  # HH:MM:SS format (preferred)
-                    h, m, s2 = parts
-                    return int(h) * 3600 + int(m) * 60 + int(float(s2))
-                elif len(parts) == 2:  # MM:SS format (fallback)
-                    m, s2 = parts
-                    return int(m) * 60 + int(float(s2))
-            if s.replace('.', '').isdigit():
-                return int(float(s))
-            st.error(f"❌ Unsupported timestamp format: {t}")
-            return 0
-        except Exception as e:
-            st.error(f"❌ Error converting timestamp '{t}': {str(e)}")
-            return 0
 
-    # Add helpful guidance for CSV format
-    st.info("💡 **CSV Format Guide:** Use HH:MM:SS format (e.g., 00:01:30 for 1 minute 30 seconds)")
+        # Add helpful guidance for CSV format
+        st.info("💡 **CSV Format Guide:** Use HH:MM:SS format (e.g., 00:01:30 for 1 minute 30 seconds)")
 
-    motion_df['time_sec'] = motion_df['timestamp'].apply(time_to_sec)
+        motion_df['time_sec'] = motion_df['timestamp'].apply(time_to_sec)
 
-    st.write("⏰ Timestamp conversion preview:")
-    st.write("Original → Seconds")
-    for orig, sec in zip(motion_df['timestamp'].head(), motion_df['time_sec'].head()):
-        st.write(f"{orig} → {sec}s")
+        st.write("⏰ Timestamp conversion preview:")
+        st.write("Original → Seconds")
+        for orig, sec in zip(motion_df['timestamp'].head(), motion_df['time_sec'].head()):
+            st.write(f"{orig} → {sec}s")
+    else:
+        st.info("ℹ️ No reference CSV uploaded - motion labels will be detected automatically from the pose after rendering.")
+        motion_df = pd.DataFrame(columns=['timestamp', 'time_sec'] + MOTION_LABELS)
 
     motion_cols = [c for c in motion_df.columns if c not in ['timestamp','time_sec']]
 
@@ -287,6 +465,53 @@ if uploaded_video and uploaded_csv:
     video_path = tfile.name
     st.video(video_path)
 
+    motion_lookup = build_motion_lookup(motion_df, motion_cols,
+                                        MOTION_LABELS_TH if label_language == "ไทย" else None)
+
+    # Thumbnail strip and frame-accurate scrubber from the keyframe index (cached on disk).
+    # Built only when asked for: the keyframe pass decodes the whole file
+    video_idx = None
+    if st.toggle("🔎 Browse video", value=False, help="Index the video's keyframes for thumbnails and a scrubber"):
+        with st.spinner("Indexing video..."):
+            try:
+                video_idx = cached_index(video_path)
+            except (RuntimeError, ValueError) as e:
+                st.warning(f"⚠️ Could not index this video for browsing: {e}")
+    if video_idx is not None:
+        st.image(thumbnail_strip(video_idx, motion_lookup.keys()), channels="BGR", use_container_width=True,
+                 caption="Ticks mark labeled seconds")
+
+        def jump_to_label():
+            choice = st.session_state["scrub_label"]
+            if choice in label_seconds:
+                st.session_state["scrub_seconds"] = float(label_seconds[choice])
+
+        label_seconds = {f"{format_timestamp(sec)}  {text}": sec for sec, text in sorted(motion_lookup.items())}
+        st.selectbox("Jump to label", ["-"] + list(label_seconds), key="scrub_label", on_change=jump_to_label,
+                     disabled=not label_seconds)
+        scrub_max = max(video_idx.duration - 1 / video_idx.fps, 0.0)
+        scrub_seconds = st.slider("Preview at (s)", 0.0, max(scrub_max, 0.1), 0.0, 1 / video_idx.fps,
+                                  key="scrub_seconds", format="%.2f")
+        # One seeker per upload, so scrubbing forward keeps decoding instead of seeking
+        seeker_state = st.session_state.get("frame_seeker")
+        if seeker_state is None or seeker_state[0] != video_path:
+            if seeker_state is not None:
+                seeker_state[1].close()
+            seeker_state = (video_path, FrameSeeker(video_path, video_idx))
+            st.session_state["frame_seeker"] = seeker_state
+        preview_frame = seeker_state[1].read_time(min(scrub_seconds, scrub_max))
+        if preview_frame is not None:
+            st.image(preview_frame, channels="BGR", use_container_width=True,
+                     caption=f"{format_timestamp(int(scrub_seconds))}  {motion_lookup.get(int(scrub_seconds), '')}")
+
+    # Highlight reel: only the annotated seconds (plus padding) are decoded and rendered
+    highlight_reel = st.checkbox(
+        "Highlight reel (labeled moments only)", value=False, disabled=not motion_lookup,
+        help="Needs a reference CSV with motion labels. Unlabeled stretches are skipped without decoding."
+    )
+    if highlight_reel:
+        highlight_padding = st.slider("Padding around each labeled second (s)", 0.0, 5.0, 1.0, 0.5)
+
     if st.button("Generate Skeleton Overlay"):
         try:
             cap = cv2.VideoCapture(video_path)
@@ -294,206 +519,301 @@ if uploaded_video and uploaded_csv:
                 st.error("❌ Failed to open video file")
                 st.stop()
                 
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            st.info(f"📹 Processing video: {width}x{height} @ {fps:.1f} fps")
-            
-            # Try different codecs in order of preference
-            codecs = ['mp4v', 'XVID', 'MJPG']
-            fourcc = None
-            out = None
-            for codec in codecs:
-                try:
-                    fourcc = cv2.VideoWriter_fourcc(*codec)
-                    output_video = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-                    out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
-                    if out.isOpened():
-                        st.success(f"✅ Using codec: {codec}")
-                        break
-                    else:
-                        out.release()
-                except:
-                    continue
-            
-            if fourcc is None or not out.isOpened():
-                st.error("❌ No compatible video codec found")
-                st.stop()
+            info = probe_video(cap)
+            st.info(f"📹 Processing video: {info.width}x{info.height} @ {info.fps:.1f} fps")
+            # The header count, cross-checked against the container duration (0 if unknown)
+            video_frames = expected_frames(video_path, info.fps, info.frame_count)
+            frame_ranges = None
+            if highlight_reel:
+                frame_ranges = highlight_ranges(motion_lookup.keys(), info.fps, info.frame_count, highlight_padding)
+                if not frame_ranges:
+                    st.error("❌ None of the labeled seconds fall within the video, so the highlight reel would be empty.")
+                    st.stop()
+                reel_frames = sum(end - start for start, end in frame_ranges)
+                st.info(f"🎬 Highlight reel: {len(frame_ranges)} clips, {reel_frames / info.fps:.0f}s of {info.duration:.0f}s")
+
+            candidate_backends = available_backends() if backend_option == "Auto" else [backend_option]
+            predicted_seconds = None
+            if render_deadline > 0:
+                # Plan stride / resolutions / model complexity from measured per-stage costs
+                with st.spinner("Measuring per-stage costs..."):
+                    costs = measure_stage_costs(cap, candidate_backends, encoder=encoder_settings)
+                # Plan for the frames that will actually be rendered
+                planned_info = info._replace(frame_count=reel_frames if frame_ranges is not None else video_frames)
+                estimate = plan_render(planned_info, costs, render_deadline, candidate_backends)
+                plan = estimate.plan
+                predicted_seconds = estimate.predicted_seconds
+                st.write("🧭 Render plan:")
+                st.table(pd.DataFrame([{
+                    "Pose backend": plan.backend_name,
+                    "Inference stride": plan.inference_stride,
+                    "Inference resolution": f"{plan.inference_scale:.0%}",
+                    "Output resolution": f"{plan.output_scale:.0%}",
+                    "Predicted time (s)": "unknown" if math.isnan(predicted_seconds) else round(predicted_seconds, 1),
+                }]))
+                if math.isnan(predicted_seconds):
+                    st.warning("⚠️ The video's length is unknown, so the deadline cannot be planned for; "
+                               "using the fastest plan.")
+                    predicted_seconds = None
+                elif not estimate.feasible:
+                    st.warning(f"⚠️ Cannot meet the {render_deadline}s deadline on this machine; using the fastest plan.")
+            elif backend_option == "Auto":
+                # Pick the pose backend (Auto runs a short benchmark on sample frames)
+                with st.spinner("Benchmarking pose backends..."):
+                    backend_name, benchmark = select_backend(sample_frames(cap), accuracy_floor)
+                st.dataframe(pd.DataFrame(benchmark))
+                plan = RenderPlan(backend_name)
+            else:
+                plan = RenderPlan(backend_option)
+            plan = replace(plan, max_people=int(max_people))
+            cap.release()
 
-            margin_x = 20
-            margin_y = 20
-            frame_idx = 0
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Progress bar
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            # Initialize MediaPipe Pose if available
-            if MEDIAPIPE_AVAILABLE:
-                with mp_pose.Pose(
-                    min_detection_confidence=0.5,
-                    min_tracking_confidence=0.5
-                ) as pose:
-                    while True:
-                        ret, frame = cap.read()
-                        if not ret:
-                            break
-
-                        # Update progress
-                        progress = frame_idx / total_frames
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing frame {frame_idx}/{total_frames}")
-
-                        # Convert BGR to RGB for MediaPipe
-                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        results = pose.process(rgb_frame)
-
-                        # Draw pose landmarks
-                        if results.pose_landmarks:
-                            # Draw connections with custom colors
-                            for connection in mp_pose.POSE_CONNECTIONS:
-                                start_idx = connection[0]
-                                end_idx = connection[1]
-                                
-                                start_point = results.pose_landmarks.landmark[start_idx]
-                                end_point = results.pose_landmarks.landmark[end_idx]
-                                
-                                # Convert normalized coordinates to pixel coordinates
-                                start_x = int(start_point.x * width)
-                                start_y = int(start_point.y * height)
-                                end_x = int(end_point.x * width)
-                                end_y = int(end_point.y * height)
-                                
-                                # Draw the connection line
-                                cv2.line(frame, (start_x, start_y), (end_x, end_y), line_color_bgr, line_thickness)
-                            
-                            # Draw landmarks as dots
-                            for landmark in results.pose_landmarks.landmark:
-                                x = int(landmark.x * width)
-                                y = int(landmark.y * height)
-                                cv2.circle(frame, (x, y), dot_radius, dot_color_bgr, -1)
-                        else:
-                            # Fallback: draw improved skeleton if no pose detected
-                            center_x, center_y, person_w, person_h = detect_person_center(frame)
-                            draw_improved_skeleton(frame, center_x, center_y, person_w, person_h, line_color_bgr, dot_color_bgr, line_thickness, dot_radius)
-
-                        current_sec = int(frame_idx / fps)
-
-                        row = motion_df[motion_df['time_sec'] == current_sec]
-                        if not row.empty:
-                            motions = [col for col in motion_cols if row.iloc[0][col] == 1]
-                            if motions:
-                                text = " + ".join(motions)
-                                text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, motion_font_thickness)
-
-                                if motion_position == "Bottom Right":
-                                    text_x = width - text_size[0] - margin_x
-                                    text_y = height - margin_y
-                                elif motion_position == "Bottom Left":
-                                    text_x = margin_x
-                                    text_y = height - margin_y
-                                elif motion_position == "Top Right":
-                                    text_x = width - text_size[0] - margin_x
-                                    text_y = margin_y + text_size[1]
-                                elif motion_position == "Top Left":
-                                    text_x = margin_x
-                                    text_y = margin_y + text_size[1]
-                                elif motion_position == "Center":
-                                    text_x = (width - text_size[0]) // 2
-                                    text_y = (height + text_size[1]) // 2
-                                else:
-                                    text_x = int((custom_x / 100) * width)
-                                    text_y = int((custom_y / 100) * height)
-
-                                cv2.putText(frame, text, (text_x, text_y),
-                                            cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, (0,0,0), motion_font_thickness+2, cv2.LINE_AA)
-                                cv2.putText(frame, text, (text_x, text_y),
-                                            cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, motion_color_bgr, motion_font_thickness, cv2.LINE_AA)
-
-                        out.write(frame)
-                        frame_idx += 1
+            # Shrink encoder queues / resolution to the memory budget, or refuse the job up front
+            # The whole video is one open-ended range: the render reads to the end of the file
+            # however many frames the header reported, and the estimate is only for planning
+            ranges = frame_ranges if frame_ranges is not None else [(0, None)]
+            try:
+                budget_fit = fit_to_budget(
+                    info, plan, encoder_settings, memory_budget_mb, draw=not browser_overlay,
+                    frames=reel_frames if frame_ranges is not None else video_frames,
+                    input_bytes=os.path.getsize(video_path), renditions=renditions,
+                    layers=motion_trails or gesture_heatmap,
+                )
+            except MemoryBudgetError as e:
+                st.error(f"❌ {e} Try a shorter or lower-resolution video, or raise the budget.")
+                st.stop()
+            plan, job_encoder = budget_fit.plan, budget_fit.encoder
+            if budget_fit.adjustments:
+                st.info(f"🧠 To stay within {memory_budget_mb} MB: " + ", ".join(budget_fit.adjustments))
+            st.caption(f"Estimated memory: {budget_fit.estimate.total / 2**20:.0f} MB")
+            st.success(f"✅ Using pose backend: {plan.backend_name}")
+
+            style = OverlayStyle(
+                line_color_bgr, dot_color_bgr, line_thickness, dot_radius,
+                motion_color_bgr, motion_font_scale, motion_font_thickness,
+                motion_position, custom_x, custom_y, trails=motion_trails, heatmap=gesture_heatmap,
+            )
+            # The render runs as a checkpointed job: every CHECKPOINT_SECONDS of video is saved,
+            # so a server restart resumes from the last finished segment (see "Interrupted renders")
+            # Cut on keyframes when they are cheap to find; otherwise fixed-length segments,
+            # whose resume decodes a little more
+            segments = checkpoint_segments(ranges, info.fps, cheap_keyframes(video_path), frame_count=video_frames)
+            job = job_store.create_job(video_path, uploaded_video.name, job_params(
+                style, plan, job_encoder, motion_lookup, segments, info.fps, video_frames,
+                draw=not browser_overlay, memory_budget_mb=memory_budget_mb, renditions=renditions),
+                owner=job_owner)
+            output_dir = str(job_store.job_dir(job.id))
+
+            # Progress bar, updated a few times per second rather than every frame
+            progress_bar = st.progress(0.0, text="Starting...")
+            # Everything rendered so far: the finished segments plus the playable prefix of the
+            # fragmented one in progress (stream copies). Refreshed each time the rendered length
+            # doubles, so all previews together re-send at most about twice the video
+            preview = st.empty()
+            preview_path = os.path.join(output_dir, "live_preview.mp4")
+            preview_state = {"done": [], "partial": None, "next_seconds": 2.0}
+
+            def show_segment(index, segment_path):
+                finished = job_store.completed_segments(job.id)
+                preview_state.update(partial=segment_path, done=[
+                    finished[i]["video_path"] for i in sorted(finished)
+                    if i < index and finished[i]["end_frame"] > finished[i]["start_frame"]])
+
+            def show_progress(state):
+                progress_bar.progress(state.fraction, text=state.describe())
+                if job_encoder.fragmented and preview_state["partial"] \
+                        and state.done / info.fps >= preview_state["next_seconds"]:
+                    if preview_concat(preview_state["done"], preview_state["partial"], preview_path):
+                        preview.video(preview_path)
+                        preview_state["next_seconds"] = 2 * state.done / info.fps
+
+            update_progress = ProgressReporter(show_progress, stage="Tracking pose" if browser_overlay else "Rendering")
+            result = run_job(job_store, job, update_progress, show_segment)
+            if os.path.exists(preview_path):
+                os.remove(preview_path)
+            update_progress.finish(done=result.frames)
+            if not browser_overlay:
+                st.success(f"✅ Using codec: {result.codec}")
+            if predicted_seconds is not None:
+                st.info(f"⏱️ Render time: {result.elapsed:.1f}s (predicted {predicted_seconds:.1f}s, deadline {render_deadline}s)")
             else:
-                # Fallback for when MediaPipe is not available
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    # Update progress
-                    progress = frame_idx / total_frames
-                    progress_bar.progress(progress)
-                    status_text.text(f"Processing frame {frame_idx}/{total_frames}")
-
-                    # Improved skeleton drawing (fallback)
-                    center_x, center_y, person_w, person_h = detect_person_center(frame)
-                    draw_improved_skeleton(frame, center_x, center_y, person_w, person_h, line_color_bgr, dot_color_bgr, line_thickness, dot_radius)
-
-                    current_sec = int(frame_idx / fps)
-
-                    row = motion_df[motion_df['time_sec'] == current_sec]
-                    if not row.empty:
-                        motions = [col for col in motion_cols if row.iloc[0][col] == 1]
-                        if motions:
-                            text = " + ".join(motions)
-                            text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, motion_font_thickness)
-
-                            if motion_position == "Bottom Right":
-                                text_x = width - text_size[0] - margin_x
-                                text_y = height - margin_y
-                            elif motion_position == "Bottom Left":
-                                text_x = margin_x
-                                text_y = height - margin_y
-                            elif motion_position == "Top Right":
-                                text_x = width - text_size[0] - margin_x
-                                text_y = margin_y + text_size[1]
-                            elif motion_position == "Top Left":
-                                text_x = margin_x
-                                text_y = margin_y + text_size[1]
-                            elif motion_position == "Center":
-                                text_x = (width - text_size[0]) // 2
-                                text_y = (height + text_size[1]) // 2
-                            else:
-                                text_x = int((custom_x / 100) * width)
-                                text_y = int((custom_y / 100) * height)
-
-                            cv2.putText(frame, text, (text_x, text_y),
-                                        cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, (0,0,0), motion_font_thickness+2, cv2.LINE_AA)
-                            cv2.putText(frame, text, (text_x, text_y),
-                                        cv2.FONT_HERSHEY_SIMPLEX, motion_font_scale, motion_color_bgr, motion_font_thickness, cv2.LINE_AA)
-
-                    out.write(frame)
-                    frame_idx += 1
+                st.info(f"⏱️ Render time: {result.elapsed:.1f}s")
+            st.caption(f"Frame buffer reallocations per frame: {result.allocations_per_frame:.2f}"
+                       + (f" • {result.bytes_per_frame / 1024:.1f} KiB allocated per frame" if result.bytes_per_frame is not None else ""))
 
-            cap.release()
-            out.release()
-            
-            # Clear progress indicators
+            # Clear progress indicators (the finished video replaces the preview)
             progress_bar.empty()
-            status_text.empty()
+            preview.empty()
 
             # Check if video was created successfully
-            if os.path.exists(output_video) and os.path.getsize(output_video) > 0:
-                st.success("✅ Skeleton overlay video generated!")
-                
-                # Read the video file for display and download
-                with open(output_video, "rb") as video_file:
-                    video_bytes = video_file.read()
-                
-                # Display video
-                st.video(video_bytes)
-                
-                # Download button
-                st.download_button(
-                    label="Download Motion Overlay Video",
-                    data=video_bytes,
-                    file_name="skeleton_overlay.mp4",
-                    mime="video/mp4"
-                )
+            output_video = result.output_path
+            if browser_overlay or (os.path.exists(output_video) and os.path.getsize(output_video) > 0):
+                # Keep the outputs across reruns (e.g. after a download click)
+                st.session_state["render_output"] = {
+                    "source": (uploaded_video.name, uploaded_video.size),
+                    "output_video": None if browser_overlay else output_video,
+                    "renditions": result.renditions,
+                    "output_dir": output_dir,
+                    "highlight_reel": frame_ranges is not None,
+                    "input_video": video_path,
+                    "stream": encode_track(result.landmarks, info.fps, motion_lookup) if browser_overlay else None,
+                    "landmarks": result.landmarks,
+                    "people": result.people,
+                    "landmarks_file": result.landmarks_path,
+                    "fps": info.fps,
+                    "aspect": info.width / max(info.height, 1),
+                    "duration": info.duration,
+                }
             else:
                 st.error("❌ Failed to generate video. Please check your input files.")
                 
         except Exception as e:
             st.error(f"❌ Error during video processing: {str(e)}")
-            st.error("Please check your video file format and try again.") 
\ No newline at end of file
+            st.error("Please check your video file format and try again.") 
+
+    render_output = st.session_state.get("render_output")
+    if render_output and render_output["source"] == (uploaded_video.name, uploaded_video.size):
+        if render_output["output_video"] is None:
+            # Skeleton drawn in the browser over the original video, styled from the sidebar
+            stream = render_output["stream"]
+            st.success(f"✅ Pose track ready ({stream_size(stream) / 1024:.0f} KB sent to the browser)")
+            skeleton_player(render_output["input_video"], stream, OverlayStyle(
+                line_color_bgr, dot_color_bgr, line_thickness, dot_radius,
+                motion_color_bgr, motion_font_scale, motion_font_thickness,
+                motion_position, custom_x, custom_y,
+            ))
+        else:
+            st.success("✅ Skeleton overlay video generated!")
+
+            # Display and download the rendition that fits the client
+            show_rendered_video(
+                render_output["output_video"], render_output.get("renditions", {}),
+                "highlight_reel.mp4" if render_output.get("highlight_reel") else "skeleton_overlay.mp4",
+                "download_video",
+            )
+
+        if render_output.get("landmarks_file"):
+            with open(render_output["landmarks_file"], "rb") as landmarks_file:
+                st.download_button(
+                    label="Download Pose Landmarks (Parquet)",
+                    data=landmarks_file.read(),
+                    file_name="pose_landmarks.parquet",
+                    mime="application/vnd.apache.parquet"
+                )
+
+        # Motion labels detected from the landmark track, in the reference CSV format
+        st.subheader("🤖 Auto-detected motions")
+        # With several people tracked, labels and the report follow one person's track
+        people = render_output.get("people") or {}
+        person_landmarks = render_output["landmarks"]
+        person_id = None
+        if len(people) > 1:
+            person_id = st.selectbox("Person", sorted(people), format_func=lambda p: f"P{p + 1}")
+            person_landmarks = people[person_id]
+        auto_motion_df = detect_motion_labels(person_landmarks, render_output["fps"], render_output["aspect"])
+        if auto_motion_df.empty:
+            st.info("No motions detected (no pose found, or too little movement).")
+        else:
+            st.dataframe(auto_motion_df)
+            st.download_button(
+                label="Download Auto-detected Motion CSV",
+                data=auto_motion_df.to_csv(index=False).encode("utf-8"),
+                file_name="motion_time_stamp_auto.csv",
+                mime="text/csv"
+            )
+
+        # Statistics report from the uploaded annotations (or the auto-detected ones)
+        if uploaded_csv:
+            report_df = motion_df
+        else:
+            report_df = auto_motion_df.assign(time_sec=timestamp_seconds(auto_motion_df['timestamp']))
+        report_cols = [c for c in report_df.columns if c not in ['timestamp', 'time_sec']]
+        report_csv, report_xlsx = cached_report(
+            report_df, report_cols, person_landmarks, render_output["fps"], render_output["aspect"],
+            render_output["duration"], render_output["output_dir"],
+        )
+        st.subheader("📈 Motion Report")
+        st.download_button(
+            label="Download Motion Report (CSV)",
+            data=report_csv.read_bytes(),
+            file_name="motion_report.csv",
+            mime="text/csv"
+        )
+        if report_xlsx is not None:
+            st.download_button(
+                label="Download Motion Report (XLSX)",
+                data=report_xlsx.read_bytes(),
+                file_name="motion_report.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+
+        # Thai and English PDF reports from the same statistics (charts rendered once for both)
+        pdf_reports = cached_pdf_reports(
+            report_df, report_cols, person_landmarks, render_output["fps"], render_output["aspect"],
+            render_output["duration"], uploaded_video.name, render_output["output_dir"],
+        )
+        st.download_button(
+            label="Download Thai Report (PDF)",
+            data=pdf_reports["th"].read_bytes(),
+            file_name="Presentation Analysis Thai Report.pdf",
+            mime="application/pdf"
+        )
+        st.download_button(
+            label="Download English Report (PDF)",
+            data=pdf_reports["en"].read_bytes(),
+            file_name="Presentation Analysis English Report.pdf",
+            mime="application/pdf"
+        )
+
+        # Saved once per distinct analysis and tab owner; later reruns only update the speaker name.
+        # Another visitor's run of the same clip is their own analysis, under their own name
+        analysis_id = hashlib.sha1(
+            f"{job_owner}:{report_digest(report_df, report_cols, person_landmarks, render_output['fps'])}".encode()
+        ).hexdigest()[:16]
+        analysis_catalog.record(
+            analysis_id, speaker_name.strip() or "Unknown", uploaded_video.name, report_df, report_cols, person_landmarks,
+            render_output["fps"], render_output["aspect"], render_output["duration"],
+            "csv" if uploaded_csv else "auto", person_id,
+            {"video": render_output["output_video"], "report": str(report_xlsx or report_csv),
+             "pdf": str(pdf_reports["en"])},
+        )
+
+        # Moments across the catalog whose movement looks like a chosen window of this video
+        movement_index.update(analysis_catalog)
+        if len(movement_index) and render_output["duration"] > WINDOW_SECONDS:
+            st.subheader("🔎 Similar moments")
+            query_start = st.slider(
+                "Movement starting at (seconds)", 0.0, float(render_output["duration"] - WINDOW_SECONDS), 0.0,
+                step=WINDOW_STEP_SECONDS,
+            )
+            query = embed_window(person_landmarks, render_output["fps"], render_output["aspect"], query_start)
+            if query is None:
+                st.info("No pose in this window; pick another start.")
+            else:
+                matches = movement_index.search(query, analysis_catalog, k=5, exclude=(analysis_id, query_start))
+                if matches.empty:
+                    st.info("No similar moments in the catalog yet.")
+                else:
+                    matches["time"] = [format_timestamp(int(s)) for s in matches["start"]]
+                    st.dataframe(matches[["video_name", "speaker", "time", "score"]], hide_index=True)
+                    best = matches.iloc[0]
+                    if best["video_path"] and os.path.exists(best["video_path"]):
+                        st.video(best["video_path"], start_time=int(best["start"]))
+
+# Past analyses from the catalog: indexed queries, no files are read
+if analysis_catalog.count():
+    st.subheader("📚 Analysis history")
+    col_motion, col_speaker, col_metric = st.columns(3)
+    history_motion = col_motion.selectbox("Motion", analysis_catalog.motions())
+    history_speaker = col_speaker.selectbox("Speaker", ["All speakers"] + analysis_catalog.speakers(),
+                                            key="history_speaker")
+    history_metric = col_metric.radio("Per minute", list(METRICS), horizontal=True,
+                                      format_func=lambda m: m.split("_")[0].capitalize())
+    speaker_filter = None if history_speaker == "All speakers" else history_speaker
+    top = analysis_catalog.top_sessions(history_motion, speaker_filter, history_metric, limit=10)
+    top["created"] = pd.to_datetime(top["created"], unit="s")
+    st.dataframe(top[["created", "speaker", "video_name", "value", "episodes", "labeled_seconds"]].rename(
+        columns={"value": history_metric}), hide_index=True)
+    trend = analysis_catalog.trend(history_motion, speaker_filter, history_metric)
+    if len(trend) > 1:
+        st.line_chart(trend, x="day", y="value")
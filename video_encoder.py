@@ -0,0 +1,328 @@
+"""
+Video encoder backends.
+
+`FFmpegWriter` streams raw BGR frames to a local `ffmpeg` process encoding
+H.264 (libx264, faststart), which is several times smaller than OpenCV's
+`mp4v` output and plays inline in browsers. `cv2.VideoWriter` stays as the
+fallback. Codec availability is probed once per process and cached.
+
+With `EncoderSettings.fragmented` the output is a fragmented MP4 (a fragment
+per keyframe interval), so the part already written is playable while the
+render continues; `playable_prefix` cuts it at the last complete fragment,
+and `preview_concat` puts it after the finished segments of a checkpointed
+render.
+
+A `RenditionWriter` encodes an extra, smaller version of the same frames
+(e.g. a 480p mobile copy or an animated GIF preview) next to the main output,
+so every rendition comes out of one decode and inference pass.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import struct
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+H264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+DEFAULT_PRESET = os.environ.get("H264_PRESET", "veryfast")
+DEFAULT_CRF = int(os.environ.get("H264_CRF", "23"))
+# Keyframe (and so fragment) interval for progressive output
+FRAGMENT_SECONDS = float(os.environ.get("H264_FRAGMENT_SECONDS", "1.0"))
+
+# OpenCV fallback codecs in order of preference
+OPENCV_CODECS = ['mp4v', 'XVID', 'MJPG']
+
+
+@dataclass
+class EncoderSettings:
+    use_ffmpeg: bool = True
+    preset: str = DEFAULT_PRESET
+    crf: int = DEFAULT_CRF
+    # Fragmented MP4 that can be played while it is being written
+    fragmented: bool = False
+    # x264 queue depths (None = the preset's / x264's own default); lowered to save memory
+    lookahead: int | None = None
+    threads: int | None = None
+
+
+@dataclass
+class Rendition:
+    """An extra encoding of the rendered frames."""
+
+    name: str
+    # Height cap in pixels; frames are never upscaled
+    max_height: int
+    crf: int = DEFAULT_CRF
+    # Frame-rate cap, met by dropping frames
+    max_fps: float | None = None
+    # Only the first seconds of the output (a preview)
+    max_seconds: float | None = None
+    # "mp4" or "gif" (animated thumbnail)
+    format: str = "mp4"
+
+
+MOBILE_RENDITION = Rendition("mobile", 480, crf=DEFAULT_CRF + 5)
+PREVIEW_RENDITION = Rendition("preview", 180, max_fps=8.0, max_seconds=6.0, format="gif")
+DEFAULT_RENDITIONS = [MOBILE_RENDITION, PREVIEW_RENDITION]
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_has_encoder(encoder: str = "libx264") -> bool:
+    if shutil.which(FFMPEG_BIN) is None:
+        return False
+    try:
+        listing = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return any(line.split()[1:2] == [encoder] for line in listing.splitlines() if line.strip())
+
+
+@functools.lru_cache(maxsize=None)
+def opencv_codec_available(codec: str) -> bool:
+    fd, probe_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        out = cv2.VideoWriter(probe_path, cv2.VideoWriter_fourcc(*codec), 30.0, (64, 64))
+        ok = out.isOpened()
+        out.release()
+        return ok
+    except cv2.error:
+        return False
+    finally:
+        os.remove(probe_path)
+
+
+class FFmpegWriter:
+    """`cv2.VideoWriter`-compatible writer that pipes raw frames into ffmpeg."""
+
+    def __init__(self, output_path: str | Path, fps: float, size: tuple[int, int],
+                 preset: str = DEFAULT_PRESET, crf: int = DEFAULT_CRF, encoder: str = "libx264",
+                 fragment_seconds: float | None = None, lookahead: int | None = None,
+                 threads: int | None = None):
+        width, height = size
+        if fragment_seconds:
+            # moov up front, then a moof+mdat pair per keyframe interval
+            gop = max(1, round(fps * fragment_seconds))
+            container = ["-g", str(gop), "-keyint_min", str(gop), "-flush_packets", "1",
+                         "-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+        else:
+            container = ["-movflags", "+faststart"]
+        queues = []
+        if lookahead is not None:
+            queues += ["-rc-lookahead", str(lookahead)]
+        if threads is not None:
+            queues += ["-threads", str(threads)]
+        command = [
+            FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:.6f}",
+            "-i", "-",
+            "-an",
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", encoder, "-preset", preset, "-crf", str(crf), *queues,
+            "-pix_fmt", "yuv420p", *container,
+            str(output_path),
+        ]
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        return self._proc.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited early: {self._stderr()}") from None
+
+    def release(self) -> None:
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {self._stderr()}")
+
+    def _stderr(self) -> str:
+        return self._proc.stderr.read().decode(errors="replace").strip() if self._proc.stderr else ""
+
+
+class GifWriter(FFmpegWriter):
+    """Animated GIF through ffmpeg, with a palette computed from all the frames."""
+
+    def __init__(self, output_path: str | Path, fps: float, size: tuple[int, int]):
+        width, height = size
+        command = [
+            FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:.6f}",
+            "-i", "-",
+            "-vf", "split[a][b];[a]palettegen=stats_mode=diff[p];[b][p]paletteuse=dither=bayer",
+            "-loop", "0", str(output_path),
+        ]
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def rendition_supported(rendition: Rendition) -> bool:
+    """GIF previews need ffmpeg; MP4 renditions fall back to OpenCV like the main output."""
+    return rendition.format != "gif" or shutil.which(FFMPEG_BIN) is not None
+
+
+def rendition_size(rendition: Rendition, size: tuple[int, int]) -> tuple[int, int]:
+    """`size` scaled down to the rendition's height cap, with even dimensions."""
+    width, height = size
+    if height <= rendition.max_height:
+        return size
+    scale = rendition.max_height / height
+    return max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2)
+
+
+class RenditionWriter:
+    """Downscales, drops frames for the rendition's frame rate and encodes."""
+
+    def __init__(self, rendition: Rendition, output_path: str | Path, fps: float, size: tuple[int, int],
+                 settings: EncoderSettings | None = None):
+        self.rendition = rendition
+        self.size = rendition_size(rendition, size)
+        self.fps = min(fps, rendition.max_fps) if rendition.max_fps else fps
+        self._step = fps / self.fps
+        self._next = 0.0
+        self._index = 0
+        self._max_frames = round(rendition.max_seconds * fps) if rendition.max_seconds else None
+        self._buffer = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8) if self.size != size else None
+        if rendition.format == "gif":
+            self._writer, self.codec = GifWriter(output_path, self.fps, self.size), "gif"
+        else:
+            settings = replace(settings or EncoderSettings(), crf=rendition.crf, fragmented=False)
+            self._writer, self.codec = open_video_writer(output_path, self.fps, self.size, settings)
+
+    def write(self, frame: np.ndarray) -> None:
+        index = self._index
+        self._index += 1
+        if (self._max_frames is not None and index >= self._max_frames) or index < self._next:
+            return
+        self._next += self._step
+        if self._buffer is not None:
+            frame = cv2.resize(frame, self.size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        self._writer.write(frame)
+
+    def release(self) -> None:
+        self._writer.release()
+
+
+def open_video_writer(output_path: str | Path, fps: float, size: tuple[int, int],
+                      settings: EncoderSettings | None = None):
+    """Return `(writer, codec_label)`: ffmpeg H.264 if available, else the first OpenCV codec that works."""
+    settings = settings or EncoderSettings()
+    if settings.use_ffmpeg and ffmpeg_has_encoder("libx264"):
+        fragment_seconds = FRAGMENT_SECONDS if settings.fragmented else None
+        writer = FFmpegWriter(output_path, fps, size, settings.preset, settings.crf,
+                              fragment_seconds=fragment_seconds, lookahead=settings.lookahead,
+                              threads=settings.threads)
+        if writer.isOpened():
+            label = f"h264 (ffmpeg {settings.preset}, crf {settings.crf}"
+            return writer, label + (", fragmented)" if settings.fragmented else ")")
+    for codec in OPENCV_CODECS:
+        if not opencv_codec_available(codec):
+            continue
+        out = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*codec), fps, size)
+        if out.isOpened():
+            return out, codec
+        out.release()
+    raise RuntimeError("No compatible video codec found")
+
+
+def playable_prefix(path: str | Path) -> bytes | None:
+    """
+    The part of a fragmented MP4 that is complete so far: everything up to the
+    end of the last whole top-level box, once the header and one fragment
+    exist. None while there is nothing playable yet.
+    """
+    try:
+        data = Path(path).read_bytes()
+    except OSError:
+        return None
+    offset = end = 0
+    seen_moov = seen_mdat = False
+    while offset + 8 <= len(data):
+        size, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        if size == 1 and offset + 16 <= len(data):
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+        if size < 8 or offset + size > len(data):
+            break
+        seen_moov |= kind == b"moov"
+        seen_mdat |= kind == b"mdat"
+        offset += size
+        if kind == b"mdat":
+            end = offset
+    return data[:end] if seen_moov and seen_mdat else None
+
+
+def preview_concat(done_paths: list[str | Path], partial_path: str | Path | None, output_path: str | Path) -> bool:
+    """
+    Write the playable part of a checkpointed render so far to `output_path`:
+    the finished segments, then the playable prefix of the fragmented segment
+    in progress. False while nothing is playable yet.
+    """
+    paths = [Path(path) for path in done_paths]
+    prefix = playable_prefix(partial_path) if partial_path is not None else None
+    tail = Path(output_path).with_suffix(".tail.mp4")
+    if prefix:
+        tail.write_bytes(prefix)
+        paths.append(tail)
+    if not paths:
+        return False
+    try:
+        concat_videos(paths, output_path)
+    finally:
+        tail.unlink(missing_ok=True)
+    return True
+
+
+def concat_videos(paths: list[str | Path], output_path: str | Path, settings: EncoderSettings | None = None) -> str:
+    """
+    Join videos encoded with the same settings, e.g. the segments of a
+    checkpointed render. With ffmpeg the streams are copied (no re-encode);
+    otherwise the frames are decoded and written again. Returns the codec label.
+    """
+    if shutil.which(FFMPEG_BIN) is not None:
+        fd, list_path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(fd, "w") as listing:
+            for path in paths:
+                escaped = str(Path(path).resolve()).replace("'", r"'\''")
+                listing.write(f"file '{escaped}'\n")
+        try:
+            result = subprocess.run(
+                [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0",
+                 "-i", list_path, "-c", "copy", "-movflags", "+faststart", str(output_path)],
+                capture_output=True, text=True)
+        finally:
+            os.remove(list_path)
+        if result.returncode == 0:
+            return "stream copy"
+    out = None
+    codec = "none"
+    for path in paths:
+        cap = cv2.VideoCapture(str(path))
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if out is None:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                out, codec = open_video_writer(output_path, fps, (frame.shape[1], frame.shape[0]), settings)
+            out.write(frame)
+        cap.release()
+    if out is not None:
+        out.release()
+    return codec
@@ -0,0 +1,256 @@
+"""
+Keyframe index and thumbnail strip for uploaded videos.
+
+One indexing pass per video records keyframe timestamps and a row of small
+thumbnails. With ffmpeg the pass decodes keyframes only (`-skip_frame nokey`),
+which is a small fraction of the video; without it OpenCV grabs every frame
+and decodes just the thumbnails. Indexes are cached on disk, keyed by a
+digest of the file.
+
+`FrameSeeker` uses the index for random access: a target with no keyframe
+between it and the decoder's position is reached by decoding forward, since
+a seek would restart from an earlier keyframe; anything else is a seek.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from video_encoder import FFMPEG_BIN, ffmpeg_has_encoder
+
+INDEX_DIR = Path(os.environ.get("VIDEO_INDEX_DIR", Path(tempfile.gettempdir()) / "video_index"))
+THUMB_WIDTH = 160
+MAX_THUMBNAILS = 24
+# Versioned so a format change never loads a stale cache file
+INDEX_VERSION = 1
+
+_PTS_TIME = re.compile(r"pts_time:\s*([0-9.eE+-]+)")
+
+
+@dataclass
+class VideoIndex:
+    fps: float
+    frame_count: int
+    duration: float
+    # Keyframe timestamps in seconds (empty when they could not be determined)
+    keyframe_times: np.ndarray
+    thumbnail_times: np.ndarray
+    # (n, h, w, 3) BGR
+    thumbnails: np.ndarray
+
+    @property
+    def keyframe_frames(self) -> np.ndarray:
+        return np.rint(self.keyframe_times * self.fps).astype(np.int64)
+
+    def keyframe_before(self, frame_idx: int) -> int:
+        """Index of the last keyframe at or before `frame_idx` (0 without keyframe data)."""
+        frames = self.keyframe_frames
+        i = int(np.searchsorted(frames, frame_idx, side="right")) - 1
+        return int(frames[i]) if i >= 0 else 0
+
+
+def file_digest(path: str | Path, chunk: int = 1 << 20) -> str:
+    """Digest of size, head and tail: cheap for large files, distinct in practice."""
+    path = Path(path)
+    size = path.stat().st_size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk))
+        if size > chunk:
+            f.seek(max(size - chunk, chunk))
+            digest.update(f.read(chunk))
+    return digest.hexdigest()[:16]
+
+
+def _thumb_size(width: int, height: int) -> tuple[int, int]:
+    return THUMB_WIDTH, max(2, round(THUMB_WIDTH * height / max(width, 1) / 2) * 2)
+
+
+def _pick_thumbnails(times: np.ndarray, duration: float, count: int) -> np.ndarray:
+    """Indices of the frames closest to `count` evenly spaced times."""
+    if not len(times):
+        return np.empty(0, dtype=int)
+    targets = (np.arange(count) + 0.5) * duration / count
+    return np.unique(np.abs(times[None, :] - targets[:, None]).argmin(axis=1))
+
+
+def _index_with_ffmpeg(video_path: Path, fps: float, size: tuple[int, int]) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Keyframe times and a thumbnail of every keyframe, decoding keyframes only."""
+    tw, th = size
+    command = [
+        FFMPEG_BIN, "-hide_banner", "-nostats", "-loglevel", "info",
+        "-skip_frame", "nokey", "-i", str(video_path), "-an",
+        "-vf", f"scale={tw}:{th},showinfo", "-fps_mode", "passthrough",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-",
+    ]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    times: list[float] = []
+
+    # showinfo logs one line per frame on stderr; drain it alongside stdout
+    def read_log() -> None:
+        for line in proc.stderr:
+            match = _PTS_TIME.search(line.decode(errors="replace"))
+            if match and b"showinfo" in line:
+                times.append(float(match.group(1)))
+
+    log_reader = threading.Thread(target=read_log, daemon=True)
+    log_reader.start()
+    frame_bytes = tw * th * 3
+    thumbs = []
+    while True:
+        data = proc.stdout.read(frame_bytes)
+        if len(data) < frame_bytes:
+            break
+        thumbs.append(np.frombuffer(data, dtype=np.uint8).reshape(th, tw, 3))
+    proc.wait()
+    log_reader.join()
+    if proc.returncode != 0 or len(times) != len(thumbs):
+        raise RuntimeError(f"ffmpeg keyframe pass failed for {video_path.name}")
+    return np.array(times, dtype=np.float64), thumbs
+
+
+def _index_with_opencv(cap: cv2.VideoCapture, fps: float, frame_count: int, size: tuple[int, int],
+                       count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Thumbnails by grabbing every frame and decoding only the chosen ones."""
+    wanted = set(np.rint((np.arange(count) + 0.5) * frame_count / count).astype(int).tolist())
+    times, thumbs = [], []
+    frame_idx = 0
+    while cap.grab():
+        if frame_idx in wanted:
+            ok, frame = cap.retrieve()
+            if ok:
+                times.append(frame_idx / fps)
+                thumbs.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+        frame_idx += 1
+    return np.array(times, dtype=np.float64), np.array(thumbs, dtype=np.uint8)
+
+
+def build_index(video_path: str | Path, thumbnails: int = MAX_THUMBNAILS) -> VideoIndex:
+    video_path = Path(video_path)
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError("Failed to open video file")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    size = _thumb_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    duration = frame_count / fps
+    try:
+        if ffmpeg_has_encoder("rawvideo"):
+            keyframe_times, keyframe_thumbs = _index_with_ffmpeg(video_path, fps, size)
+            chosen = _pick_thumbnails(keyframe_times, duration, thumbnails)
+            thumbnail_times = keyframe_times[chosen]
+            thumbs = np.array([keyframe_thumbs[i] for i in chosen], dtype=np.uint8)
+        else:
+            keyframe_times = np.empty(0, dtype=np.float64)
+            thumbnail_times, thumbs = _index_with_opencv(cap, fps, frame_count, size, thumbnails)
+    finally:
+        cap.release()
+    if not len(thumbs):
+        thumbs = np.empty((0, size[1], size[0], 3), dtype=np.uint8)
+    return VideoIndex(fps, frame_count, duration, keyframe_times, thumbnail_times, thumbs)
+
+
+def _cache_path(video_path: str | Path, thumbnails: int) -> Path:
+    return INDEX_DIR / f"{file_digest(video_path)}_v{INDEX_VERSION}_{thumbnails}.npz"
+
+
+def cached_index(video_path: str | Path, thumbnails: int = MAX_THUMBNAILS) -> VideoIndex:
+    """`build_index` once per distinct file; later calls load the `.npz` from `INDEX_DIR`."""
+    cache_path = _cache_path(video_path, thumbnails)
+    if cache_path.exists():
+        with np.load(cache_path) as data:
+            return VideoIndex(float(data["fps"]), int(data["frame_count"]), float(data["duration"]),
+                              data["keyframe_times"], data["thumbnail_times"], data["thumbnails"])
+    index = build_index(video_path, thumbnails)
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a concurrent reader never sees a partial file
+    tmp_path = cache_path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, fps=index.fps, frame_count=index.frame_count, duration=index.duration,
+             keyframe_times=index.keyframe_times, thumbnail_times=index.thumbnail_times,
+             thumbnails=index.thumbnails)
+    os.replace(tmp_path, cache_path)
+    return index
+
+
+def cheap_keyframes(video_path: str | Path) -> np.ndarray:
+    """
+    Keyframe frame numbers of a video if they come cheaply: from a cached
+    index, or from a new one when ffmpeg can skip to the keyframes. Without
+    ffmpeg an index decodes every frame and still finds no keyframes, so
+    this returns none rather than build one.
+    """
+    if _cache_path(video_path, MAX_THUMBNAILS).exists() or ffmpeg_has_encoder("rawvideo"):
+        try:
+            return cached_index(video_path).keyframe_frames
+        except (RuntimeError, ValueError):
+            pass
+    return np.empty(0, dtype=np.int64)
+
+
+def thumbnail_strip(index: VideoIndex, marker_seconds=(), marker_bgr: tuple = (60, 76, 231),
+                    bar_height: int = 14) -> np.ndarray:
+    """Thumbnails side by side over a timeline bar with a tick at each marker second."""
+    if not len(index.thumbnails):
+        return np.zeros((bar_height, THUMB_WIDTH, 3), dtype=np.uint8)
+    strip = np.hstack(list(index.thumbnails))
+    bar = np.full((bar_height, strip.shape[1], 3), 40, dtype=np.uint8)
+    duration = max(index.duration, 1e-6)
+    for sec in marker_seconds:
+        x = int(min(sec / duration, 1.0) * (strip.shape[1] - 1))
+        bar[:, max(x - 1, 0):x + 2] = marker_bgr
+    return np.vstack([strip, bar])
+
+
+class FrameSeeker:
+    """Random frame access that decodes forward instead of seeking whenever that is cheaper."""
+
+    def __init__(self, video_path: str | Path, index: VideoIndex):
+        self.index = index
+        self._cap = cv2.VideoCapture(str(video_path))
+        # Frame index the next `cap.read()` returns
+        self._next = 0
+        self._frame = None
+
+    def read(self, frame_idx: int) -> np.ndarray | None:
+        frame_idx = int(np.clip(frame_idx, 0, max(self.index.frame_count - 1, 0)))
+        ahead = frame_idx - self._next
+        if len(self.index.keyframe_times):
+            # No keyframe between decoder and target: decoding forward beats any seek
+            decode_forward = ahead >= 0 and self.index.keyframe_before(frame_idx) <= self._next
+        else:
+            decode_forward = 0 <= ahead <= self.index.fps
+        if not decode_forward:
+            # A seek decodes from the keyframe before the target anyway
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self._next = frame_idx
+        while self._next < frame_idx:
+            if not self._cap.grab():
+                return None
+            self._next += 1
+        ok, self._frame = self._cap.read(image=self._frame)
+        if not ok:
+            return None
+        self._next += 1
+        return self._frame
+
+    def read_time(self, seconds: float) -> np.ndarray | None:
+        return self.read(round(seconds * self.index.fps))
+
+    def close(self) -> None:
+        self._cap.release()
+
+    def __enter__(self) -> "FrameSeeker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()